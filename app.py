@@ -3,9 +3,18 @@ import pandas as pd
 import configparser
 import os
 import sys
+import shutil
 import subprocess
+import uuid
 from datetime import datetime
 
+from downsampling import downsample
+from result_archive import list_archive, write_zip
+from run_history import compare_runs, find_runs, kpi_names
+from results_writer import list_workbooks, list_sheets, read_sheet, export_excel, columnar_dir, SHEET_ORDER_FILE
+from surrogate import SAMPLES_WORKBOOK, load_surrogate, predict_surrogate
+from worker import BUSY, OptimizationWorker
+
 # --- 1. Page Configuration and Styling ---
 st.set_page_config(
     page_title="Power System Optimizer",
@@ -44,24 +53,187 @@ def check_password():
         return False
     return True
 
-# In file: app.py
 
-def display_results():
+# Working folders of the sessions: one per browser session, holding a folder per run (config file and
+# Results) and the session's surrogate, so concurrent users and runs never share files
+RUNS_DIR = "Runs"
+# Session folders nothing has been written to for this long are left over from closed browser sessions
+SESSION_MAX_AGE_DAYS = 7
+
+# Config file the persistent worker loads its inputs from when it (re)starts, kept up to date with the settings
+WORKER_WARMUP_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_warmup.ini")
+
+
+def session_dir():
+    """Working folder of this browser session. Opening a session also removes the abandoned ones."""
+    if 'session_dir' not in st.session_state:
+        remove_stale_sessions()
+        st.session_state.session_dir = os.path.join(RUNS_DIR, f"session-{uuid.uuid4().hex[:12]}")
+    return st.session_state.session_dir
+
+
+def remove_stale_sessions(max_age_days=SESSION_MAX_AGE_DAYS):
+    """Removes the session folders in which nothing has been written for more than max_age_days days."""
+    if not os.path.isdir(RUNS_DIR):
+        return
+    cutoff = datetime.now().timestamp() - max_age_days * 86400
+    for name in os.listdir(RUNS_DIR):
+        folder = os.path.join(RUNS_DIR, name)
+        if not name.startswith('session-') or not os.path.isdir(folder):
+            continue
+        last_write = max((os.path.getmtime(os.path.join(root, entry))
+                          for root, dirs, files in os.walk(folder) for entry in dirs + files),
+                         default=os.path.getmtime(folder))
+        if last_write < cutoff:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def new_run_dir(keep=0):
     """
-    Scans the Results folder. Displays metrics if the main sizing file exists,
-    and shows download links for ALL available result files.
+    Creates the working folder of a new run of this session, named after its start time, and removes the
+    working folders of the session beyond the newest keep (0 keeps all), e.g. when the runs are archived.
     """
-    st.header("Results & Analysis 📊")
-    results_dir = "Results"
-    sizing_file_path = os.path.join(results_dir, 'Optimal_Sizing_RE_BESS.xlsx')
+    if keep and os.path.isdir(session_dir()):
+        runs = sorted((name for name in os.listdir(session_dir()) if name.startswith('run-')), reverse=True)
+        for stale in runs[int(keep) - 1:]:
+            shutil.rmtree(os.path.join(session_dir(), stale), ignore_errors=True)
+    run_dir = os.path.join(session_dir(), f"run-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}")
+    os.makedirs(run_dir)
+    return run_dir
+
+
+def session_runs():
+    """Results folders of the runs of this session, newest first."""
+    if not os.path.isdir(session_dir()):
+        return []
+    runs = sorted((name for name in os.listdir(session_dir()) if name.startswith('run-')), reverse=True)
+    return [os.path.join(session_dir(), name, 'Results') for name in runs
+            if os.path.isdir(os.path.join(session_dir(), name, 'Results'))]
+
+
+def resolve_app_path(path):
+    """Resolves a path from the settings relative to the app folder, as run_optimization does."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+
+def folder_stamp(path):
+    """Version of the files of a folder, used to key caches of content derived from all of them."""
+    files = [os.path.join(folder, file) for folder, _, names in os.walk(path) for file in names]
+    return tuple(sorted((os.path.relpath(file, path),) + file_stamp(file) for file in files))
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_zip(directory, zip_path, stamp):
+    """Zips a folder to zip_path, file by file, once per version of its files (stamp only keys the cache)."""
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    return write_zip(directory, zip_path)
+
+
+def file_stamp(path):
+    """Version of a file (modification time and size), used to key the caches of its parsed content."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_sheet(results_dir, workbook, sheet, stamp):
+    """Parses a result sheet once per version of its file (stamp only keys the cache)."""
+    return read_sheet(results_dir, workbook, sheet)
+
+
+def load_sheet(results_dir, workbook, sheet):
+    """A result sheet, parsed only when its file changed since the last rerun."""
+    path = os.path.join(columnar_dir(results_dir, workbook), f"{sheet}.parquet")
+    return cached_sheet(results_dir, workbook, sheet, file_stamp(path))
+
 
-    # --- 1. Display Key Metrics (only if the specific file exists) ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_file_bytes(path, stamp):
+    """Content of a file for download, read once per version of the file (stamp only keys the cache)."""
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_chart_data(results_dir, workbook, sheet, columns, n_points, stamp):
+    """Shape-preserving (LTTB) downsample of some columns of a result sheet, once per version of the file."""
+    return downsample(read_sheet(results_dir, workbook, sheet)[list(columns)], n_points)
+
+
+# Time series that can be charted: workbook, sheet and the columns shown by default
+CHART_SOURCES = {
+    'Optimal sizing (typical day of each month)': (
+        'Optimal_Sizing_RE_BESS.xlsx', 'Time Series Data',
+        ['Battery SOC', 'Battery Charge', 'Battery Discharge', 'GDAM Purchase', 'Remaining Deficit']),
+    **{f"Fixed battery {i}": ('NonOptimized_Battery_Profiles.xlsx', f"Battery {i}",
+                              ['Battery State (MWh)', 'Charge (MW)', 'Discharge (MW)']) for i in (1, 2, 3)},
+    **{f"Optimal battery {i}": ('Optimal_Battery_Profiles.xlsx', f"Battery {i}",
+                                ['Battery State (MWh)', 'Charge (MW)', 'Discharge (MW)']) for i in (1, 2, 3)},
+    'Sizing verification (full year)': (
+        'Sizing_Verification.xlsx', 'Time Series',
+        ['Unserved Demand', 'RE Production', 'Battery Energy (MWh)', 'Deficit', 'Curtailment']),
+    'Thermal dispatch': ('thermal_generation.xlsx', 'Sheet1', ['Unserved Demand', 'With Surplus']),
+    'Stress weeks (one after another)': ('Stress_Weeks.xlsx', 'Dispatch',
+                                         ['With Surplus', 'Unserved Demand', 'After Batteries']),
+}
+
+
+def display_time_series(results_dir, workbooks):
+    """Interactive charts of the result time series, downsampled so full-year series render quickly."""
+    sources = {label: source for label, source in CHART_SOURCES.items() if source[0] in workbooks}
+    if not sources:
+        return
+    st.subheader("Time Series")
+    col1, col2 = st.columns([3, 1])
+    label = col1.selectbox("Series", list(sources), key="chart_source")
+    n_points = col2.number_input("Points per series", min_value=200, max_value=20000, value=2000, step=500,
+                                 key="chart_points")
+    workbook, sheet, default_columns = sources[label]
+    path = os.path.join(columnar_dir(results_dir, workbook), f"{sheet}.parquet")
+    if not os.path.exists(path):
+        return
+    all_columns = list(load_sheet(results_dir, workbook, sheet).columns)
+    columns = st.multiselect("Columns", all_columns, default=[c for c in default_columns if c in all_columns],
+                             key=f"chart_columns_{label}")
+    if columns:
+        chart_data = cached_chart_data(results_dir, workbook, sheet, tuple(columns), int(n_points), file_stamp(path))
+        st.line_chart(chart_data)
+        n_rows = len(load_sheet(results_dir, workbook, sheet))
+        st.caption(f"{len(chart_data):,} of {n_rows:,} points shown; peaks and troughs of every series are kept.")
+
+
+def display_results(archive_dir=None):
+    """
+    Scans the Results folder of a run of this session (the latest by default) or an archived run. Displays
+    metrics if the main sizing results exist, and shows download links for ALL available result workbooks.
+    """
+    st.header("Results & Analysis 📊")
+    runs = session_runs()
+    archived = list_archive(archive_dir)['path'].tolist() if archive_dir else []
+    if not runs and not archived:
+        st.info("No runs in this session yet. Run an optimization to see its results here.")
+        return
+    # No widget key, so the selection moves to the newest run whenever a run is added
+    results_dir = st.selectbox("Run", runs + archived,
+                               format_func=lambda path: (os.path.basename(os.path.dirname(path)) if path in runs
+                                                         else f"📦 archive: {os.path.basename(path)}"))
+    sizing_workbook = 'Optimal_Sizing_RE_BESS.xlsx'
+    workbooks = list_workbooks(results_dir)
+
+    if 'Input_Validation.xlsx' in workbooks:
+        st.error("The run stopped before solving because of invalid inputs:")
+        st.dataframe(load_sheet(results_dir, 'Input_Validation.xlsx', 'Report'), use_container_width=True)
+
+    # --- 1. Display Key Metrics (only if the sizing results exist) ---
     st.subheader("Key Sizing Results")
-    if os.path.exists(sizing_file_path):
+    sized = sizing_workbook in workbooks and 'Sizing Results' in list_sheets(results_dir, sizing_workbook)
+    if sized:
         try:
-            df_results = pd.read_excel(sizing_file_path, sheet_name='Sizing Results', index_col=0)
-            total_solar = df_results.loc['solar_size_goa':'solar_size_tel'].sum().iloc[0]
-            total_wind = df_results.loc['wind_size_maha':'wind_size_karnataka'].sum().iloc[0]
+            df_results = load_sheet(results_dir, sizing_workbook, 'Sizing Results')
+            df_sites = load_sheet(results_dir, sizing_workbook, 'Sites')
+            technology_mw = df_sites.groupby('technology')['capacity_mw'].sum()
+            total_solar = technology_mw.get('solar', 0.0)
+            total_wind = technology_mw.get('wind', 0.0)
             battery_mwh = df_results.loc['battery_capacity', 'Value']
             total_deficit = df_results.loc['total_deficit', 'Value']
 
@@ -70,27 +242,285 @@ def display_results():
             col2.metric("Total Wind Capacity (MW)", f"{total_wind:,.1f}")
             col3.metric("Battery Capacity (MWh)", f"{battery_mwh:,.1f}")
             col4.metric("Total Deficit (MWh)", f"{total_deficit:,.1f}", delta_color="inverse")
+
+            df_status = load_sheet(results_dir, sizing_workbook, 'Solver Status')
+            for model_name, row in df_status.iterrows():
+                if not row['optimal'] and row['has_solution']:
+                    gap_text = f"{row['gap']:.2%}" if pd.notna(row['gap']) else "unknown"
+                    st.warning(f"The {model_name} model was not solved to proven optimality ({row['termination']}). "
+                               f"Results use the best solution found, with an optimality gap of {gap_text}.")
         except Exception as e:
             st.error(f"Could not read or parse the sizing results file: {e}")
     else:
         st.warning("Key metrics are unavailable because the sizing optimization was infeasible or did not complete.")
+        if sizing_workbook in workbooks:
+            st.dataframe(load_sheet(results_dir, sizing_workbook, 'Solver Status'))
+
+    verification_workbook = 'Sizing_Verification.xlsx'
+    if verification_workbook in workbooks:
+        st.subheader("Full-Year Verification")
+        st.caption("The sized capacities run over every 15-min period of the year, next to what the sizing "
+                   "model expects from its typical days.")
+        st.dataframe(load_sheet(results_dir, verification_workbook, 'Summary'))
+
+    monte_carlo_workbook = 'Monte_Carlo_Deficit.xlsx'
+    if monte_carlo_workbook in workbooks:
+        st.subheader("Deficit Under Resource Uncertainty")
+        st.caption("The sized portfolio over solar and wind years resampled by blocks of days within each month.")
+        col1, col2 = st.columns(2)
+        col1.dataframe(load_sheet(results_dir, monte_carlo_workbook, 'Reliability'))
+        df_summary = load_sheet(results_dir, monte_carlo_workbook, 'Summary')
+        col2.bar_chart(df_summary.loc['deficit_mwh', ['P50', 'P90', 'P99']])
+        st.dataframe(df_summary)
+
+    stochastic_workbook = 'Stochastic_Sizing_RE_BESS.xlsx'
+    if stochastic_workbook in workbooks:
+        st.subheader("Stochastic Sizing Scenarios")
+        st.caption("Capacities are shared by all scenarios; the key metrics above are for the configured "
+                   "wind year and shortage case.")
+        df_shared = load_sheet(results_dir, stochastic_workbook, 'Shared Capacities')
+        if 'converged' in df_shared and not df_shared['converged'].all():
+            st.error("The stochastic sizing stopped before converging: the capacities are the best found within "
+                     "the iteration limit, not the optimum. See the Convergence sheet for the remaining gap.")
+        st.dataframe(load_sheet(results_dir, stochastic_workbook, 'Scenario Results'))
+
+    frontier_workbook = 'Pareto_Frontier.xlsx'
+    if frontier_workbook in workbooks:
+        st.subheader("Cost vs Deficit Frontier")
+        df_frontier = load_sheet(results_dir, frontier_workbook, 'Frontier').dropna(subset=['cost'])
+        st.line_chart(df_frontier, x='total_deficit', y='cost')
+        st.dataframe(df_frontier.drop(columns=['deficit_cap', 'termination', 'solve_time_s']))
+
+    battery_workbook = 'Optimal_Battery_Profiles.xlsx'
+    if battery_workbook in workbooks:
+        st.subheader("Greedy vs Optimal Battery Dispatch")
+        st.caption("The same batteries dispatched with perfect foresight (dynamic programming over the SOC grid).")
+        st.dataframe(load_sheet(results_dir, battery_workbook, 'Greedy vs Optimal'))
+
+    stress_workbook = 'Stress_Weeks.xlsx'
+    if stress_workbook in workbooks:
+        st.subheader("Stress Weeks")
+        st.caption("Thermal dispatch and fixed-size batteries over each flagged week, run on its own.")
+        st.dataframe(load_sheet(results_dir, stress_workbook, 'Categories'))
+        st.dataframe(load_sheet(results_dir, stress_workbook, 'Weeks'))
+
+    sensitivity_workbook = 'Sensitivity_Report.xlsx'
+    if sensitivity_workbook in workbooks:
+        st.subheader("Sensitivity Analysis")
+        st.caption("Marginal value of each parameter and the range over which it holds without re-solving.")
+        for sheet in list_sheets(results_dir, sensitivity_workbook):
+            if sheet != 'Thermal Marginal Price':
+                st.markdown(f"**{sheet}**")
+                st.dataframe(load_sheet(results_dir, sensitivity_workbook, sheet))
+
+    display_time_series(results_dir, workbooks)
 
     st.divider()
 
-    # --- 2. Display Download Links (for ANY Excel file found) ---
+    # --- 2. Display Download Links (Excel is exported on demand if it was not written during the run) ---
     st.subheader("Download Output Files")
-    if not os.path.exists(results_dir) or not any(f.endswith('.xlsx') for f in os.listdir(results_dir)):
+    if not workbooks:
         st.info("No result files found. Run an optimization to generate output files.")
         return
 
-    result_files = [f for f in os.listdir(results_dir) if f.endswith('.xlsx')]
-    for file in sorted(result_files):
+    # All outputs of the run in one zip, written file by file to disk rather than built in memory. Streamlit
+    # reads the file into memory to serve the download, so the zip is held in memory while it is offered.
+    run_name = os.path.basename(results_dir if results_dir in archived else os.path.dirname(results_dir))
+    zip_path = cached_zip(results_dir, os.path.join(session_dir(), 'downloads', f"{run_name}.zip"),
+                          folder_stamp(results_dir))
+    with open(zip_path, "rb") as fp:
+        st.download_button(label="🗜️ Download all as zip", data=fp, file_name=f"{run_name}.zip",
+                           mime="application/zip", key="download_zip")
+
+    for file in workbooks:
         file_path = os.path.join(results_dir, file)
-        with open(file_path, "rb") as fp:
-            st.download_button(
-                label=f"📥 Download {file}", data=fp, file_name=file,
-                mime="application/vnd.ms-excel", key=f"download_{file}"
-            )
+        if not os.path.exists(file_path):
+            if st.button(f"🛠️ Prepare {file}", key=f"prepare_{file}"):
+                with st.spinner(f"Writing {file}..."):
+                    export_excel(results_dir, file)
+                st.rerun()
+            continue
+        st.download_button(
+            label=f"📥 Download {file}", data=cached_file_bytes(file_path, file_stamp(file_path)), file_name=file,
+            mime="application/vnd.ms-excel", key=f"download_{file}"
+        )
+
+
+def display_run_history(db_path):
+    """Filters, sorts and compares the runs recorded in the run history (of all sessions)."""
+    st.header("Run History 🗂️")
+    if not db_path or not os.path.exists(db_path):
+        st.info("No runs recorded yet. Every optimization run is added to the history when it finishes.")
+        return
+    kpis = kpi_names(db_path)
+
+    col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+    statuses = col1.multiselect("Outcome", ['sized', 'no_solution', 'skipped'], key="history_status")
+    order_by = col2.selectbox("Sort by", ['started_at', 'elapsed_s'] + kpis, key="history_order")
+    descending = col3.checkbox("Descending", True, key="history_descending")
+    limit = col4.number_input("Rows", min_value=10, max_value=10000, value=200, step=50, key="history_limit")
+    kpi_ranges, param_values = {}, {}
+    with st.expander("Filters"):
+        for name in st.multiselect("KPIs", kpis, key="history_filter_kpis"):
+            low_col, high_col = st.columns(2)
+            kpi_ranges[name] = (low_col.number_input(f"{name} from", value=None, key=f"history_low_{name}"),
+                                high_col.number_input(f"{name} to", value=None, key=f"history_high_{name}"))
+        for item in st.text_input("Parameters (name=value, comma separated)", key="history_params").split(','):
+            if '=' in item:
+                name, value = item.split('=', 1)
+                param_values[name.strip()] = value.strip()
+
+    runs = find_runs(db_path, kpi_ranges, param_values, statuses or None, order_by, descending, limit)
+    st.caption(f"{len(runs):,} runs")
+    st.dataframe(runs)
+
+    selected = st.multiselect("Compare runs", runs.index.tolist(), key="history_compare")
+    if selected:
+        tables = compare_runs(db_path, selected)
+        st.subheader("KPIs")
+        st.dataframe(tables['kpis'])
+        st.subheader("Parameters that differ")
+        st.dataframe(tables['params'])
+        with st.expander("Stage timings (s)"):
+            st.dataframe(tables['timings'])
+        with st.expander("Result files"):
+            st.dataframe(tables['series'])
+
+
+@st.cache_resource
+def cached_surrogate(surrogate_dir, samples_mtime):
+    """Fits the surrogate once per set of samples (samples_mtime only keys the cache)."""
+    return load_surrogate(surrogate_dir)
+
+
+def display_surrogate():
+    """
+    Answers what-if questions instantly from the surrogate fitted to earlier full runs.
+
+    Returns:
+        dict: The slider values if the user asked to confirm them with a full solve, else None.
+    """
+    st.header("What-if Sizing ⚡")
+    surrogate_dir = os.path.join(session_dir(), "Surrogate")
+    sheet_order = os.path.join(columnar_dir(surrogate_dir, SAMPLES_WORKBOOK), SHEET_ORDER_FILE)
+    if not os.path.exists(sheet_order):
+        st.info("No surrogate yet. Build one from the current settings to get instant estimates.")
+        return None
+    surrogate, design = cached_surrogate(surrogate_dir, os.path.getmtime(sheet_order))
+    if surrogate is None:
+        st.warning("Too few of the sampled runs found a sizing solution to fit a surrogate.")
+        return None
+
+    st.caption(f"Estimates from a Gaussian process fitted to {surrogate['n_samples']} full runs; the bands are "
+               f"95% intervals. Settings other than the sliders are taken as they were when sampling.")
+    values = {}
+    columns = st.columns(3)
+    for i, (name, row) in enumerate(design.iterrows()):
+        values[name] = columns[i % 3].slider(name.replace('_', ' ').title(), float(row['low']), float(row['high']),
+                                             float(row['base']), key=f"surrogate_{name}")
+
+    prediction = predict_surrogate(surrogate, values)
+    col1, col2, col3 = st.columns(3)
+    for column, name, label in [(col1, 'battery_capacity', "Battery Capacity (MWh)"),
+                                (col2, 'max_charge_rate', "Max Charge Rate (MW)"),
+                                (col3, 'total_deficit', "Total Deficit (MWh)")]:
+        row = prediction.loc[name]
+        column.metric(label, f"{row['estimate']:,.1f}", help=f"95% band: {row['lower']:,.1f} to {row['upper']:,.1f}")
+    st.dataframe(prediction)
+
+    if st.button("✅ Confirm with full solve", use_container_width=True):
+        return values
+    return None
+
+
+def write_config(user_params, config_path, overrides=None):
+    """Writes the sidebar settings, with any overrides applied to the section holding each key, to an ini file."""
+    config = configparser.ConfigParser()
+    for section, params in user_params.items():
+        config[section] = {k: str(v) for k, v in params.items()}
+    for key, value in (overrides or {}).items():
+        section = next(section for section, params in user_params.items() if key in params)
+        config[section][key] = str(value)
+    with open(config_path, 'w') as configfile:
+        config.write(configfile)
+
+
+def write_warmup_config(user_params):
+    """
+    Writes the settings as the warm-up config of the worker, so that a worker started or restarted later loads
+    the inputs of the settings last in use. The file is replaced in one step, so a starting worker never reads
+    a partly written one.
+    """
+    temp_path = f"{WORKER_WARMUP_CONFIG}.{uuid.uuid4().hex[:6]}.tmp"
+    write_config(user_params, temp_path)
+    os.replace(temp_path, WORKER_WARMUP_CONFIG)
+
+
+@st.cache_resource
+def get_worker():
+    """
+    The persistent optimization worker of this app server, shared by all sessions. Each start or restart warms
+    it up on WORKER_WARMUP_CONFIG, i.e. on the settings last in use in any session.
+    """
+    worker = OptimizationWorker(WORKER_WARMUP_CONFIG)
+    worker.start_in_background()
+    return worker
+
+
+def persistent_worker(memory_limit_mb):
+    """The shared worker, with the memory limit of the current settings applied to it (no second worker)."""
+    worker = get_worker()
+    worker.set_memory_limit(memory_limit_mb)
+    return worker
+
+
+def launch(script, output_dir, user_params, log_placeholder, overrides=None):
+    """
+    Writes the sidebar settings (with any overrides) to the config file of a new run folder and runs script on
+    it with output_dir (None: the Results folder of the run) as its output folder, streaming its log.
+    """
+    st.session_state.log_output = "Configuration saved. Starting optimization process...\n\n"
+    # With an archive the outputs of older runs stay available from it, so the session keeps few working folders
+    run_dir = new_run_dir(keep=5 if user_params['MiscParameters']['archive_dir'] else 0)
+    config_path = os.path.join(run_dir, 'parameters.ini')
+    write_config(user_params, config_path, overrides)
+    output_dir = output_dir or os.path.join(run_dir, 'Results')
+
+    def show_log(text):
+        st.session_state.log_output += text
+        log_placeholder.code(st.session_state.log_output, language="log")
+
+    solver_params = user_params['SolverParameters']
+    outcome = BUSY
+    if script == "optimization_model.py" and solver_params['use_persistent_worker']:
+        # Runs in the pre-warmed worker: no interpreter start-up, imports or input parsing. While it serves
+        # another run (or starts), the run starts its own process instead of waiting for it.
+        worker = persistent_worker(solver_params['worker_memory_limit_mb'])
+        try:
+            outcome = worker.run(config_path, results_dir=output_dir, on_log=show_log, wait=False)
+            return_code = 0
+        except (RuntimeError, MemoryError) as e:
+            show_log(f"\n{e}\n")
+            outcome, return_code = None, 1
+    if outcome is BUSY:
+        process = subprocess.Popen(
+            [sys.executable, script, config_path, output_dir],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', bufsize=1
+        )
+
+        for line in iter(process.stdout.readline, ''):
+            show_log(line)
+
+        process.stdout.close()
+        return_code = process.wait()
+
+    if return_code == 0:
+        st.toast("✅ Optimization finished successfully!", icon="🎉")
+        st.balloons()
+    else:
+        st.toast("❌ Optimization failed. Check logs for errors.", icon="🔥")
+
+    st.rerun()
 
 
 # --- 3. Main App Interface ---
@@ -111,7 +541,9 @@ if check_password():
                             'intra_state_power_losses': 0.03, 'inter_state_power_losses': 0.045},
         'BatteryConfigs_NonOptimization': {'min_batt_soc': 0.1, 'batt_efficiency': 0.9, 'battery1_power': 500.0,
                                            'battery1_duration': 4.0, 'battery2_power': 500.0, 'battery2_duration': 6.0,
-                                           'battery3_power': 250.0, 'battery3_duration': 4.0},
+                                           'battery3_power': 250.0, 'battery3_duration': 4.0,
+                                           'optimal_battery_dispatch': False, 'battery_dp_objective': 'deficit',
+                                           'battery_dp_soc_levels': 200.0},
         'TimePeriods': {'timeline_start_date': '2027-09-01', 'timeline_end_date': '2027-09-05',
                         'zero_pv_goa_start_date': '2027-06-18', 'zero_pv_goa_end_date': '2027-06-19',
                         'zero_pv_goa_start_date2': '2027-07-07', 'zero_pv_goa_end_date2': '2027-07-08'},
@@ -126,7 +558,32 @@ if check_password():
                            'min_solar_raj': 0.0, 'min_solar_tel': 0.0, 'min_wind_maha': 0.0, 'min_wind_tamil': 50.0,
                            'min_wind_karnataka': 80.0, 'allow_oversized_re': False},
         'MiscParameters': {'shortage_case': 'case2', 'wind_size_excel_sri': 40.0, 'wind_size_excel_seci': 40.0,
-                           'wind_size_actual_sri': 450.0, 'wind_size_actual_seci': 450.0},
+                           'wind_size_actual_sri': 450.0, 'wind_size_actual_seci': 450.0,
+                           'excel_output_mode': 'background', 'profile_dtype': 'float32',
+                           'profile_store_dir': '', 'stream_chunk_days': 0.0,
+                           'run_history_db': 'run_history.sqlite', 'archive_dir': 'Archive',
+                           'archive_max_runs': 200.0, 'archive_max_age_days': 0.0, 'archive_max_total_mb': 2000.0,
+                           'max_missing_periods': 4.0},
+        'SolverParameters': {'thermal_time_limit': 300.0, 'thermal_mip_gap': 0.0001, 'sizing_time_limit': 600.0,
+                             'sizing_mip_gap': 0.01, 'thermal_dispatch_method': 'merit_order',
+                             'solver_mode': 'single', 'race_solvers': 'highs_choose, highs_simplex, highs_ipm, cbc, glpk',
+                             'sizing_mode': 'deterministic',
+                             'stochastic_wind_files': 'Data/Wind_Analysis_Sri_Morjar_2022.xlsx, '
+                                                      'Data/Wind_Analysis_Sri_Morjar_2024.xlsx',
+                             'stochastic_shortage_cases': 'case1, case2', 'stochastic_method': 'auto',
+                             'benders_max_iterations': 30.0,
+                             'benders_tolerance': 0.001, 'stochastic_workers': 0.0, 'frontier_points': 10.0,
+                             'frontier_workers': 0.0, 'stress_week_analysis': False, 'stress_week_workers': 0.0,
+                             'sensitivity_analysis': False, 'verify_sizing': True,
+                             'monte_carlo_analysis': False, 'monte_carlo_samples': 1000.0,
+                             'monte_carlo_block_days': 3.0, 'monte_carlo_batch_size': 32.0,
+                             'monte_carlo_workers': 0.0, 'monte_carlo_seed': 0.0, 'surrogate_samples': 40.0,
+                             'surrogate_spread': 0.25, 'surrogate_workers': 0.0, 'surrogate_seed': 0.0,
+                             'surrogate_inputs': 'solar_cost_goa, solar_cost_guj, solar_cost_raj, wind_cost_maha, '
+                                                 'wind_cost_tamil, wind_cost_karnataka, battery_cost_mwh, '
+                                                 'annual_demand_mus, rtc_size',
+                             'use_persistent_worker': True, 'worker_memory_limit_mb': 4096.0,
+                             'stage_checkpoints': True, 'checkpoint_dir': 'Checkpoints'},
         'FilePaths': {'file_path': 'Data/combined_demand_2022_2023.csv',
                       'file_path_wind_sri': 'Data/Wind_Analysis_Sri_Morjar_2022.xlsx',
                       'file_path_wind_seci': 'Data/Wind_Analysis_SECI_2024.xlsx',
@@ -138,7 +595,8 @@ if check_password():
                       'file_path_solar_telangana': 'Data/solar_PV_telangana.csv',
                       'file_path_shortage_case1': 'Data/Shortage Case1.xlsx',
                       'file_path_shortage_case2': 'Data/Shortage Case2.xlsx',
-                      'file_path_gdam': 'Data/Avg MCP GDAM 2023 and 2024.xlsx'}
+                      'file_path_gdam': 'Data/Avg MCP GDAM 2023 and 2024.xlsx',
+                      'file_path_site_registry': ''}
     }
 
     user_params = {}
@@ -167,55 +625,80 @@ if check_password():
                         user_params[section][key] = st.selectbox(key.replace('_', ' ').title(), ('case1', 'case2'),
                                                                  index=('case1', 'case2').index(value),
                                                                  key=f"{section}_{key}")
+                    elif key == 'excel_output_mode':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(),
+                                                                 ('background', 'on_demand'),
+                                                                 index=('background', 'on_demand').index(value),
+                                                                 key=f"{section}_{key}")
+                    elif key == 'profile_dtype':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(),
+                                                                 ('float32', 'float64'),
+                                                                 index=('float32', 'float64').index(value),
+                                                                 key=f"{section}_{key}")
+                    elif key == 'thermal_dispatch_method':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(), ('merit_order', 'lp'),
+                                                                 index=('merit_order', 'lp').index(value),
+                                                                 key=f"{section}_{key}")
+                    elif key == 'battery_dp_objective':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(),
+                                                                 ('deficit', 'gdam_cost'),
+                                                                 index=('deficit', 'gdam_cost').index(value),
+                                                                 key=f"{section}_{key}")
+                    elif key == 'solver_mode':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(), ('single', 'race'),
+                                                                 index=('single', 'race').index(value),
+                                                                 key=f"{section}_{key}")
+                    elif key == 'stochastic_method':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(),
+                                                                 ('auto', 'extensive', 'benders'),
+                                                                 index=('auto', 'extensive', 'benders').index(value),
+                                                                 key=f"{section}_{key}")
+                    elif key == 'sizing_mode':
+                        user_params[section][key] = st.selectbox(key.replace('_', ' ').title(),
+                                                                 ('deterministic', 'stochastic', 'frontier'),
+                                                                 index=('deterministic', 'stochastic',
+                                                                        'frontier').index(value),
+                                                                 key=f"{section}_{key}")
                     else:
                         user_params[section][key] = st.text_input(key.replace('_', ' ').title(), value,
                                                                   key=f"{section}_{key}")
 
+    if user_params['SolverParameters']['use_persistent_worker']:
+        write_warmup_config(user_params)
+        persistent_worker(user_params['SolverParameters']['worker_memory_limit_mb'])
+
     st.title("Power System Optimizer")
-    tab_run, tab_log, tab_results = st.tabs(["Setup & Run 🚀", "Live Log Output 📝", "Results & Analysis 📊"])
+    tab_run, tab_whatif, tab_log, tab_results, tab_history = st.tabs(["Setup & Run 🚀", "What-if ⚡",
+                                                                      "Live Log Output 📝", "Results & Analysis 📊",
+                                                                      "Run History 🗂️"])
 
     with tab_run:
         st.header("Start the Optimization")
         st.markdown("Once you have confirmed the settings in the sidebar, click the button below to start the process.")
         run_button = st.button("🚀 Run Optimization", type="primary", use_container_width=True)
 
+    with tab_whatif:
+        confirm_values = display_surrogate()
+        st.markdown("Sampling runs the full optimization many times over the sliders' ranges (see the "
+                    "surrogate settings under Solver Parameters).")
+        build_button = st.button("🧪 Build Surrogate", use_container_width=True)
+
     with tab_log:
         st.header("Live Log Output")
         log_placeholder = st.code(st.session_state.log_output, language="log")
 
-    with tab_results:
-        display_results()
+    # Relative paths are taken from the app folder, as run_optimization does
+    archive_dir = user_params['MiscParameters']['archive_dir']
+    history_db = user_params['MiscParameters']['run_history_db']
 
-    if run_button:
-        if os.path.exists("Results"):
-            for f in os.listdir("Results"):
-                os.remove(os.path.join("Results", f))
-
-        st.session_state.log_output = "Configuration saved. Starting optimization process...\n\n"
-
-        config = configparser.ConfigParser()
-        for section, params in user_params.items():
-            config[section] = {k: str(v) for k, v in params.items()}
-        config_path = 'temp_parameters.ini'
-        with open(config_path, 'w') as configfile:
-            config.write(configfile)
-
-        process = subprocess.Popen(
-            [sys.executable, "optimization_model.py", config_path],
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', bufsize=1
-        )
-
-        for line in iter(process.stdout.readline, ''):
-            st.session_state.log_output += line
-            log_placeholder.code(st.session_state.log_output, language="log")
+    with tab_results:
+        display_results(resolve_app_path(archive_dir) if archive_dir else None)
 
-        process.stdout.close()
-        return_code = process.wait()
+    with tab_history:
+        display_run_history(resolve_app_path(history_db) if history_db else None)
 
-        if return_code == 0:
-            st.toast("✅ Optimization finished successfully!", icon="🎉")
-            st.balloons()
-        else:
-            st.toast("❌ Optimization failed. Check logs for errors.", icon="🔥")
+    if run_button or confirm_values is not None:
+        launch("optimization_model.py", None, user_params, log_placeholder, confirm_values)
 
-        st.rerun()
\ No newline at end of file
+    if build_button:
+        launch("surrogate.py", os.path.join(session_dir(), "Surrogate"), user_params, log_placeholder)
\ No newline at end of file
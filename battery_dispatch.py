@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+PERIOD_HOURS = 0.25
+
+
+def _dp_battery(surplus, weight, power, capacity, min_batt_soc, batt_efficiency, soc_levels):
+    """
+    Optimal charge/discharge of one battery with perfect foresight, by backward dynamic programming over
+    soc_levels + 1 evenly spaced stored energies from empty to full.
+
+    The battery follows the rules of the greedy dispatch (iter_battery_fixed_size): it starts empty, charges
+    only from surplus, discharges only into deficit and never below min_batt_soc of its capacity, and loses
+    batt_efficiency both when charging and when discharging. What it changes is when it discharges: the
+    weighted deficit left, sum(weight * max(remaining, 0)), is minimized over the whole timeline.
+
+    More stored energy is never worse and charging is free, so a surplus period always charges as much as
+    it can. A deficit period is one sliding-window minimum over the value of the next period, as the cost
+    of discharging depends on the period and the levels moved but not on the current level. The policy is
+    then followed on the exact (continuous) stored energy.
+
+    Returns:
+        tuple: Charge (MW), discharge (MW), stored energy (MWh) and remaining surplus of each period.
+    """
+    n_periods = len(surplus)
+    step = capacity / soc_levels  # MWh per level
+    floor_level = min(int(np.ceil(min_batt_soc * soc_levels - 1e-9)), soc_levels)
+    max_down = int(np.floor(power * PERIOD_HOURS / step + 1e-9))
+    levels = np.arange(soc_levels + 1)
+
+    # A missing (NaN) period is left alone, as by the greedy dispatch
+    known = np.nan_to_num(surplus)
+    deficit = np.clip(known, 0, None)
+    charge = np.clip(-known, 0, power)  # Largest charge of each period (MW)
+    # Weighted deficit left after discharging 0, 1, ... max_down levels, in every period
+    delivered = np.arange(max_down + 1) * step / PERIOD_HOURS * batt_efficiency
+    costs = weight[:, None] * np.clip(deficit[:, None] - delivered[None, :], 0, None)
+
+    # Targets below the minimum state of charge stay at inf, so discharging never ends below it
+    padded = np.full(soc_levels + 1 + max_down, np.inf)
+    windows = sliding_window_view(padded, max_down + 1)[:, ::-1]  # Row k: targets k, k - 1, ... k - max_down
+    policy = np.zeros((n_periods, soc_levels + 1), dtype=np.int16)  # Levels discharged
+    value = np.zeros(soc_levels + 1)
+    for t in range(n_periods - 1, -1, -1):
+        if charge[t] > 0:
+            # Charging does not land on the grid: the value in between levels is interpolated
+            targets = np.minimum(levels + charge[t] * PERIOD_HOURS * batt_efficiency / step, soc_levels)
+            value = np.interp(targets, levels, value)
+        elif deficit[t] > 0 and max_down > 0:
+            padded[max_down + floor_level:] = value[floor_level:]
+            options = windows + costs[t]
+            down = np.argmin(options, axis=1)  # The first of equal options discharges the least
+            down[:floor_level] = 0
+            options[:floor_level, 0] = value[:floor_level] + costs[t, 0]
+            policy[t] = down
+            value = options[levels, down]
+        else:
+            value = value + costs[t, 0]
+
+    # The energy itself is followed exactly: full charges, and discharges of the levels chosen at the grid
+    # level just below, but of no more than the deficit needs
+    discharge, energy = np.zeros(n_periods), np.empty(n_periods)
+    stored = 0.0
+    for t in range(n_periods):
+        if charge[t] > 0:
+            charge[t] = min(charge[t], (capacity - stored) / (PERIOD_HOURS * batt_efficiency))
+            stored += charge[t] * PERIOD_HOURS * batt_efficiency
+        elif deficit[t] > 0:
+            down = policy[t, min(int(stored / step + 1e-9), soc_levels)]
+            discharge[t] = min(down * step / PERIOD_HOURS, deficit[t] / batt_efficiency)
+            stored -= discharge[t] * PERIOD_HOURS
+        energy[t] = stored
+    remaining = surplus + charge - discharge * batt_efficiency
+    return charge, discharge, energy, remaining
+
+
+def optimal_battery_dispatch(df_filtered, min_batt_soc, batt_efficiency, battery_configs, price=None,
+                             soc_levels=200):
+    """
+    Optimal charge/discharge profiles of the fixed-size batteries, without a solver (see _dp_battery).
+
+    The batteries are applied in order to what the previous ones left, as in battery_fixed_size_calculations,
+    and the result has the same structure, so the greedy and the optimal dispatch can be compared directly.
+    A full year takes about a second per battery with the default grid, within a fraction of a percent of the
+    continuous optimum; a finer grid gets closer to it at a proportional cost in time.
+
+    Args:
+        df_filtered: DataFrame or ProfileFrame with a 'WITH SURPLUS' column (demand + and surplus -).
+        min_batt_soc (float): Minimum state of charge as a fraction of the capacity.
+        batt_efficiency (float): Charging (and discharging) efficiency.
+        battery_configs (dict): 'power' and 'duration' of each battery, applied in order.
+        price (array-like): Price of each period (e.g. the GDAM price) to minimize the cost of the deficit
+                            left; None minimizes the deficit (MWh) itself.
+        soc_levels (int): Number of steps of the SOC grid from empty to full.
+
+    Returns:
+        tuple: The profile of each battery and the remaining surplus after each battery, over the whole timeline.
+    """
+    surplus = np.asarray(df_filtered['WITH SURPLUS'].values, dtype=float)
+    weight = np.ones(len(surplus)) if price is None else np.asarray(price, dtype=float)
+    battery_profiles, remaining_surplus_history = {}, {}
+    for battery_name, config in battery_configs.items():
+        charge, discharge, energy, surplus = _dp_battery(surplus, weight, config['power'],
+                                                         config['power'] * config['duration'], min_batt_soc,
+                                                         batt_efficiency, int(soc_levels))
+        battery_profiles[battery_name] = pd.DataFrame({
+            "Timestamp": df_filtered.index,
+            "Charge (MW)": charge,
+            "Discharge (MW)": discharge,
+            "Battery State (MWh)": energy
+        }).set_index("Timestamp")
+        remaining_surplus_history[battery_name] = surplus.copy()
+    return battery_profiles, remaining_surplus_history
+
+
+def compare_dispatch(original_surplus, dispatches, price=None):
+    """
+    Compares battery dispatches of the same batteries (e.g. greedy and optimal) on the same timeline.
+
+    Args:
+        original_surplus (array-like): Demand (+) and surplus (-) before the batteries.
+        dispatches (dict): (battery_profiles, remaining_surplus_history) of each dispatch, keyed by name.
+        price (array-like): Price of each period to value the deficit left at (e.g. the GDAM price).
+
+    Returns:
+        pd.DataFrame: 'dispatch', 'battery', the charge and discharge energy, and the deficit and surplus
+                      left (and the cost of the deficit, with a price) after the battery, one row per dispatch
+                      and battery.
+    """
+    original_surplus = np.asarray(original_surplus, dtype=float)
+    rows = []
+    for dispatch, (battery_profiles, remaining_surplus_history) in dispatches.items():
+        for battery_name, profile in battery_profiles.items():
+            remaining = remaining_surplus_history[battery_name]
+            row = {'dispatch': dispatch, 'battery': battery_name,
+                   'charge_mwh': profile['Charge (MW)'].sum() * PERIOD_HOURS,
+                   'discharge_mwh': profile['Discharge (MW)'].sum() * PERIOD_HOURS,
+                   'deficit_before_mwh': np.nansum(np.clip(original_surplus, 0, None)) * PERIOD_HOURS,
+                   'deficit_left_mwh': np.nansum(np.clip(remaining, 0, None)) * PERIOD_HOURS,
+                   'surplus_left_mwh': -np.nansum(np.clip(remaining, None, 0)) * PERIOD_HOURS}
+            if price is not None:
+                row['deficit_left_cost'] = np.nansum(np.clip(remaining, 0, None) * price) * PERIOD_HOURS
+            rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,84 @@
+"""
+Benchmark: greedy vs. dynamic-programming battery dispatch over a year of 15-min periods.
+
+Dispatches one battery against a synthetic net demand (a daily surplus/deficit cycle with noise) with the
+greedy rule and with the DP engine at several SOC grid sizes, and reports the time taken and the deficit
+left. Where HiGHS is available, the continuous optimum of the first week (an LP without the minimum state
+of charge, so min_batt_soc is 0 here) shows how close each grid gets.
+
+Usage:
+    python benchmarks/bench_battery_dispatch.py [--levels 100 200 400]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import (ConcreteModel, Constraint, NonNegativeReals, Objective, SolverFactory, Var,
+                           value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from battery_dispatch import optimal_battery_dispatch  # noqa: E402
+from my_statistics import battery_fixed_size_calculations  # noqa: E402
+
+BATTERY = {'Battery 1': {'power': 100.0, 'duration': 4.0}}
+EFFICIENCY = 0.92
+
+
+def net_demand(periods):
+    rng = np.random.default_rng(0)
+    slot = np.arange(periods) % 96
+    surplus = 150 * np.cos(2 * np.pi * slot / 96) + rng.normal(0, 40, periods) + 20
+    return pd.DataFrame({'WITH SURPLUS': surplus}, index=pd.date_range('2030-01-01', periods=periods, freq='15min'))
+
+
+def deficit_left(dispatch):
+    return np.clip(dispatch[1]['Battery 1'], 0, None).sum() * 0.25
+
+
+def lp_deficit(surplus, power, capacity):
+    """Deficit left by the continuous optimal dispatch, as an LP."""
+    model = ConcreteModel()
+    periods = range(len(surplus))
+    model.charge = Var(periods, bounds=lambda m, t: (0, min(power, max(-surplus[t], 0))))
+    model.discharge = Var(periods, bounds=lambda m, t: (0, power if surplus[t] > 0 else 0))
+    model.energy = Var(periods, bounds=(0, capacity))
+    model.deficit = Var(periods, within=NonNegativeReals)
+    model.balance = Constraint(periods, rule=lambda m, t: m.energy[t] == (m.energy[t - 1] if t else 0)
+                               + 0.25 * EFFICIENCY * m.charge[t] - 0.25 * m.discharge[t])
+    model.served = Constraint(periods, rule=lambda m, t: m.deficit[t] >= surplus[t] - EFFICIENCY * m.discharge[t])
+    model.objective = Objective(expr=0.25 * sum(model.deficit[t] for t in periods))
+    SolverFactory('highs').solve(model)
+    return value(model.objective)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--levels', type=int, nargs='+', default=[100, 200, 400])
+    args = parser.parse_args()
+
+    df = net_demand(35040)
+    start = time.perf_counter()
+    greedy = battery_fixed_size_calculations(df, 0.0, EFFICIENCY, BATTERY)
+    print(f"greedy            {time.perf_counter() - start:6.2f} s  deficit left {deficit_left(greedy):12,.0f} MWh")
+    for levels in args.levels:
+        start = time.perf_counter()
+        optimal = optimal_battery_dispatch(df, 0.0, EFFICIENCY, BATTERY, soc_levels=levels)
+        print(f"DP {levels:5d} levels  {time.perf_counter() - start:6.2f} s  "
+              f"deficit left {deficit_left(optimal):12,.0f} MWh")
+
+    if SolverFactory('highs').available(exception_flag=False):
+        week = df.iloc[:7 * 96]
+        config = BATTERY['Battery 1']
+        optimum = lp_deficit(week['WITH SURPLUS'].values, config['power'], config['power'] * config['duration'])
+        greedy = battery_fixed_size_calculations(week, 0.0, EFFICIENCY, BATTERY)
+        print(f"first week: LP optimum {optimum:,.1f} MWh, greedy {deficit_left(greedy):,.1f} MWh")
+        for levels in args.levels:
+            optimal = optimal_battery_dispatch(week, 0.0, EFFICIENCY, BATTERY, soc_levels=levels)
+            print(f"  DP {levels:5d} levels {deficit_left(optimal):,.1f} MWh")
+
+
+if __name__ == "__main__":
+    main()
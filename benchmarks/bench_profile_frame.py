@@ -0,0 +1,86 @@
+"""
+Benchmark: memory of df_all as a float64 DataFrame vs. a ProfileFrame, for multi-year 15-min data.
+
+Builds the columns of df_all (9 profiles, 4 constant sources and 5 totals) for --years years both ways and
+reports the memory of each representation and the peak allocation while building it.
+
+Usage:
+    python benchmarks/bench_profile_frame.py [--years 10]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline import _net_demand, _renewable, _total_solar, _total_wind, _with_surplus  # noqa: E402
+from profile_frame import ProfileFrame  # noqa: E402
+
+PROFILES = ['TOTAL DEMAND', 'Wind Production Maharashtra', 'Wind Production Karnataka', 'Wind Production Tamil Nadu',
+            'Solar Production Gujarat', 'Solar Production Telangana', 'Solar Production Rajasthan',
+            'Solar Production Goa', 'DRE Production']
+CONSTANTS = {'Biomass Production': 50.0, 'Nuclear Production': 0.0, 'Gas Production': 0.0, 'RTC Production': 200.0}
+
+
+def random_profiles(years):
+    index = pd.date_range('2030-01-01', periods=years * 35040, freq='15min')
+    rng = np.random.default_rng(0)
+    return index, {name: rng.uniform(0, 1000, len(index)) for name in PROFILES}
+
+
+def build_dataframe(index, profiles):
+    df_all = pd.DataFrame(profiles, index=index)
+    for name, value in CONSTANTS.items():
+        df_all[name] = [value] * len(df_all)
+    df_all['Total Solar Production'] = df_all[PROFILES[4:]].sum(axis=1)
+    df_all['Total Wind Production'] = df_all[PROFILES[1:4]].sum(axis=1)
+    df_all['renewable'] = (df_all['Total Wind Production'] + df_all['Total Solar Production']
+                           + df_all['Biomass Production'] + df_all['Nuclear Production'] + df_all['RTC Production'])
+    df_all['WITH SURPLUS'] = df_all['TOTAL DEMAND'] - df_all['renewable'] - df_all['Gas Production']
+    df_all['NET DEMAND'] = df_all['WITH SURPLUS'].clip(lower=0)
+    return df_all
+
+
+def build_profile_frame(index, profiles):
+    df_all = ProfileFrame(index)
+    for name, values in profiles.items():
+        df_all.add(name, values)
+    for name, value in CONSTANTS.items():
+        df_all.add_constant(name, value)
+    for name, function in [('Total Solar Production', _total_solar), ('Total Wind Production', _total_wind),
+                           ('renewable', _renewable), ('WITH SURPLUS', _with_surplus), ('NET DEMAND', _net_demand)]:
+        df_all.add_derived(name, function)
+    return df_all
+
+
+def traced(function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    index, profiles = random_profiles(args.years)
+    df_all, dataframe_peak = traced(build_dataframe, index, profiles)
+    frame, frame_peak = traced(build_profile_frame, index, profiles)
+    assert np.allclose(frame.values('NET DEMAND'), df_all['NET DEMAND'].values, rtol=1e-5, atol=1e-2)
+
+    print(f"{args.years} years x {len(index):,} periods, {len(df_all.columns)} columns")
+    print(f"  float64 DataFrame: {df_all.memory_usage(index=True).sum() / 2 ** 20:8.1f} MB "
+          f"(peak while building {dataframe_peak / 2 ** 20:8.1f} MB)")
+    print(f"  ProfileFrame:      {frame.memory_report().loc['Total', 'bytes'] / 2 ** 20:8.1f} MB "
+          f"(peak while building {frame_peak / 2 ** 20:8.1f} MB)")
+    print(frame.memory_report())
+
+
+if __name__ == "__main__":
+    main()
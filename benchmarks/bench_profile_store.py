@@ -0,0 +1,108 @@
+"""
+Benchmark: streaming the statistics, the monthly CUF and the fixed battery simulation over a memory-mapped
+multi-year profile store, against the same analysis on in-memory DataFrames.
+
+A store of --years years of random 15-min demand and solar profiles is written a year at a time. Each
+analysis is then run once on chunks read from the store and once on the fully loaded DataFrame, and the peak
+Python allocation of each is reported (the mapped pages of the store are not allocations). The streamed
+battery simulation writes its profiles to a store of its own, as the pipeline's fixed_battery stage does.
+
+Usage:
+    python benchmarks/bench_profile_store.py [--years 10] [--chunk-days 28]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from my_statistics import battery_fixed_size_calculations, weekly_stat_analysis  # noqa: E402
+from pipeline import BATTERY_PROFILE_COLUMNS, battery_store_chunks  # noqa: E402
+from profile_store import ProfileStoreWriter, open_profile_store, store_chunks  # noqa: E402
+from re_profiles import calculate_monthly_cuf  # noqa: E402
+
+BATTERIES = {'Battery 1': {'power': 300, 'duration': 4}, 'Battery 2': {'power': 200, 'duration': 2}}
+
+
+def with_net_demand(frame):
+    return np.clip(frame.values('WITH SURPLUS'), 0, None)
+
+
+def with_surplus(frame):
+    return frame.values('TOTAL DEMAND') - frame.values('renewable')
+
+
+def write_store(directory, years):
+    """Writes the store a year at a time, so the full history is never in memory."""
+    rng = np.random.default_rng(0)
+    with ProfileStoreWriter(directory, ['TOTAL DEMAND', 'renewable', 'Solar Production']) as writer:
+        for year in range(2030, 2030 + years):
+            index = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:45", freq='15min', name='Timestamp')
+            hour = index.hour.values + index.minute.values / 60
+            solar = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * rng.uniform(0.5, 1, len(index))
+            demand = 1000 + 300 * np.sin((hour - 13) / 24 * 2 * np.pi) + rng.normal(0, 50, len(index))
+            renewable = 900 * solar + rng.uniform(0, 300, len(index))
+            writer.append(index, {'TOTAL DEMAND': demand, 'renewable': renewable, 'Solar Production': solar})
+        writer.add_derived('WITH SURPLUS', with_surplus)
+        writer.add_derived('NET DEMAND', with_net_demand)
+
+
+def traced(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--chunk-days', type=int, default=28)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_store(directory, args.years)
+        frame = open_profile_store(directory)
+        stats_columns = ['TOTAL DEMAND', 'renewable', 'NET DEMAND']
+
+        def streamed_stats():
+            weekly_stat_analysis(frame.chunks(stats_columns, 'D', args.chunk_days))
+
+        def loaded_stats():
+            weekly_stat_analysis(frame.to_frame(stats_columns))
+
+        def streamed_cuf():
+            calculate_monthly_cuf(frame.chunks(['Solar Production'], 'D', args.chunk_days), 'solar')
+
+        def loaded_cuf():
+            calculate_monthly_cuf(frame.to_frame(['Solar Production']), 'solar')
+
+        def streamed_battery():
+            # Each chunk's profiles are written to the store and dropped instead of kept for the whole history
+            columns = [f"{battery}: {column}" for battery in BATTERIES
+                       for column in BATTERY_PROFILE_COLUMNS + ['Remaining Surplus']]
+            chunks = battery_store_chunks(frame.chunks(['WITH SURPLUS'], 'D', args.chunk_days), 0.1, 0.9, BATTERIES)
+            store_chunks(chunks, os.path.join(directory, 'battery'), columns, 'float64', prefix='battery')
+
+        def loaded_battery():
+            battery_fixed_size_calculations(frame.to_frame(['WITH SURPLUS']), 0.1, 0.9, BATTERIES)
+
+        print(f"{args.years} years x {len(frame):,} periods, chunks of {args.chunk_days} days")
+        for name, streamed, loaded in [('weekly statistics', streamed_stats, loaded_stats),
+                                       ('monthly CUF', streamed_cuf, loaded_cuf),
+                                       ('fixed battery', streamed_battery, loaded_battery)]:
+            for mode, function in [('streamed', streamed), ('loaded', loaded)]:
+                elapsed, peak = traced(function)
+                print(f"  {name:18s} {mode:9s} {elapsed:7.1f} s, peak {peak / 2 ** 20:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: recording runs in the run history and querying it with thousands of runs.
+
+Records --runs synthetic runs (the parameters of a real config with a few varied costs, and random KPIs and
+timings) and then times typical queries of the Run History view: the newest runs, a KPI range filter sorted
+by another KPI, a parameter filter, and a side-by-side comparison.
+
+Usage:
+    python benchmarks/bench_run_history.py parameters.ini [--runs 5000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from optimization_model import read_config  # noqa: E402
+from run_history import compare_runs, find_runs, record_run  # noqa: E402
+
+KPIS = ['battery_capacity', 'max_charge_rate', 'total_deficit', 'solar_size_goa', 'solar_size_guj',
+        'wind_size_tamil', 'thermal_unmet_mwh', 'sizing_objective']
+STAGES = ['demand_history', 're_profiles', 'df_all', 'thermal', 'sizing_inputs', 'sizing']
+
+
+def timed(function, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config_file')
+    parser.add_argument('--runs', type=int, default=5000)
+    args = parser.parse_args()
+
+    params = read_config(args.config_file)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'run_history.sqlite')
+        start = time.perf_counter()
+        for i in range(args.runs):
+            run_params = {**params, 'battery_cost_mwh': float(rng.choice([3500, 4500, 5500])),
+                          'shortage_case': rng.choice(['case1', 'case2'])}
+            kpis = dict(zip(KPIS, rng.uniform(0, 5000, len(KPIS))))
+            timings = {stage: (float(rng.uniform(0, 5)), 'computed') for stage in STAGES}
+            record_run(db_path, run_params, kpis, timings, directory, elapsed_s=float(rng.uniform(5, 60)),
+                       status='sized')
+        record_s = (time.perf_counter() - start) / args.runs
+        size_mb = os.path.getsize(db_path) / 2 ** 20
+
+        queries = {
+            'newest 200 runs': lambda: find_runs(db_path, limit=200),
+            'KPI range, sorted by KPI': lambda: find_runs(db_path, {'total_deficit': (None, 500)},
+                                                          order_by='battery_capacity', limit=200),
+            'parameter filter': lambda: find_runs(db_path, param_values={'battery_cost_mwh': 4500.0,
+                                                                         'shortage_case': 'case1'}, limit=200),
+            'compare 5 runs': lambda: compare_runs(db_path, [1, 2, 3, 4, 5]),
+        }
+        print(f"{args.runs:,} runs recorded in {record_s * 1000:.1f} ms per run, database {size_mb:.1f} MB")
+        for name, query in queries.items():
+            elapsed, result = timed(query)
+            rows = len(result) if not isinstance(result, dict) else len(result['kpis'].columns)
+            print(f"  {name:26s} {elapsed * 1000:7.1f} ms ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
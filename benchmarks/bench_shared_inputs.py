@@ -0,0 +1,76 @@
+"""
+Benchmark: worker start-up and memory with the pipeline inputs shared in memory vs. parsed per worker.
+
+Starts --workers pool processes that each need the demand history, the RE profiles and df_all of a config,
+either by running those stages themselves (reading Data/) or by attaching the SharedInputs of the parent.
+Reports the time each worker needs to get its inputs and the private (unshared) memory it holds for them.
+
+Usage:
+    python benchmarks/bench_shared_inputs.py parameters.ini [--workers 4]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared_inputs import SHARED_STAGES, attach_shared_inputs, share_pipeline_inputs  # noqa: E402
+
+
+def private_mb():
+    """Memory of this process that is not shared with other processes (Linux only)."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':')[:2] for line in f if ':' in line)
+    except OSError:
+        return float('nan')
+    return sum(int(fields[key].split()[0]) for key in ('Private_Clean', 'Private_Dirty')) / 1024
+
+
+def load_inputs(task):
+    config_file, handle = task
+    before = private_mb()
+    start = time.perf_counter()
+    if handle is not None:
+        inputs = {name: output for name, (_, output) in attach_shared_inputs(handle).items()}
+    else:
+        from optimization_model import input_paths, read_config
+        from pipeline import STAGES
+        from stage_graph import run_stages
+
+        params = read_config(config_file)
+        inputs = run_stages(STAGES, params, input_paths(params), targets=SHARED_STAGES)
+    elapsed = time.perf_counter() - start
+    checksum = float(np.nansum(inputs['df_all'].values('NET DEMAND')))
+    return elapsed, private_mb() - before, checksum
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config_file')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    def run(handle):
+        # Fresh workers with the pipeline modules imported, so only the inputs are measured
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=__import__, initargs=('pipeline',)) as pool:
+            return list(pool.map(load_inputs, [(args.config_file, handle)] * args.workers))
+
+    parsed = run(None)
+    with share_pipeline_inputs(args.config_file) as shared:
+        attached = run(shared.handle)
+        shared_mb = shared.nbytes / 2 ** 20
+    assert np.allclose([row[2] for row in parsed], [row[2] for row in attached])
+
+    print(f"{args.workers} workers, shared block {shared_mb:.1f} MB")
+    for name, rows in [('parsed per worker', parsed), ('shared memory', attached)]:
+        times, memory = np.array([row[0] for row in rows]), np.array([row[1] for row in rows])
+        print(f"  {name:18s} inputs ready in {times.mean():6.2f} s per worker, "
+              f"{memory.mean():6.1f} MB private per worker ({memory.sum():6.1f} MB in total)")
+
+
+if __name__ == "__main__":
+    main()
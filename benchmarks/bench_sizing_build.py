@@ -0,0 +1,70 @@
+"""
+Benchmark: building the sizing model for a growing number of candidate sites.
+
+Builds the RE & BESS sizing model over 12 x 96 typical-day periods for registries of --sites synthetic sites
+(half solar, half wind, with random daily shapes) and reports the time taken to build it, the number of
+variables and constraints, and, with --solve, the time HiGHS takes to solve it.
+
+Usage:
+    python benchmarks/bench_sizing_build.py [--sites 7 35 70] [--solve]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Constraint, SolverFactory, Var
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sizing_model import build_sizing_model  # noqa: E402
+
+PERIODS = 12 * 96
+PARAMS = {'allow_oversized_re': True, 'penalty_sizing_unmet_demand': 1e5, 'battery_cost_mwh': 4500.0,
+          'max_size_batt_mwh': 3200.0, 'max_charge_discharge_power_bess': 400.0, 'max_gdam_purchase': 0.1,
+          'min_total_solar': 0.0, 'max_total_solar': 1e5, 'min_total_wind': 0.0, 'max_total_wind': 1e5}
+
+
+def synthetic_inputs(n_sites):
+    """Demand, GDAM price and a registry of n_sites sites with their 1 MW profiles."""
+    rng = np.random.default_rng(0)
+    slot = np.arange(PERIODS) % 96
+    demand = 800 + 200 * np.sin(2 * np.pi * slot / 96) + rng.normal(0, 20, PERIODS)
+    gdam_price = 4000 + rng.normal(0, 500, PERIODS)
+    technology = np.where(np.arange(n_sites) % 2 == 0, 'solar', 'wind')
+    sites = pd.DataFrame({'technology': technology, 'region': [f"Region {i}" for i in range(n_sites)],
+                          'losses': 0.045, 'cost': rng.uniform(2000, 4000, n_sites), 'min_mw': 0.0,
+                          'max_mw': np.where(np.arange(n_sites) % 5 == 0, 500.0, np.inf), 'profile': ''},
+                         index=pd.Index([f"site_{i}" for i in range(n_sites)], name='site'))
+    solar = np.clip(np.sin(np.pi * (slot - 24) / 48), 0, None)
+    profiles = {}
+    for site, tech in zip(sites.index, technology):
+        shape = solar if tech == 'solar' else 0.35 + 0.15 * np.cos(2 * np.pi * (slot - rng.integers(96)) / 96)
+        profiles[site] = np.clip(shape * rng.uniform(0.7, 1.0) + rng.normal(0, 0.02, PERIODS), 0, 1)
+    return demand, gdam_price, sites, profiles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sites', type=int, nargs='+', default=[7, 35, 70])
+    parser.add_argument('--solve', action='store_true')
+    args = parser.parse_args()
+
+    for n_sites in args.sites:
+        demand, gdam_price, sites, profiles = synthetic_inputs(n_sites)
+        start = time.perf_counter()
+        model = build_sizing_model(demand, gdam_price, sites, profiles, PARAMS)
+        build_s = time.perf_counter() - start
+        n_vars = sum(len(var) for var in model.component_objects(Var))
+        n_cons = sum(len(con) for con in model.component_objects(Constraint))
+        line = f"{n_sites:4d} sites  build {build_s:6.2f} s  {n_vars:7,d} variables  {n_cons:7,d} constraints"
+        if args.solve:
+            start = time.perf_counter()
+            SolverFactory('highs').solve(model)
+            line += f"  solve {time.perf_counter() - start:6.2f} s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
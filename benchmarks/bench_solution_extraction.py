@@ -0,0 +1,91 @@
+"""
+Benchmark: extracting a full-year thermal schedule from a solved Pyomo model.
+
+Compares the former cell-by-cell `schedule.loc[...] = value(...)` loop with the bulk extraction in
+solution_extraction.py on a model the size of the thermal dispatch (15 generators x 35,040 steps).
+The legacy loop is timed on the first --legacy-steps time steps and extrapolated unless --full is given.
+
+Usage:
+    python benchmarks/bench_solution_extraction.py [--legacy-steps 2000] [--full]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import ConcreteModel, NonNegativeReals, Param, RangeSet, Set, Var, value
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from solution_extraction import var_array, var_matrix  # noqa: E402
+
+N_GENERATORS = 15
+N_STEPS = 35040
+
+
+def build_solved_thermal_model():
+    rng = np.random.default_rng(0)
+    gen_list = [f"Generator {i}" for i in range(N_GENERATORS)]
+    model = ConcreteModel()
+    model.T = RangeSet(0, N_STEPS - 1)
+    model.I = Set(initialize=gen_list)
+    model.demand = Param(model.T, initialize=dict(enumerate(rng.uniform(0, 1000, N_STEPS))))
+    model.x = Var(model.I, model.T, domain=NonNegativeReals)
+    model.u = Var(model.T, domain=NonNegativeReals)
+    # Stand-in for a solve: give every variable a value
+    for v, x in zip(model.x.values(), rng.uniform(0, 500, N_GENERATORS * N_STEPS)):
+        v.set_value(x)
+    for v, x in zip(model.u.values(), rng.uniform(0, 10, N_STEPS)):
+        v.set_value(x)
+    return model, gen_list
+
+
+def legacy_extraction(model, gen_list, time_mapping, steps):
+    schedule = pd.DataFrame(index=[time_mapping[t] for t in range(steps)],
+                            columns=gen_list + ['Unserved Demand', 'With Surplus'])
+    for t in range(steps):
+        for i in model.I:
+            schedule.loc[time_mapping[t], i] = value(model.x[i, t])
+        schedule.loc[time_mapping[t], 'Unserved Demand'] = value(model.u[t])
+        schedule.loc[time_mapping[t], 'With Surplus'] = value(model.demand[t])
+    return schedule
+
+
+def bulk_extraction(model, gen_list, time_index):
+    schedule = pd.DataFrame(var_matrix(model.x, model.I, model.T).T, index=time_index, columns=gen_list)
+    schedule['Unserved Demand'] = var_array(model.u)
+    schedule['With Surplus'] = var_array(model.demand)
+    return schedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legacy-steps', type=int, default=2000)
+    parser.add_argument('--full', action='store_true', help="Run the legacy loop over the whole year.")
+    args = parser.parse_args()
+    legacy_steps = N_STEPS if args.full else min(args.legacy_steps, N_STEPS)
+
+    model, gen_list = build_solved_thermal_model()
+    time_index = pd.date_range('2027-01-01', periods=N_STEPS, freq='15min')
+    time_mapping = dict(enumerate(time_index))
+
+    start = time.perf_counter()
+    bulk = bulk_extraction(model, gen_list, time_index)
+    bulk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy = legacy_extraction(model, gen_list, time_mapping, legacy_steps)
+    legacy_time = (time.perf_counter() - start) * N_STEPS / legacy_steps
+
+    assert np.allclose(legacy.to_numpy(dtype=float), bulk.iloc[:legacy_steps].to_numpy())
+
+    print(f"Thermal schedule: {N_GENERATORS} generators x {N_STEPS} steps")
+    print(f"  legacy .loc loop : {legacy_time:10.2f} s"
+          + ("" if args.full else f"  (extrapolated from {legacy_steps} steps)"))
+    print(f"  bulk extraction  : {bulk_time:10.3f} s")
+    print(f"  speed-up         : {legacy_time / bulk_time:10.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(y, n_out):
+    """
+    Positions of the n_out points that best preserve the shape of a series when plotted
+    (Largest-Triangle-Three-Buckets).
+
+    The first and last points are always kept. The points between them are split into n_out - 2 equal
+    buckets, and from each bucket the point forming the largest triangle with the point kept from the
+    previous bucket and the average of the next bucket is kept, so peaks and troughs survive. The series is
+    assumed to be evenly spaced. NaN values are interpolated for the selection only.
+
+    Args:
+        y (array-like): The series.
+        n_out (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Increasing positions in y.
+    """
+    y = pd.Series(np.asarray(y, dtype=float)).interpolate(limit_direction='both').fillna(0).values
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        # Twice the triangle area for every candidate of the bucket
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def downsample(df, n_out):
+    """
+    Rows of df that preserve the shape of each column when plotted: the union of the LTTB points of every
+    column, so a chart of several series keeps the peaks of each of them.
+
+    Returns:
+        pd.DataFrame: The selected rows, in order (at most n_out rows per column).
+    """
+    if len(df) <= n_out:
+        return df
+    positions = np.unique(np.concatenate([lttb_indices(df[column].values, n_out) for column in df.columns]))
+    return df.iloc[positions]
@@ -0,0 +1,37 @@
+import os
+import threading
+
+import pandas as pd
+
+# Parsed input files of this process, keyed by reader, path, file version and reader arguments
+_tables = {}
+_lock = threading.Lock()
+
+
+def _cached(reader, path, kwargs):
+    stat = os.stat(path)
+    key = (reader.__name__, os.path.abspath(path), stat.st_mtime_ns, stat.st_size, repr(sorted(kwargs.items())))
+    with _lock:
+        table = _tables.get(key)
+    if table is None:
+        table = reader(path, **kwargs)
+        with _lock:
+            _tables[key] = table
+    # Callers modify their frames in place, so the cached copy is never handed out
+    return table.copy()
+
+
+def read_csv(path, **kwargs):
+    """pd.read_csv that parses each file once per process. Edited files are read again."""
+    return _cached(pd.read_csv, path, kwargs)
+
+
+def read_excel(path, **kwargs):
+    """pd.read_excel that parses each file once per process. Edited files are read again."""
+    return _cached(pd.read_excel, path, kwargs)
+
+
+def clear():
+    """Drops all cached inputs."""
+    with _lock:
+        _tables.clear()
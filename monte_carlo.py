@@ -0,0 +1,137 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from shared_inputs import SharedInputs, with_shared_inputs
+from sizing_verification import PERIOD_HOURS, battery_power, settle, simulate_battery
+
+PERIODS_PER_DAY = 96
+PERCENTILES = [50, 90, 99]
+
+
+def block_bootstrap_days(months, n_samples, block_days, rng):
+    """
+    Resampled calendars of days: every month is rebuilt from blocks of block_days consecutive days drawn
+    from the same month (wrapping around its end), so the seasonal pattern is kept and the weather of
+    neighbouring days stays together.
+
+    Args:
+        months (np.ndarray): Month of each day of the year.
+        n_samples (int): Number of calendars.
+        block_days (int): Length of the blocks (days).
+        rng (np.random.Generator): Source of the random draws.
+
+    Returns:
+        np.ndarray: The day of the year each day is taken from, shaped (n_samples, days).
+    """
+    days = np.arange(len(months))
+    month_start = pd.Series(days).groupby(months).transform('min').values
+    month_length = pd.Series(days).groupby(months).transform('size').values
+    day_of_month = days - month_start
+    block = np.cumsum(day_of_month % block_days == 0) - 1  # Block of each day, numbered over the year
+    offset = day_of_month % block_days  # Position of each day in its block
+    starts = rng.integers(0, 1 << 30, size=(n_samples, block[-1] + 1))
+    return month_start + (starts[:, block] % month_length + offset) % month_length
+
+
+def _simulate_batch(task):
+    """Simulates one batch of resampled years of the portfolio, in a worker process."""
+    task = with_shared_inputs(task)
+    rng = np.random.default_rng(task['seed'])
+    n_periods = len(task['demand'])
+    months = task['months'][::PERIODS_PER_DAY]
+    donors = block_bootstrap_days(months, task['n_samples'], task['block_days'], rng)
+    # Every source takes the same donor day, so the correlation between states is kept as it was
+    periods = (donors[:, :, None] * PERIODS_PER_DAY + np.arange(PERIODS_PER_DAY)).reshape(len(donors), -1)
+    net_demand = task['demand'][:, None] - task['re_generation'][periods[:, :n_periods].T]
+
+    charge, discharge, _ = simulate_battery(net_demand, task['capacity'], task['power'])
+    gdam_purchase, deficit, curtailment = settle(net_demand, charge, discharge, task['gdam_price'][:, None],
+                                                 task['params'])
+    deficit_mwh = deficit.sum(axis=0) * PERIOD_HOURS
+    return pd.DataFrame({
+        'deficit_mwh': deficit_mwh,
+        'loss_of_load_hours': (deficit > 1e-6).sum(axis=0) * PERIOD_HOURS,
+        'peak_deficit_mw': deficit.max(axis=0),
+        'gdam_purchase_mwh': gdam_purchase.sum(axis=0) * PERIOD_HOURS,
+        'curtailment_mwh': curtailment.sum(axis=0) * PERIOD_HOURS,
+        'battery_cycles': (discharge.sum(axis=0) * PERIOD_HOURS / task['capacity'] if task['capacity'] > 0
+                           else np.zeros(len(deficit_mwh))),
+    })
+
+
+def monte_carlo_deficit(result_sizing, demand, production, gdam_price, params, n_samples=1000, block_days=3,
+                        batch_size=32, workers=0, seed=0):
+    """
+    Deficit distribution of a sized portfolio under resource uncertainty.
+
+    Each sample is a year of solar and wind built by block bootstrap of days within each month (see
+    block_bootstrap_days), taking all states from the same donor days, pushed through the net demand and
+    the battery and GDAM simulation of the full-year verification. Samples are simulated in batches, a
+    batch at once as the columns of one array, spread over a pool of worker processes that read the profiles
+    from shared memory. Each batch has its own seed derived from seed, so the results do not depend on the
+    number of workers.
+
+    Args:
+        result_sizing (dict): Capacities of the portfolio (keyed by site, and the battery).
+        demand (pd.Series): Unserved demand to cover in every period of the year (MW).
+        production (pd.DataFrame): Production of 1 MW of each site (columns) in every period, net of losses.
+        gdam_price (np.ndarray): GDAM price of every period.
+        params (dict): 'max_charge_discharge_power_bess', 'max_gdam_purchase' and
+                       'penalty_sizing_unmet_demand'.
+        n_samples (int): Number of resampled years.
+        block_days (int): Length of the bootstrap blocks (days).
+        batch_size (int): Samples simulated together by a worker.
+        workers (int): Number of worker processes. 0 uses one per CPU core.
+        seed (int): Seed of the random draws.
+
+    Returns:
+        dict: 'samples' (KPIs of each sample), 'summary' (mean and percentiles of each KPI) and 'reliability'
+              (LOLE, LOLP and expected unserved energy).
+    """
+    start = time.perf_counter()
+    capacity = result_sizing['battery_capacity']
+    re_generation = sum(np.asarray(production[site], dtype=float) * result_sizing[site] for site in production)
+    sizes = [int(batch_size)] * (int(n_samples) // int(batch_size))
+    if int(n_samples) % int(batch_size):
+        sizes.append(int(n_samples) % int(batch_size))
+    seeds = np.random.SeedSequence(int(seed)).spawn(len(sizes))
+    common = {'demand': demand.values.astype(float), 're_generation': re_generation,
+              'gdam_price': np.asarray(gdam_price, dtype=float), 'months': demand.index.month.values,
+              'block_days': max(int(block_days), 1), 'capacity': capacity,
+              'power': battery_power(capacity, result_sizing['max_charge_rate'],
+                                     params['max_charge_discharge_power_bess']),
+              'params': {key: params[key] for key in ('max_gdam_purchase', 'penalty_sizing_unmet_demand')}}
+    tasks = [{'n_samples': size, 'seed': batch_seed} for size, batch_seed in zip(sizes, seeds)]
+
+    workers = min(int(workers) or os.cpu_count() or 1, len(tasks))
+    logging.info(f"*** Monte Carlo: {int(n_samples)} samples in {len(tasks)} batches with {workers} "
+                 f"worker(s) *** \n")
+    if workers == 1:
+        results = [_simulate_batch({**common, **task}) for task in tasks]
+    else:
+        with SharedInputs(common) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_batch, [dict(task, shared_inputs=shared.handle) for task in tasks]))
+
+    samples = pd.concat(results, ignore_index=True).rename_axis('sample')
+    summary = samples.describe(percentiles=[p / 100 for p in PERCENTILES]).T
+    summary = summary[['mean', 'std', 'min'] + [f"{p}%" for p in PERCENTILES] + ['max']]
+    summary = summary.rename(columns={f"{p}%": f"P{p}" for p in PERCENTILES})
+    summary.index.name = 'KPI'
+    hours = len(demand) * PERIOD_HOURS
+    reliability = pd.Series({
+        'samples': float(len(samples)),
+        'LOLE (hours/year)': samples['loss_of_load_hours'].mean(),
+        'LOLP': samples['loss_of_load_hours'].mean() / hours,
+        'EUE (MWh/year)': samples['deficit_mwh'].mean(),
+        'share of years with loss of load': (samples['loss_of_load_hours'] > 0).mean(),
+    }, name='Value').rename_axis('Metric').to_frame()
+    logging.info(f"*** Monte Carlo finished in {time.perf_counter() - start:.1f} s: deficit P50 "
+                 f"{summary.loc['deficit_mwh', 'P50']:,.0f} / P90 {summary.loc['deficit_mwh', 'P90']:,.0f} / P99 "
+                 f"{summary.loc['deficit_mwh', 'P99']:,.0f} MWh, LOLE "
+                 f"{reliability.loc['LOLE (hours/year)', 'Value']:,.1f} h *** \n")
+    return {'samples': samples, 'summary': summary, 'reliability': reliability}
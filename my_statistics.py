@@ -2,6 +2,26 @@ import pandas as pd
 import numpy as np
 
 
+# Define a function to calculate the magnitude of the duck curve for a given day.
+def _duck_magnitude(day_df):
+    if day_df.empty:
+        return np.nan
+
+    # Define time windows for the midday solar peak and the evening demand peak.
+    midday_window = day_df.between_time('10:00', '15:45')
+    evening_window = day_df.between_time('17:00', '21:45')
+
+    # Proceed only if there's data in both windows.
+    if midday_window.empty or evening_window.empty:
+        return np.nan
+
+    midday_min_net_demand = midday_window['NET DEMAND'].min()
+    evening_peak_net_demand = evening_window['NET DEMAND'].max()
+
+    # The "duck belly to head" height.
+    return evening_peak_net_demand - midday_min_net_demand
+
+
 def weekly_stat_analysis(df_all):
     """
     Analyzes weekly statistics to find interesting periods based on demand,
@@ -15,7 +35,9 @@ def weekly_stat_analysis(df_all):
 
     Args:
         df_all (pd.DataFrame): A DataFrame with 15-minute interval data, including
-                               'TOTAL DEMAND', 'renewable', and 'NET DEMAND' columns.
+                               'TOTAL DEMAND', 'renewable', and 'NET DEMAND' columns, or an iterable of
+                               consecutive chunks of it split at day boundaries (e.g. ProfileFrame.chunks),
+                               so long histories are read one chunk at a time.
 
     Returns:
         tuple: A tuple containing:
@@ -23,42 +45,40 @@ def weekly_stat_analysis(df_all):
             - interesting_weeks (dict): A dictionary listing the start dates of weeks for each interesting category.
     """
     # --- 1. Calculate Daily Metrics First ---
-    # The 'NET DEMAND' column is crucial for duck curve and ramping analysis.
-    if 'NET DEMAND' not in df_all.columns:
-        raise ValueError("Input DataFrame must contain a 'NET DEMAND' column.")
-
-    daily_resampler = df_all.resample('D')
-
-    # Define a function to calculate the magnitude of the duck curve for a given day.
-    def get_duck_magnitude(day_df):
-        if day_df.empty:
-            return np.nan
-
-        # Define time windows for the midday solar peak and the evening demand peak.
-        midday_window = day_df.between_time('10:00', '15:45')
-        evening_window = day_df.between_time('17:00', '21:45')
-
-        # Proceed only if there's data in both windows.
-        if midday_window.empty or evening_window.empty:
-            return np.nan
-
-        midday_min_net_demand = midday_window['NET DEMAND'].min()
-        evening_peak_net_demand = evening_window['NET DEMAND'].max()
-
-        # The "duck belly to head" height.
-        return evening_peak_net_demand - midday_min_net_demand
-
-    # Apply the functions to get daily values.
-    daily_duck_magnitude = daily_resampler.apply(get_duck_magnitude)
-    daily_max_ramp = daily_resampler['NET DEMAND'].apply(lambda day: day.diff().abs().max())
+    # A single DataFrame is one chunk. Chunks are split at day boundaries, so every day lies within one chunk,
+    # while weekly totals are accumulated across chunks and only turned into means at the end.
+    chunks = [df_all] if isinstance(df_all, pd.DataFrame) else df_all
+    daily_duck_magnitudes, daily_max_ramps, weekly_totals = [], [], []
+    for chunk in chunks:
+        # The 'NET DEMAND' column is crucial for duck curve and ramping analysis.
+        if 'NET DEMAND' not in chunk.columns:
+            raise ValueError("Input DataFrame must contain a 'NET DEMAND' column.")
+
+        daily_resampler = chunk.resample('D')
+
+        # Apply the functions to get daily values.
+        daily_duck_magnitudes.append(daily_resampler.apply(_duck_magnitude))
+        daily_max_ramps.append(daily_resampler['NET DEMAND'].apply(lambda day: day.diff().abs().max()))
+
+        weekly = chunk[['TOTAL DEMAND', 'renewable', 'NET DEMAND']].resample('W')
+        weekly_totals.append(pd.concat({'sum': weekly.sum(), 'count': weekly.count(),
+                                        'sum_sq': (chunk[['NET DEMAND']] ** 2).resample('W').sum()}, axis=1))
+
+    daily_duck_magnitude = pd.concat(daily_duck_magnitudes)
+    daily_max_ramp = pd.concat(daily_max_ramps)
+    totals = pd.concat(weekly_totals).groupby(level=0).sum()
+    means = totals['sum'] / totals['count']
+    net_demand_count = totals['count', 'NET DEMAND']
+    net_demand_variance = ((totals['sum_sq', 'NET DEMAND'] - totals['sum', 'NET DEMAND'] ** 2 / net_demand_count)
+                           / (net_demand_count - 1).where(net_demand_count > 1))
 
     # --- 2. Aggregate Daily Metrics into Weekly Stats ---
     weekly_stats = pd.DataFrame()
-    weekly_stats['avg_demand'] = df_all['TOTAL DEMAND'].resample('W').mean()
-    weekly_stats['avg_renewable'] = df_all['renewable'].resample('W').mean()
+    weekly_stats['avg_demand'] = means['TOTAL DEMAND']
+    weekly_stats['avg_renewable'] = means['renewable']
     weekly_stats['avg_duck_magnitude'] = daily_duck_magnitude.resample('W').mean()
     weekly_stats['avg_max_ramp'] = daily_max_ramp.resample('W').mean()
-    weekly_stats['net_demand_std'] = df_all['NET DEMAND'].resample('W').std()  # Proxy for overall volatility.
+    weekly_stats['net_demand_std'] = np.sqrt(net_demand_variance.clip(lower=0))  # Proxy for overall volatility.
 
     weekly_stats.dropna(inplace=True)  # Ensure all weeks have valid data.
 
@@ -90,68 +110,100 @@ def weekly_stat_analysis(df_all):
     return weekly_stats, interesting_weeks
 
 
-def battery_fixed_size_calculations(df_filtered, min_batt_soc, batt_efficiency, battery_configs):
-    # This function remains unchanged.
-
-    # Define battery storage parameters (MW size needs to be provided)
-
-    # Extract relevant time-series from df_filtered
-    time_series = df_filtered.index
-    original_surplus = df_filtered["WITH SURPLUS"].values  # Demand (+) and surplus (-)
-
-    # Initialize storage tracking
-    battery_profiles = {}
-    remaining_surplus_history = {}  # Store remaining_surplus after each battery
-    remaining_surplus = original_surplus.copy()  # Make a copy to update after each battery
-
-    for battery_name, config in battery_configs.items():
-        power = config["power"]
-        capacity = power * config["duration"]
-
-        # Initialize tracking variables
-        battery_energy = 0
-        charge_profile = []
-        discharge_profile = []
-        battery_state = []
-
-        # Iterate over time intervals (15-minute resolution)
-        for i, surplus in enumerate(remaining_surplus):
-            if surplus < 0:  # Charging condition
-                if battery_energy < capacity:
-                    charge = min(abs(surplus), power)
-                    charge = min(charge, (capacity - battery_energy) * 0.25)
-                else:
+def iter_battery_fixed_size(chunks, min_batt_soc, batt_efficiency, battery_configs):
+    """
+    Greedy charge/discharge of the fixed-size batteries over consecutive chunks of the timeline, carrying
+    the stored energy of every battery from one chunk to the next.
+
+    Args:
+        chunks (iterable): Consecutive DataFrames (or ProfileFrames) with a 'WITH SURPLUS' column.
+        min_batt_soc (float): Minimum state of charge as a fraction of the capacity.
+        batt_efficiency (float): Charging efficiency.
+        battery_configs (dict): 'power' and 'duration' of each battery, applied in order.
+
+    Yields:
+        tuple: The battery profiles and the remaining surplus after each battery, for one chunk.
+    """
+    battery_energies = {battery_name: 0 for battery_name in battery_configs}
+    for df_filtered in chunks:
+        # Extract relevant time-series from df_filtered
+        time_series = df_filtered.index
+        original_surplus = df_filtered["WITH SURPLUS"].values  # Demand (+) and surplus (-)
+
+        # Initialize storage tracking
+        battery_profiles = {}
+        remaining_surplus_history = {}  # Store remaining_surplus after each battery
+        remaining_surplus = np.array(original_surplus, dtype=float)  # Make a copy to update after each battery
+
+        for battery_name, config in battery_configs.items():
+            power = config["power"]
+            capacity = power * config["duration"]
+
+            # Initialize tracking variables
+            battery_energy = battery_energies[battery_name]
+            charge_profile = []
+            discharge_profile = []
+            battery_state = []
+
+            # Iterate over time intervals (15-minute resolution)
+            for i, surplus in enumerate(remaining_surplus):
+                if surplus < 0:  # Charging condition
+                    if battery_energy < capacity:
+                        charge = min(abs(surplus), power)
+                        charge = min(charge, (capacity - battery_energy) * 0.25)
+                    else:
+                        charge = 0
+                    battery_energy = min(battery_energy + charge * 0.25 * batt_efficiency, capacity)
+                    remaining_surplus[i] += charge  # Reduce surplus (since charging absorbs it)
+                    discharge = 0
+                elif surplus > 0:  # Discharging condition
+                    if battery_energy > capacity * min_batt_soc:
+                        discharge = min(surplus, power)
+                        discharge = min(discharge, (battery_energy - capacity * min_batt_soc) / 0.25)
+                    else:
+                        discharge = 0
+                    battery_energy = battery_energy - discharge * 0.25
+                    remaining_surplus[i] -= discharge * batt_efficiency  # Reduce demand (since discharging supplies it)
                     charge = 0
-                battery_energy = min(battery_energy + charge * 0.25 * batt_efficiency, capacity)
-                remaining_surplus[i] += charge  # Reduce surplus (since charging absorbs it)
-                discharge = 0
-            elif surplus > 0:  # Discharging condition
-                if battery_energy > capacity * min_batt_soc:
-                    discharge = min(surplus, power)
-                    discharge = min(discharge, (battery_energy - capacity * min_batt_soc) / 0.25)
                 else:
+                    charge = 0
                     discharge = 0
-                battery_energy = battery_energy - discharge * 0.25
-                remaining_surplus[i] -= discharge * batt_efficiency  # Reduce demand (since discharging supplies it)
-                charge = 0
-            else:
-                charge = 0
-                discharge = 0
-
-            # Store results
-            charge_profile.append(charge)
-            discharge_profile.append(discharge)
-            battery_state.append(battery_energy)
-
-        # Store profiles in DataFrame
-        battery_profiles[battery_name] = pd.DataFrame({
-            "Timestamp": time_series,
-            "Charge (MW)": charge_profile,
-            "Discharge (MW)": discharge_profile,
-            "Battery State (MWh)": battery_state
-        }).set_index("Timestamp")
-
-        # Store remaining surplus after this battery processes it
-        remaining_surplus_history[battery_name] = remaining_surplus.copy()
 
+                # Store results
+                charge_profile.append(charge)
+                discharge_profile.append(discharge)
+                battery_state.append(battery_energy)
+            battery_energies[battery_name] = battery_energy
+
+            # Store profiles in DataFrame
+            battery_profiles[battery_name] = pd.DataFrame({
+                "Timestamp": time_series,
+                "Charge (MW)": charge_profile,
+                "Discharge (MW)": discharge_profile,
+                "Battery State (MWh)": battery_state
+            }).set_index("Timestamp")
+
+            # Store remaining surplus after this battery processes it
+            remaining_surplus_history[battery_name] = remaining_surplus.copy()
+
+        yield battery_profiles, remaining_surplus_history
+
+
+def battery_fixed_size_calculations(df_filtered, min_batt_soc, batt_efficiency, battery_configs):
+    """
+    Greedy charge/discharge profiles of the fixed-size batteries (see iter_battery_fixed_size).
+
+    Args:
+        df_filtered: DataFrame or ProfileFrame with a 'WITH SURPLUS' column, or an iterable of consecutive
+                     chunks of one.
+
+    Returns:
+        tuple: The profile of each battery and the remaining surplus after each battery, over the whole timeline.
+    """
+    chunks = [df_filtered] if hasattr(df_filtered, 'index') else df_filtered
+    results = list(iter_battery_fixed_size(chunks, min_batt_soc, batt_efficiency, battery_configs))
+    battery_profiles = {battery_name: pd.concat([profiles[battery_name] for profiles, _ in results])
+                        for battery_name in battery_configs}
+    remaining_surplus_history = {battery_name: np.concatenate([history[battery_name] for _, history in results])
+                                 for battery_name in battery_configs}
     return battery_profiles, remaining_surplus_history
\ No newline at end of file
@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Constraint, Objective, Param, SolverFactory, Suffix, value
+
+from shared_inputs import SharedInputs, with_shared_inputs
+from sizing_model import build_sizing_model, capacity_values
+from solution_extraction import var_array
+from solver_utils import solve_with_budget
+
+
+def _build_epsilon_model(demand, gdam_price, sites, profiles, params):
+    """
+    Sizing model whose objective is the cost alone, with the total deficit capped by a mutable parameter.
+
+    The deficit penalty is set to zero, so the cap (epsilon) is the only thing limiting the deficit.
+    """
+    model = build_sizing_model(demand, gdam_price, sites, profiles, dict(params, penalty_sizing_unmet_demand=0))
+    model.deficit_cap = Param(initialize=float(np.sum(demand)) + 1, mutable=True)
+    model.deficit_limit = Constraint(expr=sum(model.deficit[t] for t in model.T) <= model.deficit_cap)
+    model.total_deficit = Objective(expr=sum(model.deficit[t] for t in model.T))
+    model.total_deficit.deactivate()
+    model.dual = Suffix(direction=Suffix.IMPORT)
+    return model
+
+
+def _solve_segment(task):
+    """
+    Solves a run of neighbouring frontier points in one worker process.
+
+    The points are solved in order with one solver instance, which keeps the model and its basis, so
+    each point is warm-started from the previous one and only the deficit cap changes in between.
+    """
+    task = with_shared_inputs(task)
+    model = _build_epsilon_model(task['demand'], task['gdam_price'], task['sites'], task['profiles'],
+                                 task['params'])
+    solver = SolverFactory('highs')
+    rows = []
+    for deficit_cap in task['deficit_caps']:
+        model.deficit_cap = deficit_cap
+        status = solve_with_budget(solver, model, f"frontier [deficit <= {deficit_cap:,.1f}]",
+                                   time_limit=task['time_limit'], mip_gap=task['mip_gap'], tee=False)
+        row = {'deficit_cap': deficit_cap, 'termination': status['termination'],
+               'solve_time_s': status['solve_time_s']}
+        if status['has_solution']:
+            row['cost'] = value(model.objective)
+            row['total_deficit'] = var_array(model.deficit).sum()
+            # Cost saved per extra MWh of deficit allowed (the slope of the frontier)
+            row['marginal_cost_per_mwh'] = -model.dual[model.deficit_limit]
+            row.update(capacity_values(model))
+        rows.append(row)
+    return rows
+
+
+def pareto_frontier(demand, gdam_price, sites, profiles, params, n_points=10, workers=0, time_limit=0, mip_gap=None):
+    """
+    Generates the cost vs total deficit Pareto frontier of the sizing model with the epsilon-constraint method.
+
+    The two ends of the frontier are found first: the lowest achievable deficit and the deficit of the
+    cheapest sizing. The deficit caps in between are split into contiguous segments that are solved in
+    parallel worker processes, each segment warm-starting every point from its neighbour. The profiles are
+    placed once in shared memory for the workers.
+
+    Args:
+        demand: Unserved demand to be covered in each sizing period.
+        gdam_price: GDAM price in each sizing period.
+        sites (pd.DataFrame): Candidate sites of the sizing (see site_registry).
+        profiles (dict): Normalized production in each period, keyed by site.
+        params (dict): Configuration parameters as returned by read_config.
+        n_points (int): Number of points on the frontier, including both ends.
+        workers (int): Number of worker processes. 0 uses one per CPU core.
+        time_limit (float): Time budget in seconds of each solve. 0 means no limit.
+        mip_gap (float): Relative MIP gap of each solve.
+
+    Returns:
+        pd.DataFrame: One row per frontier point (sorted by deficit) with the cost, the total deficit, the
+                      marginal cost of the deficit and the capacities. Empty if the model is infeasible.
+    """
+    start = time.perf_counter()
+    n_points = max(int(n_points), 2)
+    logging.info(f"*** Generating cost vs deficit frontier with {n_points} points *** \n")
+
+    # Ends of the frontier: lowest possible deficit, then the cheapest sizing without a deficit limit
+    model = _build_epsilon_model(demand, gdam_price, sites, profiles, params)
+    solver = SolverFactory('highs')
+    model.objective.deactivate()
+    model.total_deficit.activate()
+    status = solve_with_budget(solver, model, 'frontier [minimum deficit]', time_limit=time_limit,
+                               mip_gap=mip_gap, tee=False)
+    if not status['has_solution']:
+        logging.error("*** Frontier: the sizing model has no solution; no frontier generated *** \n")
+        return pd.DataFrame()
+    min_deficit = value(model.total_deficit)
+    model.total_deficit.deactivate()
+    model.objective.activate()
+    status = solve_with_budget(solver, model, 'frontier [minimum cost]', time_limit=time_limit,
+                               mip_gap=mip_gap, tee=False)
+    max_deficit = var_array(model.deficit).sum()
+
+    # Loosest cap first so each segment tightens the deficit step by step
+    deficit_caps = np.linspace(max_deficit, min_deficit, n_points)
+    deficit_caps[-1] = min_deficit * (1 + 1e-9) + 1e-6  # Keep the tightest point feasible within tolerances
+    workers = min(int(workers) or os.cpu_count() or 1, n_points)
+    segments = [segment.tolist() for segment in np.array_split(deficit_caps, workers)]
+    common = {'demand': np.asarray(demand, dtype=float), 'gdam_price': np.asarray(gdam_price, dtype=float),
+              'sites': sites, 'profiles': {name: np.asarray(p, dtype=float) for name, p in profiles.items()},
+              'params': params, 'time_limit': time_limit, 'mip_gap': mip_gap}
+    tasks = [{'deficit_caps': segment} for segment in segments]
+
+    if workers == 1:
+        results = [_solve_segment({**common, **tasks[0]})]
+    else:
+        with SharedInputs(common) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_solve_segment, [dict(task, shared_inputs=shared.handle) for task in tasks]))
+
+    frontier = pd.DataFrame([row for rows in results for row in rows]).sort_values('deficit_cap')
+    frontier = frontier.reset_index(drop=True).rename_axis('point')
+    logging.info(f"*** Frontier generated in {time.perf_counter() - start:.1f} s "
+                 f"(deficit {min_deficit:,.1f} to {max_deficit:,.1f} MWh) *** \n")
+    return frontier
@@ -0,0 +1,775 @@
+import logging
+import os
+import traceback
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import SolverFactory
+
+import input_cache
+from battery_dispatch import optimal_battery_dispatch
+from my_statistics import weekly_stat_analysis, battery_fixed_size_calculations, iter_battery_fixed_size
+from monte_carlo import monte_carlo_deficit
+from pareto_frontier import pareto_frontier
+from profile_frame import ProfileFrame
+from profile_store import store_chunks
+from re_profiles import (TARGET_CUFS, load_wind_yearly, calculate_monthly_cuf, adjust_generation_profile,
+                         adjust_wind_cuf_profile, monthly_time_slot_average, shortage_sizing_profile)
+from sensitivity import solve_with_sensitivity, sizing_sensitivity_report, thermal_sensitivity_report
+from site_registry import BUILTIN_PROFILES, CONFIG_SITE_PARAMS, load_site_registry, resolve_path, site_production
+from sizing_model import build_sizing_model, capacity_values, SERIES_VARIABLES
+from sizing_verification import verification_summary, verify_sizing
+from solution_extraction import var_array, var_matrix, series_frame
+from solver_race import race_solve
+from solver_utils import solve_with_budget
+from stochastic_sizing import (EXTENSIVE_FORM_MAX_SCENARIOS, benders_sizing, build_scenarios, extensive_form_sizing,
+                               scenario_name)
+from stress_weeks import analyze_stress_weeks
+from thermal_dispatch import build_thermal_model, dispatch_thermal
+from validation import (check_alignment, check_monthly_cuf, check_timestamps, check_values, raise_for_issues,
+                        validate_demand_history, validate_inputs, validate_sizing_inputs)
+
+SOLAR_FILES = {'goa': 'file_path_solar_goa', 'gujarat': 'file_path_solar_gujarat',
+               'rajasthan': 'file_path_solar_rajasthan', 'telangana': 'file_path_solar_telangana'}
+
+RAMP_RATE = 0.15  # 1% is ramp rate per minute so for 15 minutes 0.15
+MIN_GEN_FACTOR = 0.5  # Minimum generation limit as a fraction of capacity
+
+# Columns of the profile of each battery (see my_statistics.iter_battery_fixed_size)
+BATTERY_PROFILE_COLUMNS = ['Charge (MW)', 'Discharge (MW)', 'Battery State (MWh)']
+
+SOLVER_PARAMS = ['solver_mode', 'race_solvers']
+SIZING_PARAMS = ['allow_oversized_re', 'penalty_sizing_unmet_demand', 'battery_cost_mwh', 'max_size_batt_mwh',
+                 'max_charge_discharge_power_bess', 'max_gdam_purchase', 'min_total_solar', 'max_total_solar',
+                 'min_total_wind', 'max_total_wind']
+
+
+def _race_solvers(params):
+    return [name.strip() for name in str(params.get('race_solvers', 'highs_choose')).split(',') if name.strip()]
+
+
+def load_demand_history(params, paths):
+    """The 2022 15-min demand profile the target year is scaled from, indexed by Timestamp."""
+    # Load Demand Data
+    logging.info("*** Reading Demand Data File *** \n")
+    df_demand = input_cache.read_csv(paths['file_path'][0], parse_dates=['Timestamp'], dayfirst=True)
+    df_demand['Timestamp'] = pd.to_datetime(df_demand['Timestamp'], format='%d-%m-%Y %H:%M:%S')
+    df_demand['TOTAL DEMAND'] = pd.to_numeric(df_demand['TOTAL DEMAND'].astype(str).str.replace(',', '').str.strip(),
+                                              errors='coerce')
+    df_demand = df_demand[(df_demand['Timestamp'] >= '2022-01-01') & (df_demand['Timestamp'] < '2023-01-01')]
+    df_demand.set_index('Timestamp', inplace=True)
+
+    # Ensure the 'Timestamp' column is the index and is in datetime format
+    df_demand.index = pd.to_datetime(df_demand.index)
+
+    # The target year is built from this profile position by position, so it must be complete and regular
+    validate_demand_history(df_demand, int(params.get('max_missing_periods', 4)))
+    return df_demand
+
+
+def load_demand(params, paths, demand_history):
+    """Demand of the target year: the 2022 profile rescaled day by day to the monthly FY30 estimates."""
+    demand_scaling_factor = params['annual_demand_mus'] / 7471  # 7471 is the original annual MUs considered for FY30 (based on CEA estimate)
+    df_demand = demand_history
+
+    # Resample the data to daily frequency and sum the total demand for each day
+    daily_energy_consumption = df_demand['TOTAL DEMAND'].resample('D').sum() / 4
+
+    def calculate_daily_energy_consumption(target_year, daily_energy_consumption_base,
+                                           monthly_energy_consumption_target):
+        # Ensure the 'Timestamp' column is the index and is in datetime format
+        daily_energy_consumption_base.index = pd.to_datetime(daily_energy_consumption_base.index)
+
+        # Calculate the monthly energy consumption for the base year (dividing by 1000 because monthly-target will be in Million Units - MUs)
+        monthly_energy_consumption_base = daily_energy_consumption_base.resample('M').sum() / 1000
+
+        # Calculate the daily energy consumption for the target year
+        daily_energy_consumption_target = daily_energy_consumption_base.copy()
+        for month in monthly_energy_consumption_target.index:
+            month_base = month.replace(str(target_year), str(daily_energy_consumption_base.index.year[0]))
+            daily_energy_consumption_target.loc[
+                daily_energy_consumption_base.index.month == pd.to_datetime(month).month] = (
+                    daily_energy_consumption_base.loc[
+                        daily_energy_consumption_base.index.month == pd.to_datetime(month_base).month] *
+                    monthly_energy_consumption_target[month] /
+                    monthly_energy_consumption_base[month_base]
+            )
+
+        # Adjust the timestamps to reflect the target year
+        daily_energy_consumption_target.index = daily_energy_consumption_target.index.map(
+            lambda x: x.replace(year=target_year))
+
+        ratio = daily_energy_consumption_target.values / daily_energy_consumption_base.values
+
+        return daily_energy_consumption_target, ratio
+
+    # Monthly energy consumption (MUs) estimated for 2030
+    monthly_energy_consumption_2030 = pd.Series({
+        '2030-01-31': 633, '2030-02-28': 598, '2030-03-31': 673, '2030-04-30': 685,
+        '2030-05-31': 716, '2030-06-30': 641, '2030-07-31': 581, '2030-08-31': 486,
+        '2030-09-30': 594, '2030-10-31': 615, '2030-11-30': 610, '2030-12-31': 635
+    })
+    monthly_energy_consumption_2030 = monthly_energy_consumption_2030 * demand_scaling_factor
+
+    # Calculate the daily energy consumption for future year
+    daily_energy_consumption_2030, ratio_2030 = calculate_daily_energy_consumption(2030, daily_energy_consumption,
+                                                                                   monthly_energy_consumption_2030)
+
+    ratio_2030 = pd.Series(ratio_2030, index=pd.date_range(start='2030-01-01', periods=365, freq='D'))
+    # Create full 15-minute interval index including last day
+    full_index = pd.date_range(start='2030-01-01', end='2030-12-31 23:45:00', freq='15T')
+
+    # Reindex and forward fill
+    ratio_2030_resampled = ratio_2030.reindex(full_index, method='ffill')
+
+    # Multiply the TOTAL DEMAND values with the resampled ratio
+    adjusted_demand_values = df_demand['TOTAL DEMAND'].values * ratio_2030_resampled.values
+
+    # Create a new DataFrame with the adjusted demand values and updated timestamps
+    target_year = pd.to_datetime(params['timeline_start_date']).year
+    df_demand_year = pd.DataFrame({
+        'Timestamp': df_demand.index.map(lambda x: x.replace(year=target_year)),
+        'TOTAL DEMAND': adjusted_demand_values
+    })
+    return df_demand_year.set_index('Timestamp')
+
+
+def _solar_profile(df_solar, name='solar'):
+    """Normalized (1 MW) 15-min solar production from an hourly PV profile."""
+    # Ensure 'local_time' is datetime format
+    df_solar["local_time"] = pd.to_datetime(df_solar["local_time"], format="%d-%m-%Y %H:%M", errors="coerce")
+    raise_for_issues(check_timestamps(df_solar["local_time"], name), 'solar')
+    # Create a full 15-minute timestamp range
+    common_index = pd.date_range(
+        start=df_solar["local_time"].min().replace(minute=0),  # Start at 00:00
+        end=df_solar["local_time"].max().replace(hour=23, minute=45),  # End at 23:45
+        freq="15min")
+    # Reindex to match 15-minute intervals
+    df_solar = df_solar.set_index("local_time").reindex(common_index)
+    # Forward-fill to copy hourly values to missing 15-min slots
+    df_solar["electricity"] = df_solar["electricity"].fillna(method="ffill").fillna(0)
+    # Rename columns and set index
+    df_solar = df_solar.rename(columns={"electricity": "Solar Production"})
+    df_solar.index.name = "Timestamp"
+    return df_solar.sort_index()
+
+
+def load_re_profiles(params, paths):
+    """
+    Reads the wind and solar profiles and scales them to the CEA monthly CUF of each state.
+
+    Returns:
+        dict: 'wind_maharashtra', 'wind_tamil' and 'wind_karnataka' ('Wind Production' of the SRI wind year at
+              its configured size) and 'solar_goa', 'solar_gujarat', 'solar_rajasthan' and 'solar_telangana'
+              ('Solar Production' of 1 MW).
+    """
+    wind_size_actual_SRI = params['wind_size_actual_sri']
+    logging.info("*** Reading Solar and Wind Data Files *** \n")
+    df_wind_long = load_wind_yearly(paths['file_path_wind_sri'][0], params['wind_size_excel_sri'],
+                                    wind_size_actual_SRI)
+    solar = {state: _solar_profile(input_cache.read_csv(paths[key][0], parse_dates=["local_time"]), f"solar {state}")
+             for state, key in SOLAR_FILES.items()}
+
+    ### To make PV generation zero for goa in specific dates
+    df_solar_goa = solar['goa']
+    solar_data_year = df_solar_goa.index[0].year
+    for start_key, end_key in [('zero_pv_goa_start_date', 'zero_pv_goa_end_date'),
+                               ('zero_pv_goa_start_date2', 'zero_pv_goa_end_date2')]:
+        # Replace the year in the dates with the year of the solar data
+        zero_start = pd.to_datetime(params[start_key]).replace(year=solar_data_year)
+        zero_end = pd.to_datetime(params[end_key]).replace(year=solar_data_year)
+        df_solar_goa.loc[zero_start:zero_end, 'Solar Production'] = 0
+
+    wind_cuf = calculate_monthly_cuf(df_wind_long, 'wind', wind_size_actual_SRI)
+    solar_cuf = {state: calculate_monthly_cuf(solar[state], 'solar') for state in ['gujarat', 'rajasthan', 'telangana']}
+
+    # The target CUFs are divided by the CUF of each month, which must therefore be positive
+    raise_for_issues(check_monthly_cuf(wind_cuf, 'SRI wind') +
+                     sum((check_monthly_cuf(cuf, f"solar {state}") for state, cuf in solar_cuf.items()), []),
+                     'CUF')
+
+    profiles = {'solar_goa': df_solar_goa}
+    for state, cuf_key in [('gujarat', 'gujarat'), ('rajasthan', 'rajasthan'), ('telangana', 'telangana')]:
+        profiles[f"solar_{state}"] = adjust_generation_profile(solar[state], solar_cuf[state], TARGET_CUFS[cuf_key])
+    for state, cuf_key in [('maharashtra', 'maharashtra_wind'), ('tamil', 'tamil_wind'),
+                           ('karnataka', 'karnataka_wind')]:
+        profiles[f"wind_{state}"] = adjust_wind_cuf_profile(df_wind_long, wind_cuf, TARGET_CUFS[cuf_key])
+    return profiles
+
+
+def _sum_of(frame, columns):
+    total = np.zeros(len(frame))
+    for column in columns:
+        total += frame.values(column)
+    return total
+
+
+def _total_solar(frame):
+    return _sum_of(frame, ['Solar Production Gujarat', 'Solar Production Telangana', 'Solar Production Rajasthan',
+                           'DRE Production', 'Solar Production Goa'])
+
+
+def _total_wind(frame):
+    return _sum_of(frame, ['Wind Production Tamil Nadu', 'Wind Production Karnataka', 'Wind Production Maharashtra'])
+
+
+def _renewable(frame):
+    return _sum_of(frame, ['Total Wind Production', 'Total Solar Production', 'Biomass Production',
+                           'Nuclear Production', 'RTC Production'])
+
+
+def _with_surplus(frame):
+    # This is the surplus which can be used to charge the battery
+    return frame.values('TOTAL DEMAND') - frame.values('renewable') - frame.values('Gas Production')
+
+
+def _net_demand(frame):
+    # This is only the net demand which needs to be met by the generators
+    return np.clip(frame.values('WITH SURPLUS'), 0, None)
+
+
+def build_df_all(params, paths, demand, re_profiles):
+    """
+    Merges the demand and the production of every source at its configured size into df_all.
+
+    With profile_store_dir set, the merged profiles are written to a memory-mapped store a chunk of rows at a
+    time (stream_chunk_days days, one year when not set), so df_all is never built in memory.
+
+    Returns:
+        ProfileFrame: The profiles in time order, stored in profile_dtype; the flat sources are constant
+                      columns and the totals, 'renewable', 'WITH SURPLUS' and 'NET DEMAND' derived columns.
+    """
+    intra_state_losses = params['intra_state_power_losses']
+    inter_state_losses = params['inter_state_power_losses']
+    wind_size_actual_SRI = params['wind_size_actual_sri']
+
+    # Production of each stored source: its profile, the column read from it and the scale of its size
+    productions = {
+        'Wind Production Maharashtra': ('wind_maharashtra', 'Wind Production', (1 - intra_state_losses) * (
+            params['wind_size_goa_or_maharashtra'] / wind_size_actual_SRI)),
+        'Wind Production Karnataka': ('wind_karnataka', 'Wind Production', (1 - inter_state_losses) * (
+            params['wind_size_karnataka'] / wind_size_actual_SRI)),
+        'Wind Production Tamil Nadu': ('wind_tamil', 'Wind Production', (1 - inter_state_losses) * (
+            params['wind_size_tamil'] / wind_size_actual_SRI)),
+        'Solar Production Gujarat': ('solar_gujarat', 'Solar Production',
+                                     params['pv_size_gujarat'] * (1 - inter_state_losses)),
+        'Solar Production Telangana': ('solar_telangana', 'Solar Production',
+                                       params['pv_size_telangana'] * (1 - inter_state_losses)),
+        'Solar Production Rajasthan': ('solar_rajasthan', 'Solar Production',
+                                       params['pv_size_rajasthan'] * (1 - inter_state_losses)),
+        'Solar Production Goa': ('solar_goa', 'Solar Production',
+                                 params['pv_size_goa'] * (1 - intra_state_losses)),  # PV within GOA.
+        # DRE considered all within GOA, all PV installments
+        'DRE Production': ('solar_goa', 'Solar Production', params['dre_size_goa'] * (1 - intra_state_losses)),
+    }
+    constants = {'Biomass Production': params['biomass_size'], 'Nuclear Production': params['nuclear_size'],
+                 'Gas Production': params['gas_size'], 'RTC Production': params['rtc_size']}
+    # Renewable generation and net demand are computed from the profiles whenever they are read
+    derived = {'Total Solar Production': _total_solar, 'Total Wind Production': _total_wind,
+               'renewable': _renewable, 'WITH SURPLUS': _with_surplus, 'NET DEMAND': _net_demand}
+
+    # Merge the profiles on the demand timeline, in time order
+    order = demand.index.argsort(kind='stable')
+    for profile, _, _ in productions.values():
+        if len(re_profiles[profile]) != len(order):
+            raise ValueError(f"Profile '{profile}' has {len(re_profiles[profile])} periods for {len(order)} "
+                             f"demand periods")
+
+    def merged_rows(rows):
+        values = {'TOTAL DEMAND': demand['TOTAL DEMAND'].values[rows]}
+        for name, (profile, column, scale) in productions.items():
+            values[name] = re_profiles[profile][column].values[rows] * scale
+        return values
+
+    dtype = params.get('profile_dtype', 'float32')
+    if params.get('profile_store_dir'):
+        # Later stages read the profiles from the memory-mapped store instead of memory
+        chunk_rows = (_stream_chunk_days(params) or 365) * 96
+        chunks = ((demand.index[order[start:start + chunk_rows]], merged_rows(order[start:start + chunk_rows]))
+                  for start in range(0, len(order), chunk_rows))
+        df_all = store_chunks(chunks, _profile_store_root(params), ['TOTAL DEMAND'] + list(productions), dtype,
+                              constants, derived)
+        logging.info(f"*** Successfully Created the DataFrame with all Data, mapped from the store {df_all.source} "
+                     f"*** \n")
+        return df_all
+
+    df_all = ProfileFrame(demand.index[order], dtype)
+    for name, values in merged_rows(order).items():
+        df_all.add(name, values)
+    for name, value in constants.items():
+        df_all.add_constant(name, value)
+    for name, function in derived.items():
+        df_all.add_derived(name, function)
+
+    memory = df_all.memory_report().loc['Total']
+    logging.info(f"*** Successfully Created the DataFrame with all Data: {memory['bytes'] / 2 ** 20:.1f} MB "
+                 f"({memory['float64_bytes'] / 2 ** 20:.1f} MB as a float64 DataFrame) *** \n")
+    return df_all
+
+
+def filter_timeline(df_all, params):
+    """The part of df_all between timeline_start_date and timeline_end_date (sharing its arrays)."""
+    return df_all.between(params['timeline_start_date'], params['timeline_end_date'])
+
+
+def _stream_chunk_days(params):
+    return int(params.get('stream_chunk_days', 0) or 0)
+
+
+def _profile_store_root(params):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), str(params['profile_store_dir']).strip())
+
+
+def weekly_statistics(params, paths, df_all):
+    """
+    Weekly statistics and interesting weeks of the whole year (see my_statistics.weekly_stat_analysis), read
+    in chunks of stream_chunk_days days when set.
+    """
+    columns = ['TOTAL DEMAND', 'renewable', 'NET DEMAND']
+    if _stream_chunk_days(params):
+        return weekly_stat_analysis(df_all.chunks(columns, 'D', _stream_chunk_days(params)))
+    return weekly_stat_analysis(df_all.to_frame(columns))
+
+
+def battery_store_chunks(chunks, min_batt_soc, batt_efficiency, battery_configs):
+    """The profiles and the remaining surplus of every battery as the (index, columns) chunks of a store."""
+    for battery_profiles, remaining_surplus_history in iter_battery_fixed_size(chunks, min_batt_soc,
+                                                                               batt_efficiency, battery_configs):
+        columns = {}
+        for battery_name, profile in battery_profiles.items():
+            for column in BATTERY_PROFILE_COLUMNS:
+                columns[f"{battery_name}: {column}"] = profile[column].values
+            columns[f"{battery_name}: Remaining Surplus"] = remaining_surplus_history[battery_name]
+        yield profile.index, columns
+
+
+def fixed_battery(params, paths, df_all):
+    """
+    Greedy charge/discharge profiles of the configured fixed-size batteries over the timeline.
+
+    With stream_chunk_days set, the timeline is simulated a chunk at a time. With profile_store_dir set as
+    well, each chunk of the profiles is written to a memory-mapped store as soon as it is simulated, and the
+    profiles are returned as ProfileFrames mapped from it, so memory does not grow with the timeline.
+    """
+    logging.info("*** Starting Non-Optimized Battery Scheduling for High RE *** \n")
+    df_filtered = filter_timeline(df_all, params)
+    battery_args = (params['min_batt_soc'], params['batt_efficiency'], params['battery_configs'])
+    if not _stream_chunk_days(params):
+        return battery_fixed_size_calculations(df_filtered, *battery_args)
+    chunks = df_filtered.chunks(['WITH SURPLUS'], 'D', _stream_chunk_days(params))
+    if not params.get('profile_store_dir'):
+        return battery_fixed_size_calculations(chunks, *battery_args)
+
+    columns = [f"{battery_name}: {column}" for battery_name in params['battery_configs']
+               for column in BATTERY_PROFILE_COLUMNS + ['Remaining Surplus']]
+    store = store_chunks(battery_store_chunks(chunks, *battery_args), _profile_store_root(params), columns,
+                         'float64', prefix='battery')
+    battery_profiles, remaining_surplus_history = {}, {}
+    for battery_name in params['battery_configs']:
+        profile = ProfileFrame(store.index, store.dtype)
+        for column in BATTERY_PROFILE_COLUMNS:
+            profile.add(column, store.values(f"{battery_name}: {column}"))
+        profile.source = store.source
+        battery_profiles[battery_name] = profile
+        remaining_surplus_history[battery_name] = store.values(f"{battery_name}: Remaining Surplus")
+    return battery_profiles, remaining_surplus_history
+
+
+def gdam_period_price(params, paths, index):
+    """GDAM price of every period of index, from the typical day of its month (12 x 96 values)."""
+    df_gdam_price = input_cache.read_excel(paths['file_path_gdam'][0])
+    prices = df_gdam_price[f"Average of MCP {int(params['gdam_price_select_year'])}"].values
+    return prices[(index.month - 1) * 96 + index.hour * 4 + index.minute // 15]
+
+
+def optimal_battery(params, paths, df_all):
+    """
+    Optimal (perfect foresight) charge/discharge profiles of the configured fixed-size batteries over the
+    timeline, minimizing the deficit left or, with battery_dp_objective 'gdam_cost', its GDAM cost.
+    """
+    logging.info("*** Starting Optimal Battery Dispatch (dynamic programming) *** \n")
+    df_filtered = filter_timeline(df_all, params)
+    price = None
+    if params.get('battery_dp_objective', 'deficit') == 'gdam_cost':
+        price = gdam_period_price(params, paths, df_filtered.index)
+    return optimal_battery_dispatch(df_filtered, params['min_batt_soc'], params['batt_efficiency'],
+                                    params['battery_configs'], price=price,
+                                    soc_levels=params.get('battery_dp_soc_levels', 200))
+
+
+def thermal_schedule(params, paths, df_all):
+    """
+    Dispatches the thermal generators against the net demand of the timeline.
+
+    Returns:
+        dict: 'schedule' (MW per generator plus 'Unserved Demand' and 'With Surplus', None without a solution),
+              'status' (see solver_utils.solve_with_budget) and 'sensitivity' (report sheets, if requested).
+    """
+    logging.info("*** Beginning Thermal Scheduling Optimization *** \n")
+    df_filtered = filter_timeline(df_all, params)
+    thermal_time_limit = params.get('thermal_time_limit', 0)
+    thermal_mip_gap = params.get('thermal_mip_gap')
+    penalty_thermal_unmet_demand = params['penalty_thermal_unmet_demand']
+    # =============================================================================
+    # Generator Data for Thermal Plants
+    # =============================================================================
+    df_generators = input_cache.read_excel(paths['file_path_generators'][0])
+    gen_data = df_generators.set_index('PPA Details')[['MW', 'Variable Cost']].to_dict('index')
+    gen_data = {k: {'max_capacity': v['MW'], 'var_cost': v['Variable Cost']} for k, v in gen_data.items()}
+    gen_list = list(gen_data.keys())
+
+    logging.info("About to Create Solver \n")
+    solver = SolverFactory('highs')
+    # solver = SolverFactory('appsi_highs')  # faster but not easily compatible with pyinstaller.
+
+    # solver = SolverFactory('cbc', executable=r"C:\Users\i60608\OneDrive\Cbc-2.10.5\bin\cbc.exe")
+
+    logging.info("Solver Created Successfully! \n")
+    logging.info(f"Solver Available: {solver.available()}")
+
+    def solve_thermal_lp(lp_model, model_name='thermal', tee=True):
+        # The window LPs of the merit-order repair count towards the race statistics of the thermal model
+        if params.get('solver_mode', 'single') == 'race':
+            return race_solve(lp_model, 'thermal', _race_solvers(params), time_limit=thermal_time_limit,
+                              mip_gap=thermal_mip_gap)
+        return solve_with_budget(solver, lp_model, model_name, time_limit=thermal_time_limit,
+                                 mip_gap=thermal_mip_gap, tee=tee)
+
+    thermal_x, thermal_u = None, None
+    sensitivity_sheets = {}
+    thermal_solve_status = {'model': 'thermal', 'termination': 'error', 'has_solution': False, 'optimal': False,
+                            'objective': None, 'bound': None, 'gap': None, 'solve_time_s': None, 'solver': None}
+    try:
+        if params.get('sensitivity_analysis', False):
+            # Duals and ranging need the full LP, so the merit order fast path is not used
+            model = build_thermal_model(df_filtered['WITH SURPLUS'].values, gen_data, RAMP_RATE,
+                                        MIN_GEN_FACTOR, penalty_thermal_unmet_demand)
+            thermal_solve_status, thermal_sensitivity = solve_with_sensitivity(model, 'thermal', thermal_time_limit)
+            if thermal_solve_status['has_solution']:
+                thermal_x = var_matrix(model.x, model.I, model.T)
+                thermal_u = var_array(model.u)
+                generator_report, marginal_price = thermal_sensitivity_report(
+                    model, thermal_sensitivity, df_filtered.index.rename(None))
+                sensitivity_sheets['Thermal Generators'] = generator_report
+                sensitivity_sheets['Thermal Marginal Price'] = marginal_price
+        elif params.get('thermal_dispatch_method', 'merit_order') == 'merit_order':
+            # Vectorized merit order; the LP is only solved where ramp limits bind
+            thermal_x, thermal_u, thermal_solve_status = dispatch_thermal(
+                df_filtered['WITH SURPLUS'].values, gen_data, RAMP_RATE, MIN_GEN_FACTOR,
+                penalty_thermal_unmet_demand, solve_thermal_lp, mip_gap=thermal_mip_gap)
+        else:
+            # =============================================================================
+            # Pyomo Optimization Model with Slack Variables for Demand Balance
+            # =============================================================================
+            model = build_thermal_model(df_filtered['WITH SURPLUS'].values, gen_data, RAMP_RATE,
+                                        MIN_GEN_FACTOR, penalty_thermal_unmet_demand)
+
+            logging.info("Calling solver.solve()...")
+            thermal_solve_status = solve_thermal_lp(model)
+            if thermal_solve_status['has_solution']:
+                # Pull whole indexed variables out of the model in one pass each (x is stored as I x T)
+                thermal_x = var_matrix(model.x, model.I, model.T)
+                thermal_u = var_array(model.u)
+
+        logging.info(f"*** Solver Status: {thermal_solve_status['termination']} *** \n")
+    except Exception as e:
+        logging.info(f"Error during solve: {type(e).__name__}: {e}")
+        traceback.print_exc()
+
+    schedule = None
+    if thermal_solve_status['has_solution']:
+        schedule = pd.DataFrame(thermal_x.T, index=df_filtered.index.rename(None), columns=gen_list)
+        schedule['Unserved Demand'] = thermal_u
+        schedule['With Surplus'] = df_filtered['WITH SURPLUS'].values
+    return {'schedule': schedule, 'status': thermal_solve_status, 'sensitivity': sensitivity_sheets}
+
+
+def site_profiles(params, paths, sites, demand, re_profiles):
+    """
+    Production of 1 MW of each candidate site in every period of the timeline, net of its losses. The
+    source of a site is one of the profiles of load_re_profiles, or a profile file of the registry (the
+    hourly production of 1 MW, read like the solar files).
+
+    Returns:
+        pd.DataFrame: The production of each site (columns, in registry order), on the index of the demand.
+    """
+    # The profiles are aligned with the demand by position (see validate_inputs); wind is at the SRI size
+    sources = {name: (profile['Wind Production'].values / params['wind_size_actual_sri']
+                      if 'Wind Production' in profile else profile['Solar Production'].values)
+               for name, profile in re_profiles.items()}
+    issues = []
+    for path in paths.get('site_profile_files', []):
+        name = f"site profile {os.path.basename(path)}"
+        profile = _solar_profile(input_cache.read_csv(path, parse_dates=["local_time"]), name)
+        issues += check_alignment(profile.index, demand.index, name, 'demand')
+        issues += check_values(profile['Solar Production'].values, profile.index, name)
+        sources[path] = profile['Solar Production'].values
+    raise_for_issues(issues, 'site profiles')
+
+    sites = sites.assign(profile=[profile if profile in BUILTIN_PROFILES else resolve_path(profile)
+                                  for profile in sites['profile']])
+    return site_production(sites, pd.DataFrame(sources, index=demand.index))
+
+
+def sizing_inputs(params, paths, sites, site_profiles):
+    """
+    Inputs of the sizing model: a typical day per month (12 x 96 periods) of the unserved demand of the
+    shortage case, the GDAM price and the normalized production of each candidate site.
+
+    Returns:
+        dict: 'demand' and 'gdam_price' (pd.Series over the 1152 periods), 'profiles' (arrays keyed by site)
+              and 'sites' (the registry).
+    """
+    monthly_time_slot_avg = monthly_time_slot_average(site_profiles)
+    profiles = {site: monthly_time_slot_avg[site].values for site in sites.index}
+
+    # Unserved demand of the selected shortage case
+    shortage_case = params['shortage_case']
+    demand = pd.Series(shortage_sizing_profile(paths[f"file_path_shortage_{shortage_case}"][0]))
+
+    df_gdam_price = input_cache.read_excel(paths['file_path_gdam'][0])
+    gdam_price = pd.Series(df_gdam_price[f"Average of MCP {int(params['gdam_price_select_year'])}"].values)
+    validate_sizing_inputs(demand, gdam_price, profiles)
+    return {'demand': demand, 'gdam_price': gdam_price, 'profiles': profiles, 'sites': sites}
+
+
+def size_re_bess(params, paths, sizing_inputs, df_all):
+    """
+    Sizes the RE and BESS capacities that cover the unserved demand (deterministic or stochastic).
+
+    Returns:
+        dict: 'result_sizing' (capacities and total deficit), 'series' (DataFrame of SERIES_VARIABLES),
+              'status', 'stochastic' (result of benders_sizing or None) and 'sensitivity' (report sheets).
+              'result_sizing' and 'series' are None without a solution.
+    """
+    logging.info("*** Beginning RE & BESS Sizing Optimization *** \n")
+    sizing_time_limit = params.get('sizing_time_limit', 0)
+    sizing_mip_gap = params.get('sizing_mip_gap')
+    unmet_demand_series = sizing_inputs['demand']
+    gdam_price_series = sizing_inputs['gdam_price']
+    sizing_profiles = sizing_inputs['profiles']
+    sites = sizing_inputs['sites']
+
+    stochastic_result, sensitivity_sheets = None, {}
+    if params.get('sizing_mode', 'deterministic') == 'stochastic':
+        # Capacities shared by all weather/shortage scenarios: few scenarios are solved together in one model
+        # (the extensive form), more by Benders decomposition
+        wind_files = paths.get('stochastic_wind_files') or paths['file_path_wind_sri']
+        scenarios = build_scenarios(params, sites, wind_files,
+                                    {case: paths[f"file_path_shortage_{case}"][0] for case in _shortage_cases(params)},
+                                    sizing_profiles, gdam_price_series.values, df_all.index)
+        stochastic_method = params.get('stochastic_method', 'auto')
+        if stochastic_method == 'extensive' or (stochastic_method == 'auto'
+                                                and len(scenarios) <= EXTENSIVE_FORM_MAX_SCENARIOS):
+            stochastic_result = extensive_form_sizing(scenarios, sites, params, time_limit=sizing_time_limit,
+                                                      mip_gap=sizing_mip_gap)
+        else:
+            stochastic_result = benders_sizing(
+                scenarios, sites, params, max_iterations=params.get('benders_max_iterations', 30),
+                tolerance=params.get('benders_tolerance', 1e-3), workers=params.get('stochastic_workers', 0),
+                time_limit=sizing_time_limit, mip_gap=sizing_mip_gap)
+        sizing_solve_status = stochastic_result['status']
+
+        # Time series are reported for the scenario of the configured wind year and shortage case
+        base_scenario = scenario_name(paths['file_path_wind_sri'][0], params['shortage_case'])
+        base_series = stochastic_result['series'].get(base_scenario)
+        if stochastic_result['capacities'] is not None and base_series is None:
+            logging.error(f"*** No time series for scenario '{base_scenario}' at the shared capacities *** \n")
+            sizing_solve_status = dict(sizing_solve_status, has_solution=False)
+    else:
+        model_renewable = build_sizing_model(unmet_demand_series.values, gdam_price_series.values, sites,
+                                             sizing_profiles, params)
+
+        solver = SolverFactory('highs')
+        # solver = SolverFactory('appsi_highs')  # faster but not easily compatible with pyinstaller.
+
+        # solver = SolverFactory('cbc', executable=r"C:\Users\i60608\OneDrive\Cbc-2.10.5\bin\cbc.exe")
+
+        if params.get('sensitivity_analysis', False):
+            sizing_solve_status, sizing_sensitivity = solve_with_sensitivity(model_renewable, 'sizing',
+                                                                             sizing_time_limit)
+            if sizing_solve_status['has_solution']:
+                sensitivity_sheets['Sizing Costs'], sensitivity_sheets['Sizing Bounds'] = \
+                    sizing_sensitivity_report(model_renewable, sizing_sensitivity, params)
+        elif params.get('solver_mode', 'single') == 'race':
+            sizing_solve_status = race_solve(model_renewable, 'sizing', _race_solvers(params),
+                                             time_limit=sizing_time_limit, mip_gap=sizing_mip_gap)
+        else:
+            sizing_solve_status = solve_with_budget(solver, model_renewable, 'sizing',
+                                                    time_limit=sizing_time_limit, mip_gap=sizing_mip_gap)
+
+    result_sizing, sizing_series = None, None
+    if sizing_solve_status['has_solution']:
+        if stochastic_result is not None:
+            sizing_series = pd.DataFrame(base_series, index=unmet_demand_series.index)
+            result_sizing = dict(stochastic_result['capacities'])
+        else:
+            # Extract the time series of the solution in one pass per variable
+            sizing_series = series_frame({name: getattr(model_renewable, name) for name in SERIES_VARIABLES},
+                                         index=unmet_demand_series.index)
+            result_sizing = capacity_values(model_renewable)
+        result_sizing['total_deficit'] = sizing_series['deficit'].sum()
+    return {'result_sizing': result_sizing, 'series': sizing_series, 'status': sizing_solve_status,
+            'stochastic': stochastic_result, 'sensitivity': sensitivity_sheets}
+
+
+def full_year_sizing_inputs(params, paths, site_profiles):
+    """
+    Inputs of the sizing at full resolution: the unserved demand of the shortage case in every period,
+    the normalized (1 MW) production of each candidate site and the GDAM price.
+
+    Returns:
+        tuple: demand (pd.Series on the index of the site profiles), production (site_profiles, a column per
+               site) and gdam_price (array).
+    """
+    # The shortage case is merged with the profiles by position, like the demand
+    shortage_case = params['shortage_case']
+    df_unserved = input_cache.read_excel(paths[f"file_path_shortage_{shortage_case}"][0],
+                                         parse_dates=['Timestamp']).set_index('Timestamp')
+    name = f"shortage {shortage_case} unserved demand"
+    issues = check_alignment(df_unserved.index, site_profiles.index, name, 'profiles')
+    issues += check_values(df_unserved['Unserved Demand'].values, df_unserved.index, name)
+    raise_for_issues(issues, 'full-year sizing inputs')
+    demand = pd.Series(df_unserved['Unserved Demand'].values, index=site_profiles.index)
+    return demand, site_profiles, gdam_period_price(params, paths, site_profiles.index)
+
+
+def sizing_verification(params, paths, sizing, site_profiles):
+    """
+    Full-year check of the sizing: the sized capacities run over the 15-min profiles of the sites against
+    the unserved demand of the shortage case in every period (see sizing_verification.verify_sizing).
+
+    Returns:
+        dict: 'series' (the year), 'summary' (annual KPIs next to those of the sizing model) and 'monthly'
+              (monthly totals), or None without a sizing solution.
+    """
+    result_sizing = sizing['result_sizing']
+    if result_sizing is None:
+        return None
+    logging.info("*** Verifying the sizing over the full year *** \n")
+    demand, production, gdam_price = full_year_sizing_inputs(params, paths, site_profiles)
+    series = verify_sizing(result_sizing, demand, production, gdam_price, params)
+    summary, monthly = verification_summary(series, result_sizing, sizing['series'], gdam_price)
+    return {'series': series, 'summary': summary, 'monthly': monthly}
+
+
+def resource_uncertainty(params, paths, sizing, site_profiles):
+    """Deficit distribution of the sized portfolio over resampled solar and wind years (Monte Carlo)."""
+    if sizing['result_sizing'] is None:
+        return None
+    demand, production, gdam_price = full_year_sizing_inputs(params, paths, site_profiles)
+    return monte_carlo_deficit(sizing['result_sizing'], demand, production, gdam_price, params,
+                               n_samples=params.get('monte_carlo_samples', 1000),
+                               block_days=params.get('monte_carlo_block_days', 3),
+                               batch_size=params.get('monte_carlo_batch_size', 32),
+                               workers=params.get('monte_carlo_workers', 0), seed=params.get('monte_carlo_seed', 0))
+
+
+def cost_deficit_frontier(params, paths, sizing_inputs):
+    """Cost vs deficit trade-off of the sizing problem (epsilon-constraint method)."""
+    return pareto_frontier(sizing_inputs['demand'].values, sizing_inputs['gdam_price'].values,
+                           sizing_inputs['sites'], sizing_inputs['profiles'], params,
+                           n_points=params.get('frontier_points', 10), workers=params.get('frontier_workers', 0),
+                           time_limit=params.get('sizing_time_limit', 0), mip_gap=params.get('sizing_mip_gap'))
+
+
+def stress_week_report(params, paths, weekly_stats, df_all):
+    """Thermal dispatch and fixed-size battery simulation of every flagged week, run in parallel."""
+    weekly_stats, interesting_weeks = weekly_stats
+    return analyze_stress_weeks(df_all, weekly_stats, interesting_weeks, params, paths, thermal_schedule,
+                                fixed_battery, workers=params.get('stress_week_workers', 0))
+
+
+def _shortage_cases(params):
+    """Shortage cases whose unserved demand the sizing reads (all scenario cases in stochastic mode)."""
+    if params.get('sizing_mode', 'deterministic') == 'stochastic':
+        return [case.strip() for case in str(params.get('stochastic_shortage_cases', params['shortage_case']))
+                .split(',') if case.strip()]
+    return [params['shortage_case']]
+
+
+def _sizing_files(params):
+    files = ['file_path_wind_sri'] + [f"file_path_shortage_{case}" for case in _shortage_cases(params)]
+    if params.get('sizing_mode', 'deterministic') == 'stochastic':
+        files.append('stochastic_wind_files')
+    return files
+
+
+def _solved(output):
+    return output['status']['has_solution']
+
+
+SIZE_PARAMS = ['wind_size_goa_or_maharashtra', 'wind_size_karnataka', 'wind_size_tamil', 'pv_size_gujarat',
+               'pv_size_telangana', 'pv_size_rajasthan', 'pv_size_goa']
+LOSS_PARAMS = ['intra_state_power_losses', 'inter_state_power_losses']
+TIMELINE_PARAMS = ['timeline_start_date', 'timeline_end_date']
+
+# The pipeline of run_optimization. Each stage declares the parameters and input files it reads and the
+# stages whose output it uses, so a changed parameter only recomputes the stages downstream of it.
+STAGES = [
+    {'name': 'demand_history', 'function': load_demand_history, 'files': ['file_path'],
+     'params': ['max_missing_periods']},
+    {'name': 'demand', 'function': load_demand, 'inputs': ['demand_history'],
+     'params': ['annual_demand_mus', 'timeline_start_date']},
+    {'name': 're_profiles', 'function': load_re_profiles,
+     'params': ['wind_size_excel_sri', 'wind_size_actual_sri', 'zero_pv_goa_start_date', 'zero_pv_goa_end_date',
+                'zero_pv_goa_start_date2', 'zero_pv_goa_end_date2'],
+     'files': ['file_path_wind_sri'] + list(SOLAR_FILES.values())},
+    # Fails the run with a report before anything is built from bad profiles. Not checkpointed: it takes
+    # milliseconds and its warnings are logged on every run.
+    {'name': 'input_checks', 'function': validate_inputs, 'inputs': ['demand', 're_profiles'],
+     'params': ['max_missing_periods'], 'checkpoint_if': lambda report: False},
+    {'name': 'df_all', 'function': build_df_all, 'inputs': ['demand', 're_profiles'],
+     'params': SIZE_PARAMS + LOSS_PARAMS + ['wind_size_actual_sri', 'dre_size_goa', 'biomass_size', 'nuclear_size',
+                                            'gas_size', 'rtc_size', 'profile_dtype', 'profile_store_dir',
+                                            'stream_chunk_days'],
+     # A memory-mapped frame is cheap to rebuild and would be copied into memory by a checkpoint
+     'checkpoint_if': lambda df_all: df_all.source is None},
+    {'name': 'weekly_stats', 'function': weekly_statistics, 'inputs': ['df_all'], 'params': ['stream_chunk_days']},
+    {'name': 'fixed_battery', 'function': fixed_battery, 'inputs': ['df_all'],
+     'params': TIMELINE_PARAMS + ['min_batt_soc', 'batt_efficiency', 'battery_configs', 'stream_chunk_days',
+                                  'profile_store_dir'],
+     # Profiles mapped from a store would be copied into memory by a checkpoint
+     'checkpoint_if': lambda battery: not any(isinstance(profile, ProfileFrame) for profile in battery[0].values())},
+    {'name': 'optimal_battery', 'function': optimal_battery, 'inputs': ['df_all'],
+     'params': TIMELINE_PARAMS + ['min_batt_soc', 'batt_efficiency', 'battery_configs', 'battery_dp_objective',
+                                  'battery_dp_soc_levels', 'gdam_price_select_year'],
+     'files': lambda params: ['file_path_gdam'] if params.get('battery_dp_objective') == 'gdam_cost' else []},
+    {'name': 'thermal', 'function': thermal_schedule, 'inputs': ['df_all'], 'files': ['file_path_generators'],
+     'params': TIMELINE_PARAMS + SOLVER_PARAMS + ['penalty_thermal_unmet_demand', 'thermal_time_limit',
+                                                  'thermal_mip_gap', 'thermal_dispatch_method',
+                                                  'sensitivity_analysis'],
+     'checkpoint_if': _solved},
+    {'name': 'stress_weeks', 'function': stress_week_report, 'inputs': ['weekly_stats', 'df_all'],
+     'files': ['file_path_generators'],
+     'params': SOLVER_PARAMS + ['penalty_thermal_unmet_demand', 'thermal_time_limit', 'thermal_mip_gap',
+                                'thermal_dispatch_method', 'min_batt_soc', 'batt_efficiency', 'battery_configs',
+                                'stress_week_workers']},
+    # Candidate sites of the sizing, from the registry file or the config
+    {'name': 'sites', 'function': load_site_registry, 'params': CONFIG_SITE_PARAMS,
+     'files': ['file_path_site_registry']},
+    {'name': 'site_profiles', 'function': site_profiles, 'inputs': ['sites', 'demand', 're_profiles'],
+     'params': ['wind_size_actual_sri'], 'files': ['site_profile_files']},
+    {'name': 'sizing_inputs', 'function': sizing_inputs, 'inputs': ['sites', 'site_profiles'],
+     'params': ['shortage_case', 'gdam_price_select_year'],
+     'files': lambda params: [f"file_path_shortage_{params['shortage_case']}", 'file_path_gdam']},
+    {'name': 'sizing', 'function': size_re_bess, 'inputs': ['sizing_inputs', 'df_all'],
+     'params': SIZING_PARAMS + SOLVER_PARAMS + [
+         'sizing_time_limit', 'sizing_mip_gap', 'sizing_mode', 'sensitivity_analysis', 'shortage_case',
+         'stochastic_shortage_cases', 'stochastic_method', 'benders_max_iterations', 'benders_tolerance',
+         'stochastic_workers', 'wind_size_excel_sri', 'wind_size_actual_sri'],
+     'files': _sizing_files,
+     'checkpoint_if': _solved},
+    {'name': 'verification', 'function': sizing_verification, 'inputs': ['sizing', 'site_profiles'],
+     'params': ['shortage_case', 'gdam_price_select_year', 'max_charge_discharge_power_bess', 'max_gdam_purchase',
+                'penalty_sizing_unmet_demand'],
+     'files': lambda params: [f"file_path_shortage_{params['shortage_case']}", 'file_path_gdam']},
+    {'name': 'monte_carlo', 'function': resource_uncertainty, 'inputs': ['sizing', 'site_profiles'],
+     'params': ['shortage_case', 'gdam_price_select_year', 'max_charge_discharge_power_bess', 'max_gdam_purchase',
+                'penalty_sizing_unmet_demand', 'monte_carlo_samples', 'monte_carlo_block_days',
+                'monte_carlo_batch_size', 'monte_carlo_workers', 'monte_carlo_seed'],
+     'files': lambda params: [f"file_path_shortage_{params['shortage_case']}", 'file_path_gdam']},
+    {'name': 'frontier', 'function': cost_deficit_frontier, 'inputs': ['sizing_inputs'],
+     'params': SIZING_PARAMS + ['frontier_points', 'frontier_workers', 'sizing_time_limit', 'sizing_mip_gap'],
+     'checkpoint_if': lambda frontier: not frontier.empty},
+]
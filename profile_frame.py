@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+
+class ProfileFrame:
+    """
+    Compact table of 15-min profiles: one contiguous array per column on a shared time index.
+
+    Stored columns are kept in a compact dtype (float32 by default). Constant columns (e.g. a flat biomass
+    output) store only their value, and derived columns (e.g. the net demand) store only the function that
+    computes them from the other columns, so neither takes memory until it is read. Columns are read as
+    pd.Series on the shared index; to_frame builds a regular float64 DataFrame for code that needs one.
+
+    Args:
+        index (pd.DatetimeIndex): Time index shared by all columns.
+        dtype (str): dtype of the stored columns ('float32' or 'float64').
+    """
+
+    def __init__(self, index, dtype='float32'):
+        self.index = index
+        self.dtype = np.dtype(dtype)
+        self._columns = {}  # name -> ('stored', array) | ('constant', value) | ('derived', function)
+        self.source = None  # Folder of the profile store the stored columns are memory-mapped from, if any
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def add(self, name, values):
+        """Stores a column as a contiguous array of the frame's dtype."""
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        if len(values) != len(self.index):
+            raise ValueError(f"Column '{name}' has {len(values)} values for an index of {len(self.index)}")
+        self._columns[name] = ('stored', values)
+
+    def add_constant(self, name, value):
+        """Adds a column with the same value in every period, without storing it per period."""
+        self._columns[name] = ('constant', float(value))
+
+    def add_derived(self, name, function):
+        """Adds a column computed on every read as function(frame). The function must be picklable."""
+        self._columns[name] = ('derived', function)
+
+    def values(self, name):
+        """Values of a column as a NumPy array; constant and derived columns are float64."""
+        kind, content = self._columns[name]
+        if kind == 'stored':
+            return content
+        if kind == 'constant':
+            return np.full(len(self.index), content)
+        return np.asarray(content(self), dtype=float)
+
+    def __getitem__(self, name):
+        return pd.Series(self.values(name), index=self.index, name=name, copy=False)
+
+    def rows(self, start, stop):
+        """Rows start to stop (by position, stop excluded) as a frame that shares the arrays."""
+        subset = ProfileFrame(self.index[start:stop], self.dtype)
+        for name, (kind, content) in self._columns.items():
+            subset._columns[name] = (kind, content[start:stop] if kind == 'stored' else content)
+        subset.source = self.source
+        return subset
+
+    def between(self, start, end):
+        """The rows from start to end (inclusive, as DataFrame.loc) as a frame that shares the arrays."""
+        rows = self.index.slice_indexer(start, end)
+        return self.rows(rows.start, rows.stop)
+
+    def chunks(self, columns=None, freq='D', periods=7):
+        """
+        Yields the frame as consecutive float64 DataFrames of the given columns, each holding whole resample
+        periods (by default 7 whole days), so a long memory-mapped history is read one chunk at a time.
+        """
+        positions = pd.Series(np.arange(len(self.index)), index=self.index).resample(freq).first().dropna()
+        starts = positions.values.astype(int)[::max(int(periods), 1)]
+        for start, stop in zip(starts, np.append(starts[1:], len(self.index))):
+            yield self.rows(start, stop).to_frame(columns)
+
+    def to_frame(self, columns=None):
+        """
+        Builds a float64 DataFrame of the given columns (all columns by default), in the layout of the
+        former df_all.
+        """
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({name: self.values(name).astype(float, copy=False) for name in columns},
+                            index=self.index)
+
+    def memory_report(self):
+        """
+        Memory of each column compared with a float64 DataFrame column of the same length. The bytes of
+        memory-mapped columns are their size on disk.
+
+        Returns:
+            pd.DataFrame: 'kind', 'bytes' and 'float64_bytes' per column, with a 'Total' row that also counts
+                          the shared index.
+        """
+        rows = []
+        for name, (kind, content) in self._columns.items():
+            if kind == 'stored' and self.source is not None:
+                kind = 'mapped'  # On disk; only the pages being read are in memory
+            rows.append({'column': name, 'kind': kind,
+                         'bytes': content.nbytes if kind in ('stored', 'mapped') else 0,
+                         'float64_bytes': len(self.index) * 8})
+        report = pd.DataFrame(rows, columns=['column', 'kind', 'bytes', 'float64_bytes']).set_index('column')
+        report.loc['Total'] = ['', report['bytes'].sum() + self.index.nbytes,
+                               report['float64_bytes'].sum() + self.index.nbytes]
+        return report
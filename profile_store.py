@@ -0,0 +1,161 @@
+import glob
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from profile_frame import ProfileFrame
+
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.bin'
+
+
+class ProfileStoreWriter:
+    """
+    Writes a memory-mapped profile store a chunk at a time, so histories longer than memory can be stored.
+
+    A store is a folder with one raw binary file per stored column, the timestamps as int64 nanoseconds and
+    a manifest with the dtype, the length, the constant values and the functions of the derived columns.
+    open_profile_store maps it back as a ProfileFrame. The content written so far is hashed as it is written
+    (see content_hash).
+
+    Args:
+        directory (str): Folder of the store (created if needed).
+        columns (list): Names of the stored columns, in the order they are appended.
+        dtype (str): dtype of the stored columns.
+    """
+
+    def __init__(self, directory, columns, dtype='float32'):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.index_name = None
+        self._digest = hashlib.sha256(json.dumps([self.dtype.name, list(columns)]).encode())
+        self._manifest = [{'name': name, 'kind': 'stored', 'file': f"column_{i}.bin"}
+                          for i, name in enumerate(columns)]
+        self._files = {INDEX_FILE: open(os.path.join(directory, INDEX_FILE), 'wb')}
+        for column in self._manifest:
+            self._files[column['file']] = open(os.path.join(directory, column['file']), 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for f in self._files.values():
+                f.close()
+
+    def append(self, index, columns):
+        """Appends the rows of a chunk: its timestamps and a dict of the values of every stored column."""
+        index = pd.DatetimeIndex(index)
+        self.index_name = index.name
+        timestamps = index.asi8.astype('<i8').tobytes()
+        self._files[INDEX_FILE].write(timestamps)
+        self._digest.update(timestamps)
+        for column in self._manifest:
+            if column['kind'] == 'stored':
+                values = np.ascontiguousarray(columns[column['name']], dtype=self.dtype)
+                if len(values) != len(index):
+                    raise ValueError(f"Column '{column['name']}' has {len(values)} values for {len(index)} rows")
+                self._files[column['file']].write(values.tobytes())
+                self._digest.update(values.tobytes())
+        self.length += len(index)
+
+    def add_constant(self, name, value):
+        self._manifest.append({'name': name, 'kind': 'constant', 'value': float(value)})
+        self._digest.update(f"{name}={float(value)!r}".encode())
+
+    def add_derived(self, name, function):
+        """Adds a derived column; the function must be a module-level function (it is stored by name)."""
+        function_name = f"{function.__module__}:{function.__qualname__}"
+        self._manifest.append({'name': name, 'kind': 'derived', 'function': function_name})
+        self._digest.update(f"{name}={function_name}".encode())
+
+    def content_hash(self):
+        """SHA-256 of the dtype, the columns and everything appended and added so far."""
+        return self._digest.hexdigest()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        with open(os.path.join(self.directory, MANIFEST_FILE), 'w') as f:
+            json.dump({'dtype': self.dtype.name, 'length': self.length, 'index_name': self.index_name,
+                       'columns': self._manifest}, f, indent=1)
+
+
+def open_profile_store(directory):
+    """
+    Maps a profile store as a ProfileFrame. The stored columns are read-only memory maps, so only the
+    pages that are read (e.g. by ProfileFrame.chunks) are loaded.
+    """
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    length, dtype = manifest['length'], np.dtype(manifest['dtype'])
+    timestamps = np.memmap(os.path.join(directory, INDEX_FILE), dtype='<i8', mode='r', shape=(length,))
+    frame = ProfileFrame(pd.DatetimeIndex(timestamps.view('M8[ns]'), name=manifest.get('index_name')), dtype)
+    for column in manifest['columns']:
+        if column['kind'] == 'stored':
+            frame.add(column['name'], np.memmap(os.path.join(directory, column['file']), dtype=dtype, mode='r',
+                                                shape=(length,)))
+        elif column['kind'] == 'constant':
+            frame.add_constant(column['name'], column['value'])
+        else:
+            module, name = column['function'].split(':')
+            frame.add_derived(column['name'], getattr(importlib.import_module(module), name))
+    frame.source = os.path.abspath(directory)
+    return frame
+
+
+def store_chunks(chunks, root, columns, dtype='float32', constants=None, derived=None, prefix='profiles', keep=3):
+    """
+    Writes a store under root one chunk at a time, as the chunks are produced, and maps it back, so the
+    profiles are never all in memory. The store is named after its content: a store with the same content is
+    reused, and only the newest keep stores with the same prefix under root are kept.
+
+    Args:
+        chunks (iterable): (index, {column: values}) of consecutive chunks of rows.
+        root (str): Folder of the stores.
+        columns (list): Names of the stored columns.
+        dtype (str): dtype of the stored columns.
+        constants (dict): Value of each constant column.
+        derived (dict): Function of each derived column (module-level functions).
+        prefix (str): Start of the folder name of the store.
+        keep (int): Number of stores with the prefix kept under root.
+
+    Returns:
+        ProfileFrame: The profiles, memory-mapped from the store.
+    """
+    tmp_directory = os.path.join(root, f"{prefix}-{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with ProfileStoreWriter(tmp_directory, columns, dtype) as writer:
+            for index, values in chunks:
+                writer.append(index, values)
+            for name, value in (constants or {}).items():
+                writer.add_constant(name, value)
+            for name, function in (derived or {}).items():
+                writer.add_derived(name, function)
+    except BaseException:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        raise
+    directory = os.path.join(root, f"{prefix}-{writer.content_hash()[:20]}")
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        shutil.rmtree(tmp_directory, ignore_errors=True)  # Stored by an earlier run
+    else:
+        try:
+            os.replace(tmp_directory, directory)
+        except OSError:  # Written by a concurrent run in the meantime
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.utime(directory)  # Mark as recently used for the retention
+    stores = sorted((path for path in glob.glob(os.path.join(root, f"{prefix}-*")) if not path.endswith('.tmp')),
+                    key=os.path.getmtime, reverse=True)
+    for stale in stores[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)  # Runs that still map a removed store keep their pages
+    return open_profile_store(directory)
@@ -0,0 +1,173 @@
+import pandas as pd
+
+import input_cache
+
+############## CEA ESTIMATES OF THE MONTHLY CUF (%) OF EACH STATE
+TARGET_CUFS = {
+    'gujarat': {
+        1: 15.0, 2: 18.5, 3: 20.0, 4: 22.0, 5: 21.0, 6: 17.0,
+        7: 12.0, 8: 12.0, 9: 16.0, 10: 17.0, 11: 14.0, 12: 12.5
+    },
+    'rajasthan': {
+        1: 14.0, 2: 17.5, 3: 20, 4: 21.5, 5: 22.0, 6: 20,
+        7: 17.5, 8: 16.0, 9: 17.0, 10: 17.0, 11: 14.0, 12: 13.5
+    },
+    'maharashtra_wind': {
+        1: 25.0, 2: 25.0, 3: 25, 4: 30.0, 5: 40.0, 6: 52,
+        7: 61.0, 8: 52.0, 9: 32.0, 10: 24.0, 11: 28.0, 12: 25.0
+    },
+    'tamil_wind': {
+        1: 30.0, 2: 25.0, 3: 20, 4: 28.0, 5: 48.0, 6: 62,
+        7: 68.0, 8: 60.0, 9: 55.0, 10: 30.0, 11: 16.0, 12: 28.0
+    },
+    'karnataka_wind': {
+        1: 30.0, 2: 32.0, 3: 28, 4: 22.0, 5: 50.0, 6: 62,
+        7: 62.0, 8: 58.0, 9: 45.0, 10: 35.0, 11: 29.0, 12: 38.0
+    },
+    'telangana': {
+        1: 16.0, 2: 18.0, 3: 18.0, 4: 20.0, 5: 20.0, 6: 17.5,
+        7: 12.5, 8: 12.5, 9: 17.5, 10: 18.0, 11: 20.0, 12: 14.0
+    }
+}
+
+
+def load_wind_yearly(file_path, wind_size_excel, wind_size_actual):
+    """
+    Reads the 'Yearly data' sheet of a wind workbook (one row per day, one column per 15-min slot).
+
+    Args:
+        file_path (str): Path of the wind workbook (e.g. Wind_Analysis_Sri_Morjar_2022.xlsx).
+        wind_size_excel (float): Installed capacity (MW) the workbook was measured on.
+        wind_size_actual (float): Capacity (MW) the production is scaled to.
+
+    Returns:
+        pd.DataFrame: 'Wind Production' at 15-min resolution, indexed by Timestamp.
+    """
+    df_wind = input_cache.read_excel(file_path, sheet_name="Yearly data", engine="openpyxl")
+
+    # Rename First Column to "Date"
+    df_wind.rename(columns={df_wind.columns[0]: "Date"}, inplace=True)
+    # Convert "Date" to DateTime Format
+    df_wind["Date"] = pd.to_datetime(df_wind["Date"], format="%d-%b-%y")
+    # Convert Wide Format to Long Format
+    df_wind_long = df_wind.melt(id_vars=["Date"], var_name="Time", value_name="Wind Production")
+    # Extract Start Time from Time Column (Fixing Any Formatting Issues)
+    df_wind_long["Time"] = df_wind_long["Time"].astype(str).str.extract(r"(\d{2}:\d{2})")
+    # Create Full Timestamp
+    df_wind_long["Timestamp"] = pd.to_datetime(
+        df_wind_long["Date"].astype(str) + " " + df_wind_long["Time"], format="%Y-%m-%d %H:%M")
+    # Keep Only Required Columns
+    df_wind_long = df_wind_long[["Timestamp", "Wind Production"]].set_index("Timestamp")
+    # Normalize Wind Data
+    df_wind_long['Wind Production'] /= wind_size_excel  # Normalize Wind Production
+    df_wind_long['Wind Production'] *= wind_size_actual  # Increase Wind Production based on actual size to be considered
+    return df_wind_long.sort_index()
+
+
+###### MONTHLY CUF FOR ALL RE GENERATORS
+def calculate_monthly_cuf(df, source_type, capacity=1):
+    """
+    Calculate monthly Capacity Utilization Factor (CUF)
+
+    Args:
+        df: DataFrame containing generation data, or an iterable of consecutive chunks of it
+            (e.g. ProfileFrame.chunks), whose monthly energy is summed one chunk at a time
+        source_type: 'solar' or 'wind' to specify which production column to use
+        capacity: Installed capacity in MW
+    """
+    if source_type == 'solar':
+        production_column = 'Solar Production'
+    else:  # wind
+        production_column = 'Wind Production'
+
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    monthly_energy = pd.concat([chunk[production_column].resample('M').sum() for chunk in chunks])
+    monthly_energy = monthly_energy.groupby(level=0).sum() / 4  # A month may span two chunks
+    hours_in_month = monthly_energy.index.days_in_month * 24
+    monthly_cuf = (monthly_energy / (capacity * hours_in_month)) * 100
+
+    return monthly_cuf
+
+
+def adjust_generation_profile(df_original, original_cuf, target_cuf_by_month):
+    """
+    Adjust generation profile to match target monthly CUFs
+    """
+    df_adjusted = df_original.copy()
+
+    for month in range(1, 13):
+        # Get the original and target CUF for this month
+        original_month_cuf = original_cuf.iloc[month - 1]
+        target_month_cuf = target_cuf_by_month[month]
+
+        # Calculate adjustment ratio
+        adjustment_ratio = target_month_cuf / original_month_cuf
+
+        # Apply adjustment to that month's data
+        month_mask = df_adjusted.index.month == month
+        df_adjusted.loc[month_mask, 'Solar Production'] *= adjustment_ratio
+
+    return df_adjusted
+
+
+def adjust_wind_cuf_profile(df_original, original_cuf, target_cuf_by_month):
+    """
+    Adjust generation profile to match target monthly CUFs
+    """
+    df_adjusted = df_original.copy()
+
+    for month in range(1, 13):
+        # Get the original and target CUF for this month
+        original_month_cuf = original_cuf.iloc[month - 1]
+        target_month_cuf = target_cuf_by_month[month]
+
+        # Calculate adjustment ratio
+        adjustment_ratio = target_month_cuf / original_month_cuf
+
+        # Apply adjustment to that month's data
+        month_mask = df_adjusted.index.month == month
+        df_adjusted.loc[month_mask, 'Wind Production'] *= adjustment_ratio
+
+    return df_adjusted
+
+
+def monthly_time_slot_average(df):
+    """
+    Averages a 15-min DataFrame into a typical day per month (12 months x 96 time slots).
+
+    Returns:
+        pd.DataFrame: The averages, indexed by (month, time_slot) in sorted order.
+    """
+    time_slot = df.index.hour * 4 + df.index.minute // 15
+    return df.groupby([df.index.month.rename('month'), time_slot.rename('time_slot')]).mean().sort_index()
+
+
+def wind_sizing_profiles(df_wind_long, wind_size_actual, index):
+    """
+    Builds the normalized (1 MW) wind profile of each state from one wind year, for the sites of the sizing
+    model that take their production from it.
+
+    The wind year is scaled to the CEA monthly CUF of each state, exactly as for the main run.
+
+    Args:
+        df_wind_long (pd.DataFrame): Output of load_wind_yearly.
+        wind_size_actual (float): Capacity (MW) df_wind_long was scaled to.
+        index (pd.DatetimeIndex): Timeline of the run; the wind year is mapped onto it by position.
+
+    Returns:
+        pd.DataFrame: Production of 1 MW (before losses) in every period of index, with a column per wind
+                      profile of load_re_profiles ('wind_maharashtra', 'wind_tamil' and 'wind_karnataka').
+    """
+    original_cuf = calculate_monthly_cuf(df_wind_long, 'wind', wind_size_actual)
+    states = {'wind_maharashtra': 'maharashtra_wind', 'wind_tamil': 'tamil_wind', 'wind_karnataka': 'karnataka_wind'}
+    per_mw = pd.DataFrame(index=index)
+    for name, cuf_key in states.items():
+        adjusted = adjust_wind_cuf_profile(df_wind_long, original_cuf, TARGET_CUFS[cuf_key])
+        per_mw[name] = adjusted['Wind Production'].values[:len(index)] / wind_size_actual
+    return per_mw
+
+
+def shortage_sizing_profile(file_path):
+    """Reads a shortage case workbook and returns its unserved demand as 1152 monthly time-slot averages."""
+    df_unserved = input_cache.read_excel(file_path, parse_dates=['Timestamp']).set_index('Timestamp')
+    return monthly_time_slot_average(df_unserved[['Unserved Demand']])['Unserved Demand'].values
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from results_writer import columnar_dir, list_sheets, list_workbooks
+
+# An archive entry has the layout of a Results folder without the Excel exports (columnar/<workbook>/ with
+# the zstd Parquet sheets), so list_workbooks, read_sheet and export_excel work on it, plus a manifest
+MANIFEST_FILE = 'manifest.json'
+
+
+def _sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source, target):
+    """Hard-links a file (no extra space on the same file system), or copies it where links are not possible."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def archive_results(results_dir, archive_root, name, metadata=None):
+    """
+    Adds the columnar outputs of a run to the archive.
+
+    Args:
+        results_dir (str): Results folder of the run.
+        archive_root (str): Folder of the archive.
+        name (str): Name of the entry (unique in the archive).
+        metadata (dict): JSON-serializable information on the run kept in the manifest (e.g. KPIs).
+
+    Returns:
+        str: The folder of the entry.
+    """
+    entry = os.path.join(archive_root, name)
+    tmp_entry = f"{entry}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    workbooks, total_bytes = {}, 0
+    for workbook in list_workbooks(results_dir):
+        source_dir, target_dir = columnar_dir(results_dir, workbook), columnar_dir(tmp_entry, workbook)
+        os.makedirs(target_dir)
+        sheets = list_sheets(results_dir, workbook)
+        for file_name in [f"{sheet}.parquet" for sheet in sheets] + ['_sheets.json']:
+            _link_or_copy(os.path.join(source_dir, file_name), os.path.join(target_dir, file_name))
+        workbooks[workbook] = []
+        for sheet in sheets:
+            path = os.path.join(target_dir, f"{sheet}.parquet")
+            parquet = pq.ParquetFile(path)
+            size = os.path.getsize(path)
+            workbooks[workbook].append({
+                'sheet': sheet, 'file': os.path.relpath(path, tmp_entry), 'rows': parquet.metadata.num_rows,
+                'columns': parquet.schema_arrow.names, 'bytes': size, 'sha256': _sha256(path)})
+            total_bytes += size
+    with open(os.path.join(tmp_entry, MANIFEST_FILE), 'w') as f:
+        json.dump({'name': name, 'created_at': datetime.now().isoformat(timespec='seconds'),
+                   'source': os.path.abspath(results_dir), 'bytes': total_bytes, 'workbooks': workbooks,
+                   'metadata': metadata or {}}, f, indent=1, default=str)
+    os.replace(tmp_entry, entry)
+    return entry
+
+
+def _entry_bytes(entry):
+    return sum(os.path.getsize(os.path.join(folder, file))
+               for folder, _, files in os.walk(entry) for file in files)
+
+
+def list_archive(archive_root):
+    """
+    Entries of the archive, newest first.
+
+    Returns:
+        pd.DataFrame: 'name', 'created_at', 'bytes' (on disk, including any Excel exported from the entry)
+                      and 'path' of each entry.
+    """
+    rows = []
+    if os.path.isdir(archive_root):
+        for name in os.listdir(archive_root):
+            entry = os.path.join(archive_root, name)
+            manifest = os.path.join(entry, MANIFEST_FILE)
+            if name.endswith('.tmp') or not os.path.exists(manifest):
+                continue
+            rows.append({'name': name, 'created_at': pd.Timestamp(os.path.getmtime(manifest), unit='s'),
+                         'bytes': _entry_bytes(entry), 'path': entry})
+    columns = ['name', 'created_at', 'bytes', 'path']
+    return pd.DataFrame(rows, columns=columns).sort_values('created_at', ascending=False, ignore_index=True)
+
+
+def apply_retention(archive_root, max_age_days=0, max_runs=0, max_total_mb=0):
+    """
+    Removes archive entries, oldest first: those older than max_age_days, those beyond the newest max_runs,
+    and then as many as needed to bring the archive under max_total_mb. A limit of 0 is no limit.
+
+    Returns:
+        list: Folders of the removed entries.
+    """
+    entries = list_archive(archive_root)
+    expired = pd.Series(False, index=entries.index)
+    if max_age_days:
+        expired |= entries['created_at'] < pd.Timestamp(time.time() - max_age_days * 86400, unit='s')
+    if max_runs:
+        expired |= entries.index >= int(max_runs)
+    if max_total_mb:
+        # Cumulative size from the newest entry: everything past the budget goes
+        expired |= entries['bytes'].cumsum() > max_total_mb * 2 ** 20
+    removed = entries.loc[expired, 'path'].tolist()
+    for entry in removed:
+        shutil.rmtree(entry, ignore_errors=True)
+    return removed
+
+
+def write_zip(directory, zip_path, chunk_size=1 << 20):
+    """
+    Writes a zip of the files of a folder (e.g. a Results folder or an archive entry) to a file, through a
+    temporary file. The files are copied into it a chunk at a time, so none is held in memory as a whole.
+    Parquet sheets are already compressed and are stored as is; other files are deflated.
+    """
+    tmp_path = f"{zip_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w') as archive:
+        for folder, _, files in os.walk(directory):
+            for file in sorted(files):
+                path = os.path.join(folder, file)
+                info = zipfile.ZipInfo.from_file(path, os.path.relpath(path, directory))
+                info.compress_type = zipfile.ZIP_STORED if file.endswith('.parquet') else zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                    for chunk in iter(lambda: source.read(chunk_size), b''):
+                        target.write(chunk)
+    os.replace(tmp_path, zip_path)
+    return zip_path
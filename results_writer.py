@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+from profile_frame import ProfileFrame
+
+# Time series are stored as compressed Parquet, one file per sheet, under Results/columnar/<workbook>/.
+# The Excel workbooks are only an export of these files.
+COLUMNAR_DIR_NAME = 'columnar'
+SHEET_ORDER_FILE = '_sheets.json'
+# Rows of a ProfileFrame sheet written at a time (a year of 15-min periods)
+PROFILE_CHUNK_ROWS = 35040
+
+_export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='excel-export')
+_pending_exports = []
+_pending_lock = threading.Lock()
+
+
+def columnar_dir(results_dir, workbook_name):
+    """Returns the folder holding the Parquet sheets of a workbook (e.g. 'thermal_generation.xlsx')."""
+    return os.path.join(results_dir, COLUMNAR_DIR_NAME, os.path.splitext(workbook_name)[0])
+
+
+def save_results(results_dir, workbook_name, sheets, excel_mode='background'):
+    """
+    Saves result tables as compressed Parquet and exports them to an Excel workbook.
+
+    Args:
+        results_dir (str): The Results folder of the run.
+        workbook_name (str): File name of the Excel workbook (e.g. 'Optimal_Sizing_RE_BESS.xlsx').
+        sheets (dict): Mapping of sheet name to DataFrame or ProfileFrame. The index is always written. A
+                       ProfileFrame (e.g. mapped from a profile store) is written a chunk of rows at a time.
+        excel_mode (str): 'background' writes the workbook in a background thread, 'now' writes it before
+                          returning and 'on_demand' skips it until export_excel is called (e.g. from the app).
+
+    Returns:
+        str: The folder holding the Parquet files.
+    """
+    sheet_dir = columnar_dir(results_dir, workbook_name)
+    os.makedirs(sheet_dir, exist_ok=True)
+    for sheet_name, df in sheets.items():
+        _write_parquet(df, os.path.join(sheet_dir, f"{sheet_name}.parquet"))
+    with open(os.path.join(sheet_dir, SHEET_ORDER_FILE), 'w') as f:
+        json.dump(list(sheets), f)
+
+    excel_path = os.path.join(results_dir, workbook_name)
+    if excel_mode == 'now':
+        export_excel(results_dir, workbook_name)
+    elif excel_mode == 'background':
+        with _pending_lock:
+            _pending_exports.append(_export_executor.submit(export_excel, results_dir, workbook_name))
+    elif os.path.exists(excel_path):
+        os.remove(excel_path)  # Never leave a workbook from an older run next to the new data
+    return sheet_dir
+
+
+def _write_parquet(df, path):
+    if not isinstance(df, ProfileFrame):
+        df.infer_objects().to_parquet(path, compression='zstd')
+        return
+    writer = None
+    try:
+        for start in range(0, max(len(df), 1), PROFILE_CHUNK_ROWS):
+            table = pa.Table.from_pandas(df.rows(start, start + PROFILE_CHUNK_ROWS).to_frame())
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def list_workbooks(results_dir):
+    """Lists the workbook names that have columnar results in a Results folder."""
+    base = os.path.join(results_dir, COLUMNAR_DIR_NAME)
+    if not os.path.isdir(base):
+        return []
+    return sorted(f"{name}.xlsx" for name in os.listdir(base)
+                  if os.path.exists(os.path.join(base, name, SHEET_ORDER_FILE)))
+
+
+def list_sheets(results_dir, workbook_name):
+    with open(os.path.join(columnar_dir(results_dir, workbook_name), SHEET_ORDER_FILE)) as f:
+        return json.load(f)
+
+
+def read_sheet(results_dir, workbook_name, sheet_name):
+    """Reads one result sheet from its Parquet file."""
+    return pd.read_parquet(os.path.join(columnar_dir(results_dir, workbook_name), f"{sheet_name}.parquet"))
+
+
+def _excel_value(value):
+    """
+    Value of an Excel cell: blank for NaN, and '+inf' or '-inf' for an unbounded value (e.g. the end of a
+    valid range in the sensitivity report), which Excel has no number for.
+    """
+    if pd.isna(value):
+        return None
+    if isinstance(value, (float, np.floating)) and np.isinf(value):
+        return '+inf' if value > 0 else '-inf'
+    return value
+
+
+def export_excel(results_dir, workbook_name):
+    """
+    Writes the Excel workbook of a result from its Parquet sheets with a constant-memory writer.
+
+    Rows are read from the Parquet files a batch at a time and streamed to disk one at a time, so memory use
+    does not grow with the length of the series.
+    The workbook is written to a temporary name first so readers never see a half-written file.
+
+    Returns:
+        str: Path of the written workbook.
+    """
+    excel_path = os.path.join(results_dir, workbook_name)
+    tmp_path = excel_path + '.tmp'
+    workbook = xlsxwriter.Workbook(tmp_path, {'constant_memory': True, 'nan_inf_to_errors': True,
+                                              'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+    header_format = workbook.add_format({'bold': True})
+    for sheet_name in list_sheets(results_dir, workbook_name):
+        parquet = pq.ParquetFile(os.path.join(columnar_dir(results_dir, workbook_name), f"{sheet_name}.parquet"))
+        header = parquet.schema_arrow.empty_table().to_pandas()
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        worksheet.write_row(0, 0, [header.index.name or ''] + [str(c) for c in header.columns], header_format)
+        # A range index is not stored in the file, so it is rebuilt for the rows of each batch
+        range_index = next((pd.RangeIndex(index['start'], index['stop'], index['step'], name=index['name'])
+                            for index in (parquet.schema_arrow.pandas_metadata or {}).get('index_columns', [])
+                            if isinstance(index, dict) and index.get('kind') == 'range'), None)
+        row_number = 1
+        for batch in parquet.iter_batches():
+            df = pa.Table.from_batches([batch], parquet.schema_arrow).to_pandas()
+            if range_index is not None:
+                df.index = range_index[row_number - 1:row_number - 1 + len(df)]
+            for row in df.itertuples(index=True, name=None):
+                worksheet.write_row(row_number, 0, [_excel_value(v) for v in row])
+                row_number += 1
+    workbook.close()
+    os.replace(tmp_path, excel_path)
+    logging.info(f"*** Exported {workbook_name} *** \n")
+    return excel_path
+
+
+def wait_for_exports():
+    """Blocks until all background Excel exports have finished and re-raises the first error."""
+    with _pending_lock:
+        pending = list(_pending_exports)
+        _pending_exports.clear()
+    for future in pending:
+        future.result()
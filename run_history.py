@@ -0,0 +1,279 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from results_writer import columnar_dir, list_sheets, list_workbooks
+
+# One row per run, with its parameters, KPIs, stage timings and result files in indexed side tables, so
+# filtering and sorting on any KPI or parameter stays an index lookup with thousands of runs
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    elapsed_s REAL,
+    status TEXT,
+    sizing_mode TEXT,
+    shortage_case TEXT,
+    config_file TEXT,
+    results_dir TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT,
+    number REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS params_name_value ON params (name, value);
+CREATE INDEX IF NOT EXISTS params_name_number ON params (name, number);
+CREATE TABLE IF NOT EXISTS kpis (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS kpis_name_value ON kpis (name, value);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    seconds REAL,
+    source TEXT,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    workbook TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    path TEXT,
+    PRIMARY KEY (run_id, workbook, sheet)
+);
+"""
+
+RUN_COLUMNS = ['run_id', 'started_at', 'elapsed_s', 'status', 'sizing_mode', 'shortage_case', 'config_file',
+               'results_dir']
+
+
+def connect(db_path):
+    """Opens (creating if needed) a run history database. Concurrent runs may write to it at the same time."""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _number(value):
+    if isinstance(value, (bool, np.bool_)):
+        return float(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return None
+
+
+def run_kpis(outputs):
+    """
+    KPIs of a run from its stage outputs: the sizing results, the thermal unmet demand totals, the
+    objective and gap of each solve, the full-year deficit, curtailment and cycling of the sizing, and
+    its Monte Carlo deficit percentiles and LOLE.
+
+    Returns:
+        dict: KPI values keyed by name.
+    """
+    kpis = {}
+    thermal = outputs.get('thermal')
+    if thermal is not None:
+        schedule = thermal['schedule']
+        if schedule is not None:
+            unserved = schedule['Unserved Demand']
+            step = pd.Series(schedule.index).diff().median() if len(schedule) > 1 else pd.Timedelta(minutes=15)
+            hours = step / pd.Timedelta(hours=1)
+            kpis['thermal_unmet_mwh'] = float(unserved.sum() * hours)
+            kpis['thermal_unmet_peak_mw'] = float(unserved.max())
+            kpis['thermal_unmet_periods'] = float((unserved > 1e-6).sum())
+        for key in ('objective', 'gap'):
+            if thermal['status'].get(key) is not None:
+                kpis[f"thermal_{key}"] = float(thermal['status'][key])
+    sizing = outputs.get('sizing')
+    if sizing is not None:
+        for name, value in (sizing['result_sizing'] or {}).items():
+            if _number(value) is not None:
+                kpis[name] = _number(value)
+        for key in ('objective', 'gap'):
+            if sizing['status'].get(key) is not None:
+                kpis[f"sizing_{key}"] = float(sizing['status'][key])
+    verification = outputs.get('verification')
+    if verification is not None:
+        full_year = verification['summary']['full year']
+        for key in ('deficit_mwh', 'curtailment_mwh', 'battery_cycles'):
+            kpis[f"verified_{key}"] = float(full_year[key])
+    monte_carlo = outputs.get('monte_carlo')
+    if monte_carlo is not None:
+        for percentile in ('P50', 'P90', 'P99'):
+            kpis[f"deficit_mwh_{percentile.lower()}"] = float(monte_carlo['summary'].loc['deficit_mwh', percentile])
+        kpis['lole_hours'] = float(monte_carlo['reliability'].loc['LOLE (hours/year)', 'Value'])
+    return kpis
+
+
+def result_series(results_dir):
+    """Columnar result files of a Results folder as (workbook, sheet, path) rows."""
+    return [(workbook, sheet, os.path.abspath(os.path.join(columnar_dir(results_dir, workbook), f"{sheet}.parquet")))
+            for workbook in list_workbooks(results_dir) for sheet in list_sheets(results_dir, workbook)]
+
+
+def record_run(db_path, params, kpis, timings, results_dir, config_file=None, started_at=None, elapsed_s=None,
+               status=None, series_dir=None):
+    """
+    Adds a run to the history.
+
+    Args:
+        db_path (str): The history database.
+        params (dict): Configuration parameters of the run as returned by read_config.
+        kpis (dict): KPI values keyed by name (see run_kpis).
+        timings (dict): (seconds, source) of each stage, as filled in by stage_graph.run_stages.
+        results_dir (str): Results folder of the run.
+        config_file (str): Config file of the run.
+        started_at (datetime): Start of the run. None uses now.
+        elapsed_s (float): Duration of the run.
+        status (str): Outcome of the run (e.g. 'sized', 'no_solution', 'skipped').
+        series_dir (str): Folder whose columnar files are recorded as the run's series (e.g. its archive
+                          entry). None uses results_dir.
+
+    Returns:
+        int: The run id.
+    """
+    started_at = (started_at or datetime.now()).isoformat(timespec='seconds')
+    with connect(db_path) as connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (started_at, elapsed_s, status, sizing_mode, shortage_case, config_file, results_dir)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (started_at, elapsed_s, status, params.get('sizing_mode', 'deterministic'), params.get('shortage_case'),
+             os.path.abspath(config_file) if config_file else None, os.path.abspath(results_dir)))
+        run_id = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO params (run_id, name, value, number) VALUES (?, ?, ?, ?)",
+            [(run_id, name, json.dumps(value) if isinstance(value, dict) else str(value), _number(value))
+             for name, value in params.items()])
+        connection.executemany("INSERT INTO kpis (run_id, name, value) VALUES (?, ?, ?)",
+                               [(run_id, name, value) for name, value in kpis.items()])
+        connection.executemany("INSERT INTO timings (run_id, stage, seconds, source) VALUES (?, ?, ?, ?)",
+                               [(run_id, stage, seconds, source) for stage, (seconds, source) in timings.items()])
+        connection.executemany("INSERT INTO series (run_id, workbook, sheet, path) VALUES (?, ?, ?, ?)",
+                               [(run_id, *row) for row in result_series(series_dir or results_dir)])
+    connection.close()
+    return run_id
+
+
+def forget_series(db_path, folders):
+    """Removes the series recorded under folders that were deleted (the runs and their KPIs are kept)."""
+    with connect(db_path) as connection:
+        connection.executemany("DELETE FROM series WHERE path LIKE ? ESCAPE '\\'",
+                               [(os.path.abspath(folder).replace('\\', '\\\\').replace('%', '\\%')
+                                 .replace('_', '\\_') + os.sep + '%',) for folder in folders])
+    connection.close()
+
+
+def kpi_names(db_path):
+    """Names of the KPIs recorded in the history."""
+    with connect(db_path) as connection:
+        names = [row[0] for row in connection.execute("SELECT DISTINCT name FROM kpis ORDER BY name")]
+    connection.close()
+    return names
+
+
+def find_runs(db_path, kpi_ranges=None, param_values=None, statuses=None, order_by='started_at', descending=True,
+              limit=500):
+    """
+    Runs of the history matching filters, with their KPIs as columns.
+
+    Args:
+        db_path (str): The history database.
+        kpi_ranges (dict): (low, high) of KPIs the runs must have within range; None leaves a side open.
+        param_values (dict): Values (as written in the config) of parameters the runs must have.
+        statuses (list): Outcomes to keep. None keeps all.
+        order_by (str): 'started_at', 'elapsed_s' or a KPI name.
+        descending (bool): Sort from the largest value.
+        limit (int): Maximum number of runs returned.
+
+    Returns:
+        pd.DataFrame: One row per run, indexed by run id: the run columns and one column per KPI.
+    """
+    # Placeholders of the joins come before those of the WHERE clause in the query
+    joins, join_args, where, where_args = [], [], [], []
+    for i, (name, (low, high)) in enumerate((kpi_ranges or {}).items()):
+        joins.append(f"JOIN kpis k{i} ON k{i}.run_id = runs.run_id AND k{i}.name = ?")
+        join_args.append(name)
+        if low is not None:
+            where.append(f"k{i}.value >= ?")
+            where_args.append(low)
+        if high is not None:
+            where.append(f"k{i}.value <= ?")
+            where_args.append(high)
+    for i, (name, value) in enumerate((param_values or {}).items()):
+        joins.append(f"JOIN params p{i} ON p{i}.run_id = runs.run_id AND p{i}.name = ? AND p{i}.value = ?")
+        join_args += [name, str(value)]
+    if statuses:
+        where.append(f"runs.status IN ({', '.join('?' * len(statuses))})")
+        where_args += list(statuses)
+    if order_by in ('started_at', 'elapsed_s'):
+        order = f"runs.{order_by}"
+    else:
+        joins.append("LEFT JOIN kpis sort_kpi ON sort_kpi.run_id = runs.run_id AND sort_kpi.name = ?")
+        join_args.append(order_by)
+        order = "sort_kpi.value"
+    query = (f"SELECT {', '.join(f'runs.{column}' for column in RUN_COLUMNS)} FROM runs {' '.join(joins)}"
+             f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+             f" ORDER BY {order} IS NULL, {order} {'DESC' if descending else 'ASC'}, runs.run_id DESC LIMIT ?")
+    args = join_args + where_args + [int(limit)]
+
+    with connect(db_path) as connection:
+        runs = pd.DataFrame(connection.execute(query, args).fetchall(), columns=RUN_COLUMNS).set_index('run_id')
+        kpis = _rows_for(connection, "SELECT run_id, name, value FROM kpis", runs.index)
+    connection.close()
+    if not kpis.empty:
+        runs = runs.join(kpis.pivot(index='run_id', columns='name', values='value'))
+    return runs
+
+
+def _rows_for(connection, query, run_ids):
+    run_ids = [int(run_id) for run_id in run_ids]
+    if not run_ids:
+        return pd.DataFrame(columns=['run_id', 'name', 'value'])
+    rows = connection.execute(f"{query} WHERE run_id IN ({', '.join('?' * len(run_ids))})", run_ids).fetchall()
+    return pd.DataFrame(rows, columns=['run_id', 'name', 'value'])
+
+
+def compare_runs(db_path, run_ids, all_params=False):
+    """
+    Side-by-side view of runs.
+
+    Args:
+        db_path (str): The history database.
+        run_ids (list): The runs to compare.
+        all_params (bool): Show every parameter instead of only those that differ between the runs.
+
+    Returns:
+        dict: DataFrames with one column per run: 'kpis', 'params' and 'timings' (seconds per stage), and
+              'series' (the columnar result files of each run).
+    """
+    with connect(db_path) as connection:
+        kpis = _rows_for(connection, "SELECT run_id, name, value FROM kpis", run_ids)
+        params = _rows_for(connection, "SELECT run_id, name, value FROM params", run_ids)
+        timings = _rows_for(connection, "SELECT run_id, stage, seconds FROM timings", run_ids)
+        series = _rows_for(connection, "SELECT run_id, workbook || ' / ' || sheet, path FROM series", run_ids)
+    connection.close()
+
+    def side_by_side(rows):
+        table = rows.pivot(index='name', columns='run_id', values='value') if not rows.empty else pd.DataFrame()
+        return table.reindex(columns=[int(run_id) for run_id in run_ids])
+
+    params = side_by_side(params)
+    if not all_params and not params.empty:
+        params = params[params.nunique(axis=1, dropna=False) > 1]
+    return {'kpis': side_by_side(kpis), 'params': params, 'timings': side_by_side(timings),
+            'series': side_by_side(series)}
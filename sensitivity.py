@@ -0,0 +1,244 @@
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.common.collections import ComponentMap
+from pyomo.environ import Constraint, Objective, value
+
+# Prefixes of the row names written by Pyomo's MPS writer (range constraints become two rows)
+_ROW_PREFIXES = ('c_e_', 'c_l_', 'c_u_', 'r_l_', 'r_u_')
+
+# Scalar constraints of the sizing model and the config parameter that sets their right-hand side
+SIZING_BOUND_CONSTRAINTS = {
+    'total_solar_min_constraint': 'min_total_solar',
+    'total_solar_max_constraint': 'max_total_solar',
+    'total_wind_min_constraint': 'min_total_wind',
+    'total_wind_max_constraint': 'max_total_wind',
+    'cap_max': 'max_size_batt_mwh',
+}
+
+# Constraints of the sizing model on the size of each site, with the Param and the registry column of their
+# right-hand side
+SIZING_SITE_CONSTRAINTS = {
+    'site_min_constraint': ('site_min', 'min_mw'),
+    'site_max_constraint': ('site_max', 'max_mw'),
+}
+
+# Per-period constraints of the sizing model whose right-hand side is one config parameter
+SIZING_PERIOD_CONSTRAINTS = {
+    'max_gdam_constraint': 'max_gdam_purchase',
+    'max_rate_ch': 'max_charge_discharge_power_bess',
+    'max_rate_dish': 'max_charge_discharge_power_bess',
+}
+
+
+def solve_with_sensitivity(model, model_name, time_limit=0):
+    """
+    Solves an LP with HiGHS and returns its duals, reduced costs and ranging information.
+
+    The model is exported to MPS and solved through highspy so that HiGHS' ranging (the interval over
+    which each cost coefficient or right-hand side can move without changing the optimal basis) is
+    available. The solution is loaded back into the model.
+
+    Args:
+        model (ConcreteModel): The (minimization) LP to solve.
+        model_name (str): Label used in the log and the status report (e.g. 'sizing').
+        time_limit (float): Wall-clock budget in seconds. 0 or None means no limit.
+
+    Returns:
+        tuple: (status, sensitivity). status has the format of solver_utils.solve_with_budget.
+               sensitivity maps 'cost' (objective coefficient), 'reduced_cost' and 'cost_range'
+               (lower, upper) to variables and 'dual' and 'rhs_range' (lower, upper) to constraints,
+               keyed by Pyomo component data. None without an optimal solution.
+    """
+    import highspy
+
+    status = {'model': model_name, 'termination': 'error', 'has_solution': False, 'optimal': False,
+              'objective': None, 'bound': None, 'gap': None, 'solve_time_s': None, 'solver': 'highs_ranging'}
+    logging.info(f"Solving {model_name} model with sensitivity ranging (time limit: {time_limit or 'none'} s)")
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir:
+        mps_path, smap_id = model.write(os.path.join(work_dir, 'model.mps'), format='mps',
+                                        io_options={'symbolic_solver_labels': False})
+        by_symbol = model.solutions.symbol_map[smap_id].bySymbol
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', False)
+        h.readModel(mps_path)
+    if time_limit:
+        h.setOptionValue('time_limit', float(time_limit))
+    h.run()
+    status['solve_time_s'] = time.perf_counter() - start
+
+    model_status = h.getModelStatus()
+    status['termination'] = h.modelStatusToString(model_status)
+    if model_status != highspy.HighsModelStatus.kOptimal:
+        logging.error(f"*** {model_name} model has no optimal solution ({status['termination']}); "
+                      f"no sensitivity report *** \n")
+        return status, None
+
+    lp = h.getLp()
+    solution = h.getSolution()
+    ranging_status, ranging = h.getRanging()
+    num_col, num_row = lp.num_col_, lp.num_row_
+
+    columns = [by_symbol[name] for name in lp.col_names_]
+    for var, column_value in zip(columns, solution.col_value):
+        var.set_value(column_value, skip_validation=True)
+
+    sensitivity = {
+        'cost': ComponentMap(zip(columns, lp.col_cost_)),
+        'reduced_cost': ComponentMap(zip(columns, solution.col_dual)),
+        'cost_range': ComponentMap(zip(columns, zip(ranging.col_cost_dn.value_[:num_col],
+                                                    ranging.col_cost_up.value_[:num_col]))),
+        'dual': ComponentMap(),
+        'rhs_range': ComponentMap(),
+    }
+    if ranging_status != highspy.HighsStatus.kOk:
+        logging.warning(f"HiGHS ranging failed for the {model_name} model; reporting duals only")
+        sensitivity['cost_range'] = ComponentMap()
+    row_lower = np.array(ranging.row_bound_dn.value_[:num_row], dtype=float)
+    row_upper = np.array(ranging.row_bound_up.value_[:num_row], dtype=float)
+    # A constraint that does not bind stays slack until its right-hand side reaches the row activity
+    basic = np.array([status == highspy.HighsBasisStatus.kBasic for status in h.getBasis().row_status])
+    activity = np.asarray(solution.row_value, dtype=float)
+    upper_rows = np.isfinite(np.asarray(lp.row_upper_, dtype=float))
+    row_lower[basic & upper_rows] = activity[basic & upper_rows]
+    row_upper[basic & upper_rows] = np.inf
+    row_lower[basic & ~upper_rows] = -np.inf
+    row_upper[basic & ~upper_rows] = activity[basic & ~upper_rows]
+    for name, dual, lower, upper in zip(lp.row_names_, solution.row_dual, row_lower, row_upper):
+        constraint = by_symbol[name[4:-1]] if name.startswith(_ROW_PREFIXES) else None
+        if constraint is None or constraint.ctype is not Constraint:
+            continue
+        # Of the two rows of a range constraint, report the one that binds
+        if constraint not in sensitivity['dual'] or abs(dual) > abs(sensitivity['dual'][constraint]):
+            sensitivity['dual'][constraint] = dual
+            if ranging_status == highspy.HighsStatus.kOk:
+                sensitivity['rhs_range'][constraint] = (lower, upper)
+
+    objective = next(model.component_data_objects(Objective, active=True))
+    status.update({'has_solution': True, 'optimal': True, 'objective': value(objective), 'gap': 0.0})
+    status['bound'] = status['objective']
+    logging.info(f"*** {model_name} model solved with ranging in {status['solve_time_s']:.1f} s *** \n")
+    return status, sensitivity
+
+
+def _range(sensitivity, key, component):
+    return sensitivity[key].get(component, (np.nan, np.nan))
+
+
+def sizing_sensitivity_report(model, sensitivity, params):
+    """
+    Marginal values and valid ranges of the sizing cost parameters and size bounds.
+
+    A cost parameter can move within its range (or a bound within its range) without changing which
+    capacities are built; inside the range the objective changes by the marginal value per unit. The cost
+    and size limits of each site are named after the site and its registry column (e.g. 'solar_size_goa cost').
+    An unbounded end of a range is -inf or +inf, which the Excel export writes as '-inf' and '+inf'.
+
+    Args:
+        model (ConcreteModel): The sizing model solved by solve_with_sensitivity.
+        sensitivity (dict): Sensitivity information returned by solve_with_sensitivity.
+        params (dict): Configuration parameters as returned by read_config.
+
+    Returns:
+        tuple: (cost_report, bound_report) DataFrames indexed by parameter name.
+    """
+    cost_rows = []
+    cost_parameters = {f"{site} cost": (site, model.size[site], model.site_cost[site], None) for site in model.S}
+    cost_parameters['battery_cost_mwh'] = ('battery_capacity', model.battery_capacity, params['battery_cost_mwh'], 1.0)
+    for parameter, (var_name, var, cost, production) in cost_parameters.items():
+        coefficient_lower, coefficient_upper = _range(sensitivity, 'cost_range', var)
+        if production is None:
+            # The objective coefficient of a size is its cost times the production of 1 MW over all periods
+            production = sensitivity['cost'].get(var, 0.0) / cost if cost else np.nan
+        cost_rows.append({
+            'parameter': parameter, 'variable': var_name, 'current_value': cost, 'capacity': value(var),
+            'marginal_value': value(var) * production,
+            'reduced_cost_per_mw': sensitivity['reduced_cost'].get(var, np.nan),
+            'valid_from': coefficient_lower / production, 'valid_to': coefficient_upper / production,
+        })
+
+    bound_rows = []
+    for constraint_name, parameter in SIZING_BOUND_CONSTRAINTS.items():
+        constraint = getattr(model, constraint_name)
+        if not constraint.active or len(constraint) == 0:
+            continue  # No sites of the technology
+        lower, upper = _range(sensitivity, 'rhs_range', constraint)
+        bound_rows.append({'parameter': parameter, 'constraint': constraint_name,
+                           'current_value': params[parameter],
+                           'marginal_value': sensitivity['dual'].get(constraint, np.nan),
+                           'valid_from': lower, 'valid_to': upper})
+    for constraint_name, (param_name, column) in SIZING_SITE_CONSTRAINTS.items():
+        for site, constraint in getattr(model, constraint_name).items():
+            lower, upper = _range(sensitivity, 'rhs_range', constraint)
+            bound_rows.append({'parameter': f"{site} {column}", 'constraint': constraint.name,
+                               'current_value': getattr(model, param_name)[site],
+                               'marginal_value': sensitivity['dual'].get(constraint, np.nan),
+                               'valid_from': lower, 'valid_to': upper})
+    for constraint_name, parameter in SIZING_PERIOD_CONSTRAINTS.items():
+        # The same bound in every period: its marginal value is the sum over periods, the range is per period
+        duals = [sensitivity['dual'].get(c, 0.0) for c in getattr(model, constraint_name).values()]
+        bound_rows.append({'parameter': parameter, 'constraint': constraint_name,
+                           'current_value': params[parameter], 'marginal_value': float(np.sum(duals)),
+                           'valid_from': np.nan, 'valid_to': np.nan})
+
+    return (pd.DataFrame(cost_rows).set_index('parameter'),
+            pd.DataFrame(bound_rows).set_index('parameter'))
+
+
+def thermal_sensitivity_report(model, sensitivity, time_index):
+    """
+    Marginal values of the generator costs and capacities, and the marginal price of each period.
+
+    A generator's variable cost applies to every period at once, so its valid range is the one the
+    100% rule guarantees for a uniform change across all of its periods.
+
+    Args:
+        model (ConcreteModel): The thermal model solved by solve_with_sensitivity.
+        sensitivity (dict): Sensitivity information returned by solve_with_sensitivity.
+        time_index: Timestamps of the periods.
+
+    Returns:
+        tuple: (generator_report, marginal_price) DataFrames.
+    """
+    rows = []
+    for i in model.I:
+        columns = [model.x[i, t] for t in model.T]
+        cost = value(model.var_cost[i])
+        lower, upper = zip(*(_range(sensitivity, 'cost_range', var) for var in columns))
+        down_allowance = cost - np.asarray(lower, dtype=float)
+        up_allowance = np.asarray(upper, dtype=float) - cost
+        # Capacity enters the capacity, ramp and minimum generation limits of every period
+        min_gen_factor = value(model.min_gen[i]) / value(model.cap[i]) if value(model.cap[i]) else 0.0
+        capacity_value = 0.0
+        for t in model.T:
+            capacity_value += sensitivity['dual'].get(model.capacity_limit[i, t], 0.0)
+            capacity_value += min_gen_factor * sensitivity['dual'].get(model.min_gen_limit[i, t], 0.0)
+            for ramp in (model.ramp_up, model.ramp_down):
+                if (i, t) in ramp:
+                    capacity_value += value(model.ramp_rate) * sensitivity['dual'].get(ramp[i, t], 0.0)
+        rows.append({
+            'generator': i, 'var_cost': cost, 'capacity_mw': value(model.cap[i]),
+            'marginal_value_var_cost': sum(value(var) for var in columns),  # The total output
+            'var_cost_valid_from': cost - _uniform_allowance(down_allowance),
+            'var_cost_valid_to': cost + _uniform_allowance(up_allowance),
+            'marginal_value_capacity': capacity_value,
+        })
+
+    marginal_price = pd.DataFrame({
+        'Marginal Price': [sensitivity['dual'].get(model.demand_balance[t], np.nan) for t in model.T],
+        'Unserved Demand': [value(model.u[t]) for t in model.T],
+    }, index=time_index)
+    return pd.DataFrame(rows).set_index('generator'), marginal_price
+
+
+def _uniform_allowance(allowances):
+    """Largest uniform change of several cost coefficients that the 100% rule keeps inside the basis."""
+    allowances = np.abs(allowances)
+    if np.any(allowances == 0):
+        return 0.0
+    return 1.0 / np.sum(1.0 / allowances)
@@ -0,0 +1,164 @@
+import atexit
+import gc
+import io
+import logging
+import multiprocessing
+import pickle
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Stages whose outputs (the parsed demand history and RE profiles, and the aligned profile matrix) are shared
+SHARED_STAGES = ['demand_history', 're_profiles', 'df_all']
+
+_ALIGNMENT = 64
+_created = set()  # Shared memory blocks created by this process
+_attached = {}  # Shared memory blocks attached by this process, keyed by name, with their unpickled objects
+
+
+def _rebuild_datetime_index(values, name, freq):
+    return pd.DatetimeIndex(values.view('M8[ns]'), name=name, freq=freq)
+
+
+class _OutOfBandPickler(pickle.Pickler):
+    """
+    Pickler that also passes the data of time indexes and memory-mapped arrays (e.g. the columns of a profile
+    store) out of band, so it is shared instead of copied.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, pd.DatetimeIndex) and obj.tz is None and obj.dtype == 'M8[ns]':
+            return _rebuild_datetime_index, (obj.asi8, obj.name, obj.freq)
+        if isinstance(obj, np.memmap):
+            return np.asarray(obj).__reduce_ex__(5)
+        return NotImplemented
+
+
+class SharedInputs:
+    """
+    Objects (e.g. stage outputs) placed once in shared memory for worker processes.
+
+    The objects are pickled with their array data out of band (pickle protocol 5) and the arrays are
+    copied into one shared memory block. Workers rebuild the objects from the small remaining pickle with
+    attach_shared_inputs, and their arrays are read-only views of the block: no copy per worker, nothing
+    to parse or unpickle but the object skeleton.
+
+    Use as a context manager in the parent process, which owns the block and removes it on exit.
+
+    Args:
+        objects (dict): The objects to share, keyed by name.
+    """
+
+    def __init__(self, objects):
+        buffers = []
+        stream = io.BytesIO()
+        _OutOfBandPickler(stream, protocol=5, buffer_callback=buffers.append).dump(objects)
+
+        # Arrays seen more than once (e.g. an index shared by several frames) are stored once
+        layout, offsets, size = [], {}, 0
+        raw_buffers = [buffer.raw() for buffer in buffers]
+        for raw in raw_buffers:
+            key = (np.frombuffer(raw, dtype=np.uint8).__array_interface__['data'][0], raw.nbytes)
+            if key not in offsets:
+                offsets[key] = size
+                size += -(-raw.nbytes // _ALIGNMENT) * _ALIGNMENT
+            layout.append((offsets[key], raw.nbytes))
+
+        self._block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        _created.add(self._block.name)
+        for raw, (offset, nbytes) in zip(raw_buffers, layout):
+            self._block.buf[offset:offset + nbytes] = raw.cast('B')
+        self.nbytes = size
+        self.handle = {'name': self._block.name, 'pickle': stream.getvalue(), 'layout': layout}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        self._block.close()
+        self._block.unlink()
+
+
+def attach_shared_inputs(handle):
+    """
+    Rebuilds the objects of a SharedInputs handle as read-only views of its shared memory block. A process
+    attaches each block once; later calls return the same objects.
+
+    Returns:
+        dict: The shared objects, keyed by name.
+    """
+    name = handle['name']
+    if name not in _attached:
+        block = shared_memory.SharedMemory(name=name)
+        if sys.platform != 'win32' and multiprocessing.parent_process() is None and name not in _created:
+            # The owner removes the block, so the resource tracker of this (unrelated) process must not remove
+            # it on exit. Pool workers share the tracker of their parent, where the block is registered once.
+            resource_tracker.unregister(block._name, 'shared_memory')
+        views = [block.buf[offset:offset + nbytes].toreadonly() for offset, nbytes in handle['layout']]
+        _attached[name] = (block, pickle.loads(handle['pickle'], buffers=views))
+    return _attached[name][1]
+
+
+def with_shared_inputs(task):
+    """
+    The entries of a pool task, together with the shared objects of the SharedInputs handle it carries under
+    'shared_inputs' (if any). Entries of the task itself take precedence.
+    """
+    if 'shared_inputs' not in task:
+        return task
+    return {**attach_shared_inputs(task['shared_inputs']), **task}
+
+
+@atexit.register
+def _detach_all():
+    # The views must be released before the blocks are closed, or closing them fails at exit
+    blocks = [block for block, _ in _attached.values()]
+    _attached.clear()
+    gc.collect()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:  # Still referenced elsewhere; the memory is released with the process
+            pass
+
+
+def share_pipeline_inputs(config_file, stage_names=None, worker_configs=()):
+    """
+    Runs (or reuses from checkpoints) the given stages of a config in this process and shares their outputs
+    with run_optimization(..., shared_inputs=handle) in worker processes. A worker uses a shared output only
+    if its own stage key is the same, e.g. when its config only differs in costs.
+
+    Args:
+        config_file (str): Config file of the runs.
+        stage_names (list): Stages to share. None uses SHARED_STAGES.
+        worker_configs (list): Config files of the worker runs. Stages whose key differs in any of them
+                               (e.g. df_all when the demand is varied) are not shared, as no worker could use them.
+
+    Returns:
+        SharedInputs: The shared stage outputs, each with its stage key.
+    """
+    from optimization_model import input_paths, read_config, stage_checkpoint_dir
+    from pipeline import STAGES
+    from stage_graph import run_stages, stage_keys
+
+    params = read_config(config_file)
+    paths = input_paths(params)
+    stage_names = list(stage_names or SHARED_STAGES)
+    keys = stage_keys(STAGES, params, paths, stage_names)
+    for worker_config in worker_configs:
+        worker_params = read_config(worker_config)
+        worker_keys = stage_keys(STAGES, worker_params, input_paths(worker_params), stage_names)
+        stage_names = [name for name in stage_names if worker_keys[name] == keys[name]]
+    if not stage_names:
+        logging.info("*** No stage output is the same for all workers; nothing shared *** \n")
+        return SharedInputs({})
+
+    outputs = run_stages(STAGES, params, paths, targets=stage_names, checkpoint_dir=stage_checkpoint_dir(params))
+    shared = SharedInputs({name: (keys[name], outputs[name]) for name in stage_names})
+    logging.info(f"*** Shared {', '.join(stage_names)} with the workers ({shared.nbytes / 2 ** 20:.1f} MB) *** \n")
+    return shared
@@ -0,0 +1,167 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import input_cache
+from sizing_model import BATTERY_VARIABLES
+from validation import check_site_registry, issue, raise_for_issues
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Columns of the site registry: technology ('solar' or 'wind'), region, losses (fraction of the production
+# lost on the way to the demand), cost, smallest and largest size (MW; no largest size when blank) and the
+# profile source: one of BUILTIN_PROFILES or a CSV file of the hourly production of 1 MW
+# ('local_time', 'electricity'), like the solar files
+REGISTRY_COLUMNS = ['technology', 'region', 'losses', 'cost', 'min_mw', 'max_mw', 'profile']
+_TEXT_COLUMNS = ['technology', 'region', 'profile']
+_NUMBER_COLUMNS = ['losses', 'cost', 'min_mw', 'max_mw']
+
+# Technologies with total solar and wind limits in the sizing model
+TECHNOLOGIES = ['solar', 'wind']
+
+# Profiles of pipeline.load_re_profiles (scaled to the CEA monthly CUFs) a site can use as its source
+BUILTIN_PROFILES = ['solar_goa', 'solar_gujarat', 'solar_rajasthan', 'solar_telangana', 'wind_maharashtra',
+                    'wind_tamil', 'wind_karnataka']
+
+# Sites of the registry when no registry file is configured, with the config parameter of each column
+# (plain values where there is no parameter)
+CONFIG_SITES = {
+    'solar_size_goa': {'technology': 'solar', 'region': 'Goa', 'losses': 'intra_state_power_losses',
+                       'cost': 'solar_cost_goa', 'min_mw': 'min_solar_goa', 'max_mw': 'max_solar_goa',
+                       'profile': 'solar_goa'},
+    'solar_size_guj': {'technology': 'solar', 'region': 'Gujarat', 'losses': 'inter_state_power_losses',
+                       'cost': 'solar_cost_guj', 'min_mw': 'min_solar_guj', 'max_mw': np.inf,
+                       'profile': 'solar_gujarat'},
+    'solar_size_raj': {'technology': 'solar', 'region': 'Rajasthan', 'losses': 'inter_state_power_losses',
+                       'cost': 'solar_cost_raj', 'min_mw': 'min_solar_raj', 'max_mw': np.inf,
+                       'profile': 'solar_rajasthan'},
+    'solar_size_tel': {'technology': 'solar', 'region': 'Telangana', 'losses': 'inter_state_power_losses',
+                       'cost': 'solar_cost_tel', 'min_mw': 'min_solar_tel', 'max_mw': np.inf,
+                       'profile': 'solar_telangana'},
+    'wind_size_maha': {'technology': 'wind', 'region': 'Maharashtra', 'losses': 'intra_state_power_losses',
+                       'cost': 'wind_cost_maha', 'min_mw': 'min_wind_maha', 'max_mw': np.inf,
+                       'profile': 'wind_maharashtra'},
+    'wind_size_tamil': {'technology': 'wind', 'region': 'Tamil Nadu', 'losses': 'inter_state_power_losses',
+                        'cost': 'wind_cost_tamil', 'min_mw': 'min_wind_tamil', 'max_mw': np.inf,
+                        'profile': 'wind_tamil'},
+    'wind_size_karnataka': {'technology': 'wind', 'region': 'Karnataka', 'losses': 'inter_state_power_losses',
+                            'cost': 'wind_cost_karnataka', 'min_mw': 'min_wind_karnataka', 'max_mw': np.inf,
+                            'profile': 'wind_karnataka'},
+}
+CONFIG_SITE_PARAMS = sorted({site[column] for site in CONFIG_SITES.values() for column in _NUMBER_COLUMNS
+                             if isinstance(site[column], str)})
+
+
+def resolve_path(path):
+    """Resolves a path of the registry (or of the config) relative to the script folder."""
+    path = str(path).strip()
+    return path if os.path.isabs(path) else os.path.join(PACKAGE_DIR, path)
+
+
+def read_site_registry(path):
+    """
+    Reads a site registry file: a CSV with a 'site' column (the name of each candidate site, used for its
+    capacity in the results) and the REGISTRY_COLUMNS.
+
+    Returns:
+        pd.DataFrame: The registry indexed by site, with a blank max_mw read as no limit (inf).
+    """
+    registry = input_cache.read_csv(path, skipinitialspace=True)
+    registry.columns = registry.columns.str.strip()
+    missing = [column for column in ['site'] + REGISTRY_COLUMNS if column not in registry.columns]
+    if missing:
+        raise_for_issues([issue('error', 'missing column', os.path.basename(path),
+                                f"no column {', '.join(missing)}")], 'site registry')
+    registry = registry[['site'] + REGISTRY_COLUMNS].copy()
+    for column in ['site'] + _TEXT_COLUMNS:
+        registry[column] = registry[column].fillna('').astype(str).str.strip()
+    registry['technology'] = registry['technology'].str.lower()
+    # Values that are not numbers are left as NaN and reported by the registry checks
+    blank_max = registry['max_mw'].isna()
+    for column in _NUMBER_COLUMNS:
+        registry[column] = pd.to_numeric(registry[column], errors='coerce')
+    registry.loc[blank_max, 'max_mw'] = np.inf
+    return registry.set_index('site')
+
+
+def config_site_registry(params):
+    """The registry of the seven state sites of CONFIG_SITES, with their values taken from the config."""
+    rows = {site: {column: params[spec] if column in _NUMBER_COLUMNS and isinstance(spec, str) else spec
+                   for column, spec in columns.items()}
+            for site, columns in CONFIG_SITES.items()}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=REGISTRY_COLUMNS).rename_axis('site')
+
+
+def site_names(params):
+    """Names of the candidate sites of a config, without checking the registry."""
+    path = str(params.get('file_path_site_registry', '')).strip()
+    return list(read_site_registry(resolve_path(path)).index) if path else list(CONFIG_SITES)
+
+
+def registry_profile_files(path):
+    """
+    Profile files a registry file reads, resolved relative to the script folder, so the stages that read
+    them are recomputed when they change. Empty if the registry cannot be read (it is reported missing
+    or invalid when it is loaded).
+    """
+    try:
+        profiles = read_site_registry(path)['profile']
+    except (OSError, ValueError, KeyError):
+        return []
+    return sorted({resolve_path(profile) for profile in profiles if profile not in BUILTIN_PROFILES})
+
+
+def load_site_registry(params, paths):
+    """
+    The candidate sites of the sizing: the registry file (file_path_site_registry) if one is configured,
+    otherwise the state sites of the config (CONFIG_SITES).
+
+    Raises:
+        InputValidationError: With the report of all problems of the registry, if any of them is an error.
+
+    Returns:
+        pd.DataFrame: The registry (REGISTRY_COLUMNS), indexed by site.
+    """
+    if 'file_path_site_registry' in paths:
+        path = paths['file_path_site_registry'][0]
+        sites = read_site_registry(path)
+        source = os.path.basename(path)
+    else:
+        sites = config_site_registry(params)
+        source = 'the config'
+    raise_for_issues(check_site_registry(sites, TECHNOLOGIES, BATTERY_VARIABLES + ['total_deficit']),
+                     'site registry')
+    counts = ', '.join(f"{count} {technology}" for technology, count in sites['technology'].value_counts().items())
+    logging.info(f"*** Site registry: {len(sites)} candidate sites ({counts}) from {source} *** \n")
+    return sites
+
+
+def site_production(sites, sources):
+    """
+    Production of 1 MW of each site in every period, net of its losses: the profile source of every site at
+    once, scaled by (1 - losses) site by site.
+
+    Args:
+        sites (pd.DataFrame): The registry.
+        sources (pd.DataFrame): Production of 1 MW of each profile source (columns) in every period. Sites
+                                whose source is not among the columns are left out.
+
+    Returns:
+        pd.DataFrame: The production of each site (columns, in registry order), on the index of sources.
+    """
+    sites = sites[sites['profile'].isin(sources.columns)]
+    production = sources[sites['profile']].to_numpy(dtype=float) * (1 - sites['losses'].to_numpy(dtype=float))
+    return pd.DataFrame(production, index=sources.index, columns=sites.index)
+
+
+def site_labels(sites):
+    """
+    Column label of the production of each site in the results (e.g. 'Solar Production Goa'); sites sharing a
+    technology and region are told apart by their name.
+    """
+    labels = sites['technology'].str.title() + ' Production ' + sites['region']
+    shared = labels.duplicated(keep=False)
+    labels[shared] = labels[shared] + ' (' + sites.index[shared] + ')'
+    return labels
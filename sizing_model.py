@@ -0,0 +1,280 @@
+from itertools import product
+
+import numpy as np
+from pyomo.environ import (ConcreteModel, Set, Param, Var, Constraint, Objective,
+                           NonNegativeReals, Binary, value)
+
+# Battery investment decisions of the sizing model; the RE capacity of each candidate site is model.size
+BATTERY_VARIABLES = ['battery_capacity', 'max_charge_rate']
+
+# Time series variables of the sizing model, in the order they are reported
+SERIES_VARIABLES = ['gdam_purchase', 'charge', 'discharge', 'soc', 'deficit']
+
+PEN_CHARGE_DISCHARGE = 10
+
+
+def capacity_names(sites):
+    """Investment decisions of the sizing model: the size of each candidate site and the BATTERY_VARIABLES."""
+    return list(sites.index) + BATTERY_VARIABLES
+
+
+def capacity_var(model, name):
+    """Variable of an investment decision (a site or one of the BATTERY_VARIABLES) of a sizing model."""
+    return getattr(model, name) if name in BATTERY_VARIABLES else model.size[name]
+
+
+def capacity_values(model):
+    """Values of the investment decisions of a solved sizing model, keyed by site and BATTERY_VARIABLES."""
+    capacities = {site: value(model.size[site]) for site in model.S}
+    capacities.update({name: value(getattr(model, name)) for name in BATTERY_VARIABLES})
+    return capacities
+
+
+def build_sizing_model(demand, gdam_price, sites, profiles, params):
+    """
+    Builds the RE & BESS sizing model (model_renewable) for one demand/generation profile.
+
+    The RE capacity is one variable indexed by the candidate sites, and the site data are set up column by
+    column from the registry, so the model grows with the number of sites only through the energy balance.
+
+    Args:
+        demand: Unserved demand to be covered in each period (1152 = 12 months x 96 time slots).
+        gdam_price: GDAM price in each period.
+        sites (pd.DataFrame): Candidate sites with their 'technology', 'cost', 'min_mw' and 'max_mw' (see
+                              site_registry).
+        profiles: Normalized production (1 MW) of each site in each period, keyed by site (e.g. a dict of
+                  arrays or a DataFrame with a column per site).
+        params (dict): Configuration parameters as returned by read_config.
+
+    Returns:
+        ConcreteModel: The sizing model, not yet solved.
+    """
+    allow_oversized_RE = params['allow_oversized_re']
+    penalty_sizing_unmet_demand = params['penalty_sizing_unmet_demand']
+    battery_cost_MWh = params['battery_cost_mwh']
+    max_size_batt_mwh = params['max_size_batt_mwh']
+    max_charge_discharge_power_bess = params['max_charge_discharge_power_bess']
+
+    model_renewable = ConcreteModel()
+    # Parameters
+    time_periods = list(range(len(demand)))
+    model_renewable.T = Set(initialize=time_periods)
+    model_renewable.demand = Param(model_renewable.T, initialize={t: demand[t] for t in time_periods})
+    model_renewable.gdam_price = Param(model_renewable.T, initialize={t: gdam_price[t] for t in time_periods})
+    model_renewable.max_gdam = Param(initialize=params['max_gdam_purchase'])
+    model_renewable.min_total_solar = Param(initialize=params['min_total_solar'], domain=NonNegativeReals)
+    model_renewable.max_total_solar = Param(initialize=params['max_total_solar'], domain=NonNegativeReals)
+    model_renewable.min_total_wind = Param(initialize=params['min_total_wind'], domain=NonNegativeReals)
+    model_renewable.max_total_wind = Param(initialize=params['max_total_wind'], domain=NonNegativeReals)
+
+    # Candidate sites, with their cost and size limits
+    site_names = list(sites.index)
+    model_renewable.S = Set(initialize=site_names)
+    model_renewable.site_cost = Param(model_renewable.S, initialize=dict(zip(site_names, sites['cost'])))
+    model_renewable.site_min = Param(model_renewable.S, initialize=dict(zip(site_names, sites['min_mw'])))
+    model_renewable.site_max = Param(model_renewable.S, initialize=dict(zip(site_names, sites['max_mw'])))
+    solar_sites = list(sites.index[sites['technology'] == 'solar'])
+    wind_sites = list(sites.index[sites['technology'] == 'wind'])
+
+    # Normalized production (0-1) of each site at each time period, as one sites x periods matrix
+    production = np.array([np.asarray(profiles[site], dtype=float) for site in site_names]).reshape(
+        len(site_names), len(time_periods))
+    model_renewable.production = Param(model_renewable.S, model_renewable.T,
+                                       initialize=dict(zip(product(site_names, time_periods),
+                                                           production.ravel().tolist())))
+    site_energy = dict(zip(site_names, production.sum(axis=1)))  # Production of 1 MW over all periods
+
+    # Decision variables: solar (MW) and wind (MW) capacity of each site
+    model_renewable.size = Var(model_renewable.S, domain=NonNegativeReals)
+
+    model_renewable.gdam_purchase = Var(model_renewable.T,
+                                        domain=NonNegativeReals)  # GDAM power share (MW) for each time period
+
+    model_renewable.battery_capacity = Var(domain=NonNegativeReals)  # Battery energy capacity (MWh)
+    model_renewable.max_charge_rate = Var(domain=NonNegativeReals)  # Max charge/discharge rate (MW)
+
+    # Battery operation variables
+    model_renewable.charge = Var(model_renewable.T, domain=NonNegativeReals)
+    model_renewable.discharge = Var(model_renewable.T, domain=NonNegativeReals)
+    model_renewable.soc = Var(model_renewable.T, domain=NonNegativeReals)
+    model_renewable.deficit = Var(model_renewable.T, domain=NonNegativeReals)  # Any remaining deficit
+
+    # Add a binary variable to indicate charging (1) or discharging (0)
+    model_renewable.is_charging = Var(model_renewable.T, domain=Binary)
+
+    def size_cost(model, sites):
+        return sum(model.site_cost[s] * site_energy[s] * model.size[s] for s in sites)
+
+    # Objective: Minimize the cost of new capacity and any remaining deficit
+    def objective_rule(model):
+        # Energy purchasing costs for solar and wind: the cost of the production of each site over all periods
+        solar_energy_cost = size_cost(model, solar_sites)
+        wind_energy_cost = size_cost(model, wind_sites)
+
+        battery_cost = (battery_cost_MWh * model.battery_capacity)
+
+        # GDAM purchase costs
+        gdam_cost = sum(model.gdam_price[t] * model.gdam_purchase[t] for t in model.T)
+
+        # Deficit penalty and battery operation control
+        deficit_penalty = sum(penalty_sizing_unmet_demand * model.deficit[t] for t in model.T)
+        charging_discharging_control = PEN_CHARGE_DISCHARGE * sum(
+            model.charge[t] + model.discharge[t] for t in model.T)
+
+        return solar_energy_cost + wind_energy_cost + battery_cost + gdam_cost + deficit_penalty + charging_discharging_control
+
+    model_renewable.objective = Objective(rule=objective_rule)
+
+    # Constraints
+
+    # Energy balance constraint
+    def energy_balance_rule(model, t):
+        re_generation = sum(model.production[s, t] * model.size[s] for s in model.S)
+        supply = re_generation + model.discharge[t] - model.charge[t] + model.gdam_purchase[t] + model.deficit[t]
+        if allow_oversized_RE == True:
+            return supply >= model.demand[t]
+        return supply == model.demand[t]
+
+    model_renewable.energy_balance = Constraint(model_renewable.T, rule=energy_balance_rule)
+
+    # Battery state of charge dynamics
+    def soc_rule(model, t):
+        if t == 0:
+            return model.soc[t] == 0.5 * model.battery_capacity + (
+                    model.charge[t] - model.discharge[t]) * (15 / 60)  # 15-min intervals
+        else:
+            return model.soc[t] == model.soc[t - 1] + (
+                    model.charge[t] - model.discharge[t]) * (15 / 60)
+
+    model_renewable.soc_constraint = Constraint(model_renewable.T, rule=soc_rule)
+
+    # Battery charging/discharging rate limits
+    def charge_rate_limit_rule(model, t):
+        return model.charge[t] <= 0.1 * model.battery_capacity
+
+    model_renewable.charge_rate_limit = Constraint(model_renewable.T, rule=charge_rate_limit_rule)
+
+    def discharge_rate_limit_rule(model, t):
+        return model.discharge[t] <= 0.1 * model.battery_capacity
+
+    model_renewable.discharge_rate_limit = Constraint(model_renewable.T, rule=discharge_rate_limit_rule)
+
+    # Add a constraint to make final SOC equal to initial SOC
+    def final_soc_rule(model):
+        t_final = model.T.last()
+        initial_soc = 0.5 * model.battery_capacity
+
+        return model.soc[t_final] == initial_soc
+
+    model_renewable.final_soc_constraint = Constraint(rule=final_soc_rule)
+
+    # Add constraint for daily SOC balance (every 96 time slots)
+    def daily_soc_balance_rule(model, t):
+        # Only apply at the end of each day (96 time slots)
+        if (t + 1) % 96 != 0:
+            return Constraint.Skip
+
+        # Find the beginning of this day
+        day_start = t - 95
+
+        # SOC at end of day should equal SOC at beginning of that same day
+        return model.soc[t] == model.soc[day_start]
+
+    model_renewable.daily_soc_balance = Constraint(model_renewable.T, rule=daily_soc_balance_rule)
+
+    # Battery capacity constraints
+    def soc_max_rule(model, t):
+        return model.soc[t] <= model.battery_capacity
+
+    model_renewable.soc_max = Constraint(model_renewable.T, rule=soc_max_rule)
+
+    def cap_max_rule(model):
+        return model.battery_capacity <= max_size_batt_mwh
+
+    model_renewable.cap_max = Constraint(rule=cap_max_rule)
+
+    def soc_min_rule(model, t):
+        return model.soc[t] >= 0.1 * model.battery_capacity  # 10% minimum SOC
+
+    model_renewable.soc_min = Constraint(model_renewable.T, rule=soc_min_rule)
+
+    # Battery charge/discharge rate constraints
+    def charge_rate_rule(model, t):
+        return model.charge[t] <= model.max_charge_rate
+
+    model_renewable.charge_rate = Constraint(model_renewable.T, rule=charge_rate_rule)
+
+    def discharge_rate_rule(model, t):
+        return model.discharge[t] <= model.max_charge_rate
+
+    model_renewable.discharge_rate = Constraint(model_renewable.T, rule=discharge_rate_rule)
+
+    # C-rate constraint (relate power and energy capacity)
+    def c_rate_rule(model):
+        return model.max_charge_rate <= 0.5 * model.battery_capacity  # Max C-rate of 0.5C
+
+    model_renewable.c_rate = Constraint(rule=c_rate_rule)
+
+    def max_rate_ch_rule(model, t):
+        return model.charge[t] <= max_charge_discharge_power_bess  #
+
+    model_renewable.max_rate_ch = Constraint(model_renewable.T, rule=max_rate_ch_rule)
+
+    def max_rate_dish_rule(model, t):
+        return model.discharge[t] <= max_charge_discharge_power_bess  #
+
+    model_renewable.max_rate_dish = Constraint(model_renewable.T, rule=max_rate_dish_rule)
+
+    # A technology without candidate sites has no total to limit
+    def total_solar_min_rule(model):
+        if not solar_sites:
+            return Constraint.Skip
+        total_solar = sum(model.size[s] for s in solar_sites)
+        return total_solar >= model.min_total_solar
+
+    model_renewable.total_solar_min_constraint = Constraint(rule=total_solar_min_rule)
+
+    def total_solar_max_rule(model):
+        if not solar_sites:
+            return Constraint.Skip
+        total_solar = sum(model.size[s] for s in solar_sites)
+        return total_solar <= model.max_total_solar
+
+    model_renewable.total_solar_max_constraint = Constraint(rule=total_solar_max_rule)
+
+    # Constraint rule for total wind capacity
+    def total_wind_min_rule(model):
+        if not wind_sites:
+            return Constraint.Skip
+        total_wind = sum(model.size[s] for s in wind_sites)
+        return total_wind >= model.min_total_wind
+
+    model_renewable.total_wind_min_constraint = Constraint(rule=total_wind_min_rule)
+
+    def total_wind_max_rule(model):
+        if not wind_sites:
+            return Constraint.Skip
+        total_wind = sum(model.size[s] for s in wind_sites)
+        return total_wind <= model.max_total_wind
+
+    model_renewable.total_wind_max_constraint = Constraint(rule=total_wind_max_rule)
+
+    def max_gdam_rule(model, t):
+        return model.gdam_purchase[t] <= model.max_gdam
+
+    model_renewable.max_gdam_constraint = Constraint(model_renewable.T, rule=max_gdam_rule)
+
+    # Smallest and largest size of each site (a site without a largest size has no upper limit)
+    def site_min_rule(model, s):
+        return model.size[s] >= model.site_min[s]
+
+    model_renewable.site_min_constraint = Constraint(model_renewable.S, rule=site_min_rule)
+
+    def site_max_rule(model, s):
+        if not np.isfinite(model.site_max[s]):
+            return Constraint.Skip
+        return model.size[s] <= model.site_max[s]
+
+    model_renewable.site_max_constraint = Constraint(model_renewable.S, rule=site_max_rule)
+
+    return model_renewable
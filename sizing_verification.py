@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+PERIOD_HOURS = 0.25
+MIN_SOC = 0.1  # Minimum state of charge of the sizing model, as a fraction of the capacity
+MAX_C_RATE = 0.1  # Charge/discharge limit of the sizing model, as a fraction of the capacity per hour
+
+
+def battery_power(battery_capacity, max_charge_rate, max_power):
+    """Largest charge/discharge (MW) of the sized battery, with the limits of the sizing model."""
+    return min(max_charge_rate, MAX_C_RATE * battery_capacity, max_power)
+
+
+def simulate_battery(net_demand, battery_capacity, power, initial_soc=0.5):
+    """
+    Simulates the sized battery against the net demand of every period: it charges from any surplus and
+    discharges into any deficit, within its power and between the minimum state of charge and full.
+
+    The state of charge is the only sequential part, so the loop over time does a handful of array
+    operations per period and every column (e.g. a scenario) is simulated at once.
+
+    Args:
+        net_demand (np.ndarray): Demand minus RE production (MW) of each period (rows), for one or more
+                                 scenarios (columns).
+        battery_capacity (float): Capacity (MWh).
+        power (float): Charge/discharge limit (MW).
+        initial_soc (float): State of charge at the start, as a fraction of the capacity.
+
+    Returns:
+        tuple: Charge (MW), discharge (MW) and stored energy at the end (MWh) of each period, shaped as
+               net_demand.
+    """
+    net_demand = np.asarray(net_demand, dtype=float)
+    flow = np.clip(-np.nan_to_num(net_demand), -power, power) * PERIOD_HOURS  # Wanted change of the energy
+    soc_min, soc_max = MIN_SOC * battery_capacity, battery_capacity
+    energy = np.empty_like(flow)
+    stored = np.full(flow.shape[1:], initial_soc * battery_capacity)
+    for t in range(len(flow)):
+        stored = np.minimum(np.maximum(stored + flow[t], np.minimum(stored, soc_min)), soc_max)
+        energy[t] = stored
+    change = np.diff(energy, axis=0, prepend=np.full((1,) + flow.shape[1:], initial_soc * battery_capacity))
+    return np.clip(change, 0, None) / PERIOD_HOURS, np.clip(-change, 0, None) / PERIOD_HOURS, energy
+
+
+def settle(net_demand, charge, discharge, gdam_price, params):
+    """
+    What is left after the battery: GDAM purchases (up to max_gdam_purchase, where cheaper than the deficit
+    penalty), the deficit and the curtailed surplus of each period. gdam_price must broadcast against
+    net_demand (e.g. shaped (periods, 1) for several scenarios).
+
+    Returns:
+        tuple: GDAM purchase, deficit and curtailment (MW), shaped as net_demand.
+    """
+    residual = net_demand + charge - discharge
+    shortfall = np.clip(residual, 0, None)
+    gdam_allowed = np.where(np.asarray(gdam_price, dtype=float) < params['penalty_sizing_unmet_demand'],
+                            params['max_gdam_purchase'], 0.0)
+    gdam_purchase = np.minimum(shortfall, gdam_allowed)
+    return gdam_purchase, shortfall - gdam_purchase, np.clip(-residual, 0, None)
+
+
+def verify_sizing(result_sizing, demand, production, gdam_price, params):
+    """
+    Runs the sized system over the full-resolution year: the RE capacities applied to the normalized
+    15-min production, the battery simulated period by period, then GDAM purchases (up to
+    max_gdam_purchase, where cheaper than the deficit penalty) and the deficit left.
+
+    The sizing model only sees a typical day per month, so this shows how the chosen sizes hold up against
+    the real variability of the year.
+
+    Args:
+        result_sizing (dict): Capacities of the sizing (keyed by site, and the battery).
+        demand (pd.Series): Unserved demand of the shortage case in every period of the year (MW).
+        production (pd.DataFrame): Production of 1 MW of each site (columns) in every period, net of losses.
+        gdam_price (np.ndarray): GDAM price of every period.
+        params (dict): 'max_charge_discharge_power_bess', 'max_gdam_purchase' and
+                       'penalty_sizing_unmet_demand'.
+
+    Returns:
+        pd.DataFrame: The time series of the year (MW, and the stored energy in MWh), on the index of demand.
+    """
+    index, demand = demand.index, demand.values.astype(float)
+    re_generation = sum(np.asarray(production[site], dtype=float) * result_sizing[site] for site in production)
+    capacity = result_sizing['battery_capacity']
+    power = battery_power(capacity, result_sizing['max_charge_rate'], params['max_charge_discharge_power_bess'])
+    net_demand = demand - re_generation
+    charge, discharge, energy = simulate_battery(net_demand[:, None], capacity, power)
+    charge, discharge, energy = charge[:, 0], discharge[:, 0], energy[:, 0]
+
+    gdam_purchase, deficit, curtailment = settle(net_demand, charge, discharge, gdam_price, params)
+    return pd.DataFrame({
+        'Unserved Demand': demand,
+        'RE Production': re_generation,
+        'Battery Charge': charge,
+        'Battery Discharge': discharge,
+        'Battery Energy (MWh)': energy,
+        'GDAM Purchase': gdam_purchase,
+        'Deficit': deficit,
+        'Curtailment': curtailment,
+    }, index=index)
+
+
+def verification_summary(series, result_sizing, sizing_series, gdam_price):
+    """
+    Annual KPIs of the full-year simulation next to those the sizing model expects from its typical days
+    (each month's typical day counted once per day of the month).
+
+    Args:
+        series (pd.DataFrame): Result of verify_sizing.
+        result_sizing (dict): Capacities of the sizing.
+        sizing_series (pd.DataFrame): Time series of the sizing solution (SERIES_VARIABLES over 12 x 96 periods).
+        gdam_price (np.ndarray): GDAM price of every period of the year.
+
+    Returns:
+        tuple: The summary (one row per KPI, 'sizing model' and 'full year' columns) and the monthly totals.
+    """
+    capacity = result_sizing['battery_capacity']
+    year = series.index.year[0]
+    days = pd.Series(pd.date_range(f"{year}-01-01", f"{year}-12-31", freq='D').month).value_counts().sort_index()
+    day_weights = np.repeat(days.values, 96)
+    # The sizing model has no curtailment or RE series of its own; only what it solves for is compared
+    model = {
+        'deficit_mwh': (sizing_series['deficit'].values * day_weights).sum() * PERIOD_HOURS,
+        'gdam_purchase_mwh': (sizing_series['gdam_purchase'].values * day_weights).sum() * PERIOD_HOURS,
+        'battery_discharge_mwh': (sizing_series['discharge'].values * day_weights).sum() * PERIOD_HOURS,
+    }
+    model['battery_cycles'] = model['battery_discharge_mwh'] / capacity if capacity > 0 else 0.0
+    mwh = series.drop(columns=['Battery Energy (MWh)']).sum() * PERIOD_HOURS
+    full_year = {
+        'deficit_mwh': mwh['Deficit'],
+        'gdam_purchase_mwh': mwh['GDAM Purchase'],
+        'battery_discharge_mwh': mwh['Battery Discharge'],
+        'battery_cycles': mwh['Battery Discharge'] / capacity if capacity > 0 else 0.0,
+        'curtailment_mwh': mwh['Curtailment'],
+        'curtailment_share': mwh['Curtailment'] / mwh['RE Production'] if mwh['RE Production'] > 0 else 0.0,
+        'deficit_peak_mw': series['Deficit'].max(),
+        'deficit_periods': float((series['Deficit'] > 1e-6).sum()),
+        'gdam_cost': (series['GDAM Purchase'].values * gdam_price).sum() * PERIOD_HOURS,
+        'battery_energy_min_mwh': series['Battery Energy (MWh)'].min(),
+    }
+    summary = pd.DataFrame({'sizing model': pd.Series(model), 'full year': pd.Series(full_year)}).loc[list(full_year)]
+    summary.index.name = 'KPI'
+
+    monthly = series.drop(columns=['Battery Energy (MWh)']).groupby(series.index.month).sum() * PERIOD_HOURS
+    monthly = monthly.add_suffix(' (MWh)')
+    monthly['Battery Cycles'] = monthly['Battery Discharge (MWh)'] / capacity if capacity > 0 else 0.0
+    monthly.index.name = 'month'
+    return summary, monthly
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+
+def var_array(component):
+    """
+    Returns the values of a 1-D indexed Pyomo Var or Param as a float array in index order.
+
+    All values are read in a single pass over the component data. Unset values become NaN.
+    """
+    return np.array([v.value if hasattr(v, 'value') else v for v in component.values()], dtype=float)
+
+
+def var_matrix(component, first_set, second_set):
+    """
+    Returns the values of a Var indexed by two sets as an array of shape (len(first_set), len(second_set)).
+
+    Pyomo stores a dense two-set component in the order of the set product, so the values can be read
+    in one pass and reshaped instead of being looked up cell by cell.
+    """
+    shape = (len(first_set), len(second_set))
+    if len(component) != shape[0] * shape[1]:
+        raise ValueError(f"{component.name} is not dense over {first_set.name} x {second_set.name}.")
+    first_key = next(iter(component.keys()))
+    if first_key != (first_set.first(), second_set.first()):
+        raise ValueError(f"{component.name} is not ordered as {first_set.name} x {second_set.name}.")
+    return var_array(component).reshape(shape)
+
+
+def series_frame(columns, index):
+    """
+    Builds a float DataFrame from indexed Pyomo components in one pass per component.
+
+    Args:
+        columns (dict): Mapping of column name to a 1-D indexed Var or Param.
+        index: Index of the resulting DataFrame (must match the component lengths).
+    """
+    return pd.DataFrame({name: var_array(component) for name, component in columns.items()}, index=index)
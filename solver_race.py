@@ -0,0 +1,378 @@
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+
+from pyomo.environ import Objective, Var, value
+
+# Solver configurations that can take part in a race. HiGHS variants run in-process through highspy
+# on the exported MPS file, CBC and GLPK run through their command-line executables if installed.
+RACE_CONFIGS = {
+    'highs_choose': {'solver': 'highs', 'options': {'solver': 'choose'}},
+    'highs_simplex': {'solver': 'highs', 'options': {'solver': 'simplex'}},
+    'highs_ipm': {'solver': 'highs', 'options': {'solver': 'ipm'}},
+    'highs_no_presolve': {'solver': 'highs', 'options': {'presolve': 'off'}},
+    'cbc': {'solver': 'cbc', 'options': {}},
+    'glpk': {'solver': 'glpk', 'options': {}},
+}
+
+RACE_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver_race_stats.json')
+
+
+def config_available(config_name):
+    """Returns True if the solver behind a race configuration can be used on this machine."""
+    solver = RACE_CONFIGS[config_name]['solver']
+    if solver == 'highs':
+        try:
+            import highspy  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    if solver == 'cbc':
+        return shutil.which('cbc') is not None
+    if solver == 'glpk':
+        return shutil.which('glpsol') is not None
+    return False
+
+
+def _mps_column_names(mps_path):
+    """Reads the column names of a free MPS file in the order the solvers number them."""
+    names = []
+    in_columns = False
+    with open(mps_path) as f:
+        for line in f:
+            if not line.startswith(' '):
+                in_columns = line.startswith('COLUMNS')
+                continue
+            if in_columns:
+                tokens = line.split()
+                if len(tokens) > 1 and tokens[1] == "'MARKER'":
+                    continue
+                if not names or names[-1] != tokens[0]:
+                    names.append(tokens[0])
+    return names
+
+
+def _solve_highs(options, mps_path, time_limit, mip_gap):
+    import highspy
+
+    h = highspy.Highs()
+    h.setOptionValue('output_flag', False)
+    h.readModel(mps_path)
+    for key, val in options.items():
+        h.setOptionValue(key, val)
+    if time_limit:
+        h.setOptionValue('time_limit', float(time_limit))
+    if mip_gap is not None:
+        h.setOptionValue('mip_rel_gap', float(mip_gap))
+    h.run()
+
+    model_status = h.getModelStatus()
+    info = h.getInfo()
+    has_solution = info.primal_solution_status == 2  # kSolutionStatusFeasible
+    result = {
+        'termination': h.modelStatusToString(model_status),
+        'optimal': model_status == highspy.HighsModelStatus.kOptimal,
+        'has_solution': has_solution,
+        'objective': info.objective_function_value if has_solution else None,
+        'bound': None,
+        'gap': None,
+        'values': {},
+    }
+    if h.getLp().integrality_:
+        result['bound'] = info.mip_dual_bound
+        result['gap'] = info.mip_gap
+    elif result['optimal']:
+        result['bound'] = result['objective']
+        result['gap'] = 0.0
+    if has_solution:
+        result['values'] = dict(zip(h.getLp().col_names_, h.getSolution().col_value))
+    return result
+
+
+def _solve_cbc(lp_path, work_dir, time_limit, mip_gap):
+    solution_path = os.path.join(work_dir, 'cbc.sol')
+    command = ['cbc', lp_path]
+    if time_limit:
+        command += ['-sec', str(float(time_limit))]
+    if mip_gap is not None:
+        command += ['-ratioGap', str(float(mip_gap))]
+    command += ['-solve', '-solu', solution_path]
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+    result = {'termination': 'error', 'optimal': False, 'has_solution': False, 'objective': None,
+              'bound': None, 'gap': None, 'values': {}}
+    if not os.path.exists(solution_path):
+        return result
+    with open(solution_path) as f:
+        header = f.readline().strip()
+        result['termination'] = header.split(' - ')[0]
+        result['optimal'] = header.startswith('Optimal')
+        result['has_solution'] = result['optimal'] or (header.startswith('Stopped')
+                                                       and 'no integer solution' not in header)
+        if result['optimal']:
+            result['gap'] = 0.0
+        for line in f:
+            tokens = line.replace('**', '').split()
+            if len(tokens) >= 3:
+                result['values'][tokens[1]] = float(tokens[2])
+    if result['has_solution'] and 'objective value' in header:
+        result['objective'] = float(header.rsplit('objective value', 1)[1])
+    return result
+
+
+def _solve_glpk(mps_path, work_dir, time_limit, mip_gap):
+    solution_path = os.path.join(work_dir, 'glpk.sol')
+    command = ['glpsol', '--freemps', mps_path, '--write', solution_path]
+    if time_limit:
+        command += ['--tmlim', str(max(int(time_limit), 1))]
+    if mip_gap is not None:
+        command += ['--mipgap', str(float(mip_gap))]
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+    result = {'termination': 'error', 'optimal': False, 'has_solution': False, 'objective': None,
+              'bound': None, 'gap': None, 'values': {}}
+    if not os.path.exists(solution_path):
+        return result
+
+    # GLPK writes its raw solution format with columns numbered in MPS order
+    column_names = _mps_column_names(mps_path)
+    is_mip = False
+    with open(solution_path) as f:
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == 's':
+                is_mip = tokens[1] == 'mip'
+                if is_mip:
+                    status = tokens[4]
+                    result['optimal'] = status == 'o'
+                    result['has_solution'] = status in ('o', 'f')
+                else:
+                    primal_status, dual_status = tokens[4], tokens[5]
+                    result['optimal'] = primal_status == 'f' and dual_status == 'f'
+                    result['has_solution'] = primal_status == 'f'
+                result['termination'] = 'optimal' if result['optimal'] else 'stopped'
+                result['objective'] = float(tokens[-1])
+            elif tokens[0] == 'j':
+                column_value = tokens[2] if is_mip else tokens[3]
+                result['values'][column_names[int(tokens[1]) - 1]] = float(column_value)
+    if result['optimal']:
+        result['gap'] = 0.0
+    return result
+
+
+def _race_worker(config_name, model_files, time_limit, mip_gap, result_queue):
+    # Own process group so that CLI solvers started from here are killed together with the worker
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    start = time.perf_counter()
+    config = RACE_CONFIGS[config_name]
+    try:
+        if config['solver'] == 'highs':
+            result = _solve_highs(config['options'], model_files['mps'], time_limit, mip_gap)
+        elif config['solver'] == 'cbc':
+            result = _solve_cbc(model_files['lp'], model_files['work_dir'], time_limit, mip_gap)
+        else:
+            result = _solve_glpk(model_files['mps'], model_files['work_dir'], time_limit, mip_gap)
+    except Exception as e:
+        result = {'termination': f"error: {type(e).__name__}: {e}", 'optimal': False, 'has_solution': False,
+                  'objective': None, 'bound': None, 'gap': None, 'values': {}}
+    result['config'] = config_name
+    result['solve_time_s'] = time.perf_counter() - start
+    result_queue.put(result)
+
+
+def _kill(process):
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if process.is_alive():
+        process.terminate()
+    process.join(timeout=5)
+
+
+@contextlib.contextmanager
+def _stats_lock(stats_file, timeout=10.0, stale_after=60.0):
+    """
+    Exclusive lock on the win statistics across processes, held as a lock file next to them. A lock file left
+    behind by a process that died is taken over once it is older than stale_after seconds.
+    """
+    lock_path = f"{stats_file}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue  # Released in the meantime
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"race statistics locked by another process ({lock_path})")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(lock_fd)
+        os.remove(lock_path)
+
+
+def record_race_result(model_name, participants, winner, solve_time, stats_file=RACE_STATS_FILE):
+    """
+    Adds the outcome of one race to the per-model win statistics. Concurrent runs update them one at a time,
+    and the file is replaced in one step, so readers never see a partly written one.
+    """
+    try:
+        with _stats_lock(stats_file):
+            stats = load_race_stats(stats_file)
+            model_stats = stats.setdefault(model_name, {})
+            for config_name in participants:
+                entry = model_stats.setdefault(config_name, {'races': 0, 'wins': 0, 'win_time_s_total': 0.0})
+                entry['races'] += 1
+                if config_name == winner:
+                    entry['wins'] += 1
+                    entry['win_time_s_total'] += solve_time
+            tmp_path = f"{stats_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f, indent=2)
+            os.replace(tmp_path, stats_file)
+    except TimeoutError as e:
+        logging.warning(f"*** Race result not recorded: {e} *** \n")
+
+
+def load_race_stats(stats_file=RACE_STATS_FILE):
+    if not os.path.exists(stats_file):
+        return {}
+    try:
+        with open(stats_file) as f:
+            return json.load(f)
+    except ValueError:
+        logging.warning(f"*** Race statistics in {stats_file} are unreadable; starting them over *** \n")
+        return {}
+
+
+def preferred_config(model_name, stats_file=RACE_STATS_FILE):
+    """Returns the configuration with the highest win rate for a model type, or None without history."""
+    model_stats = load_race_stats(stats_file).get(model_name)
+    if not model_stats:
+        return None
+    return max(model_stats, key=lambda name: (model_stats[name]['wins'] / max(model_stats[name]['races'], 1),
+                                              model_stats[name]['wins']))
+
+
+def race_solve(model, model_name, config_names, time_limit=0, mip_gap=None, stats_file=RACE_STATS_FILE):
+    """
+    Solves a Pyomo model by racing several solver configurations in parallel processes.
+
+    The model is exported once (MPS, plus LP for CBC) and every configuration solves that file in its
+    own process. The first proven-optimal result wins and the remaining processes are killed. If no
+    configuration proves optimality within the time budget, the best feasible result is used. The
+    winning values are loaded back into the model and the win is recorded per model type.
+
+    Args:
+        model (ConcreteModel): The (minimization) model to solve.
+        model_name (str): Model type used for the win statistics (e.g. 'thermal', 'sizing').
+        config_names (list): Names from RACE_CONFIGS. Unavailable solvers are skipped.
+        time_limit (float): Wall-clock budget in seconds for each racer. 0 or None means no limit.
+        mip_gap (float): Relative MIP gap passed to each racer.
+        stats_file (str): JSON file holding the per-model win statistics.
+
+    Returns:
+        dict: Solve status in the same format as solver_utils.solve_with_budget, plus 'solver'.
+    """
+    participants = [name for name in config_names if name in RACE_CONFIGS and config_available(name)]
+    skipped = [name for name in config_names if name not in participants]
+    if skipped:
+        logging.info(f"Skipping unavailable race configurations: {skipped}")
+    if not participants:
+        raise ValueError(f"None of the race configurations {config_names} is available.")
+
+    logging.info(f"Racing {model_name} model with configurations: {participants}")
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir:
+        mps_path, mps_smap_id = model.write(os.path.join(work_dir, 'model.mps'), format='mps',
+                                            io_options={'symbolic_solver_labels': False})
+        symbol_maps = {'mps': model.solutions.symbol_map[mps_smap_id]}
+        model_files = {'mps': mps_path, 'work_dir': work_dir}
+        if any(RACE_CONFIGS[name]['solver'] == 'cbc' for name in participants):
+            lp_path, lp_smap_id = model.write(os.path.join(work_dir, 'model.lp'), format='lp',
+                                              io_options={'symbolic_solver_labels': False})
+            symbol_maps['lp'] = model.solutions.symbol_map[lp_smap_id]
+            model_files['lp'] = lp_path
+
+        result_queue = multiprocessing.Queue()
+        processes = {}
+        for name in participants:
+            process = multiprocessing.Process(target=_race_worker,
+                                              args=(name, model_files, time_limit, mip_gap, result_queue))
+            process.start()
+            processes[name] = process
+
+        # Give every racer a short grace period on top of its own time limit to report back
+        deadline = start + time_limit + 30 if time_limit else None
+        finished = []
+        winner = None
+        while len(finished) < len(processes):
+            try:
+                result = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                if deadline and time.perf_counter() > deadline:
+                    break
+                if not any(p.is_alive() for p in processes.values()) and result_queue.empty():
+                    break
+                continue
+            finished.append(result)
+            logging.info(f"  {result['config']}: {result['termination']} in {result['solve_time_s']:.1f} s")
+            if result['optimal']:
+                winner = result
+                break
+
+        for name, process in processes.items():
+            _kill(process)
+
+        if winner is None:
+            feasible = [r for r in finished if r['has_solution'] and r['objective'] is not None]
+            winner = min(feasible, key=lambda r: r['objective']) if feasible else None
+
+        status = {'model': model_name, 'termination': 'no solution', 'has_solution': False, 'optimal': False,
+                  'objective': None, 'bound': None, 'gap': None,
+                  'solve_time_s': time.perf_counter() - start, 'solver': None}
+        if winner is None:
+            logging.error(f"*** No race configuration found a solution for the {model_name} model *** \n")
+            return status
+
+        # CBC only reports non-zero columns, so every variable starts from zero
+        symbol_map = symbol_maps['lp' if RACE_CONFIGS[winner['config']]['solver'] == 'cbc' else 'mps']
+        variables = {symbol: obj for symbol, obj in symbol_map.bySymbol.items()
+                     if obj is not None and obj.ctype is Var and not obj.fixed}
+        for symbol, var in variables.items():
+            var.set_value(winner['values'].get(symbol, 0), skip_validation=True)
+
+    objective = next(model.component_data_objects(Objective, active=True))
+    status.update({
+        'termination': winner['termination'],
+        'has_solution': True,
+        'optimal': winner['optimal'],
+        'objective': value(objective),
+        'bound': winner['bound'],
+        'gap': winner['gap'],
+        'solver': winner['config'],
+    })
+    record_race_result(model_name, participants, winner['config'], winner['solve_time_s'], stats_file)
+    logging.info(f"*** {winner['config']} won the {model_name} race in {winner['solve_time_s']:.1f} s; "
+                 f"current leader for this model type: {preferred_config(model_name, stats_file)} *** \n")
+    return status
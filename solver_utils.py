@@ -0,0 +1,86 @@
+import logging
+import time
+
+from pyomo.environ import Objective, value
+from pyomo.opt import TerminationCondition
+
+
+def solve_with_budget(solver, model, model_name, time_limit=0, mip_gap=None, tee=True,
+                      no_solution_level=logging.ERROR):
+    """
+    Solves a Pyomo model with a wall-clock and relative MIP gap budget.
+
+    If the solver stops on a limit but has found a feasible incumbent, that incumbent
+    is loaded into the model so the caller can still write results, and the returned
+    status marks the solution as sub-optimal together with its gap.
+
+    Args:
+        solver: A Pyomo solver created with SolverFactory (e.g. 'highs').
+        model (ConcreteModel): The model to solve.
+        model_name (str): Label used in the log and the status report (e.g. 'sizing').
+        time_limit (float): Wall-clock budget in seconds. 0 or None means no limit.
+        mip_gap (float): Relative MIP gap at which the solver may stop. None keeps the solver default.
+        tee (bool): Stream the solver log to stdout.
+        no_solution_level (int): Logging level of the message when there is no solution, lowered where an
+                                 infeasible model is expected (e.g. Benders feasibility checks).
+
+    Returns:
+        dict: Solve status with keys 'model', 'termination', 'has_solution', 'optimal',
+              'objective', 'bound', 'gap', 'solve_time_s' and 'solver'.
+    """
+    options = {}
+    if mip_gap is not None:
+        options['mip_rel_gap'] = float(mip_gap)
+
+    solve_kwargs = {'tee': tee, 'load_solutions': False, 'options': options}
+    if time_limit:
+        solve_kwargs['timelimit'] = float(time_limit)
+
+    logging.info(f"Solving {model_name} model (time limit: {time_limit or 'none'} s, MIP gap: {mip_gap})")
+    start = time.perf_counter()
+    results = solver.solve(model, **solve_kwargs)
+    solve_time = time.perf_counter() - start
+
+    termination = results.solver.termination_condition
+    has_solution = len(results.solution) > 0 and termination not in (TerminationCondition.infeasible,
+                                                                     TerminationCondition.infeasibleOrUnbounded,
+                                                                     TerminationCondition.unbounded)
+    status = {
+        'model': model_name,
+        'termination': str(termination),
+        'has_solution': has_solution,
+        'optimal': termination == TerminationCondition.optimal,
+        'objective': None,
+        'bound': None,
+        'gap': None,
+        'solve_time_s': solve_time,
+        'solver': solver.name,
+    }
+
+    if not has_solution:
+        logging.log(no_solution_level, f"*** {model_name} model returned no solution ({termination}) *** \n")
+        return status
+
+    model.solutions.load_from(results)
+
+    objective = next(model.component_data_objects(Objective, active=True))
+    incumbent = value(objective)
+    bound = results.problem.lower_bound if objective.is_minimizing() else results.problem.upper_bound
+    status['objective'] = incumbent
+    try:
+        bound = float(bound)
+    except (TypeError, ValueError):
+        bound = float('nan')
+    if bound == bound:  # The solver reports NaN when no bound is available
+        status['bound'] = bound
+        status['gap'] = abs(incumbent - bound) / max(abs(incumbent), 1e-10)
+    elif status['optimal']:
+        status['gap'] = 0.0
+
+    if status['optimal']:
+        logging.info(f"*** {model_name} model solved to optimality in {solve_time:.1f} s *** \n")
+    else:
+        gap_text = f"{status['gap']:.2%}" if status['gap'] is not None else 'unknown'
+        logging.warning(f"*** {model_name} model stopped early ({termination}) after {solve_time:.1f} s; "
+                        f"using best incumbent with gap {gap_text} *** \n")
+    return status
@@ -0,0 +1,181 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+
+_code_fingerprint = None
+
+
+def code_fingerprint():
+    """Hash of the pipeline's source files, so checkpoints written by other code are never reused."""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        digest = hashlib.sha256()
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(package_dir, '*.py'))):
+            if os.path.basename(path) != 'app.py':
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        _code_fingerprint = digest.hexdigest()
+    return _code_fingerprint
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def declared_files(stage, params):
+    """Input files (keys of paths) a stage reads with these parameters; 'files' may depend on the parameters."""
+    files = stage.get('files', [])
+    return files(params) if callable(files) else files
+
+
+def missing_files(stages, params, paths, targets=None):
+    """
+    Input files that the stages needed for targets would read but that do not exist. Files of stages that
+    are not needed (e.g. the thermal stage when it is switched off) are not checked.
+
+    Returns:
+        list: The missing paths, in pipeline order.
+    """
+    names = required_stages(stages, targets) if targets is not None else [stage['name'] for stage in stages]
+    missing = []
+    for stage in stages:
+        if stage['name'] in names:
+            for key in declared_files(stage, params):
+                missing += [path for path in paths.get(key, []) if not os.path.exists(path) and path not in missing]
+    return missing
+
+
+def stage_key(stage, params, paths, input_keys):
+    """
+    Hash of everything a stage's output depends on: its declared parameters, the version of its input
+    files, the keys of the stages it reads and the pipeline code.
+    """
+    content = {
+        'stage': stage['name'],
+        'code': code_fingerprint(),
+        'params': {name: params.get(name) for name in stage.get('params', [])},
+        'files': {name: [_file_stamp(path) for path in paths.get(name, [])]
+                  for name in declared_files(stage, params)},
+        'inputs': input_keys,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def required_stages(stages, targets):
+    """Names of the target stages and everything upstream of them, in pipeline order."""
+    by_name = {stage['name']: stage for stage in stages}
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(by_name[name].get('inputs', []))
+    return [stage['name'] for stage in stages if stage['name'] in needed]
+
+
+def stage_keys(stages, params, paths, targets=None):
+    """Keys of the stages needed for targets (all stages if None), computed without running any stage."""
+    by_name = {stage['name']: stage for stage in stages}
+    names = required_stages(stages, targets) if targets is not None else [stage['name'] for stage in stages]
+    keys = {}
+    for name in names:
+        keys[name] = stage_key(by_name[name], params, paths, [keys[i] for i in by_name[name].get('inputs', [])])
+    return keys
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path, 'rb') as f:
+            return True, pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return False, None
+
+
+def _save_checkpoint(checkpoint_dir, name, key, output, keep):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = os.path.join(checkpoint_dir, f"{name}-{key[:20]}.pkl")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)  # Concurrent runs never see a half-written checkpoint
+    # Keep the newest few checkpoints of each stage so switching back to recent settings is still fast
+    older = sorted(glob.glob(os.path.join(checkpoint_dir, f"{name}-*.pkl")), key=os.path.getmtime, reverse=True)
+    for stale in older[keep:]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def run_stages(stages, params, paths, targets=None, checkpoint_dir=None, keep=3, provided=None, timings=None):
+    """
+    Runs a pipeline of stages, reusing the checkpointed output of every stage whose inputs did not change.
+
+    Each stage is a dict with 'name', 'function', and the 'params', 'files' (keys of paths, or a function of
+    the parameters returning them) and 'inputs' (names of earlier stages) it depends on. An optional
+    'checkpoint_if' decides from the output whether it is worth keeping (e.g. not when a solver failed). The
+    function is called as function(params, paths, **inputs) with only the declared parameters and files, so
+    an undeclared dependency fails loudly instead of silently reusing a stale checkpoint. Because a stage's
+    key includes the keys of its inputs, a changed parameter recomputes its stage and everything downstream
+    of it, and nothing else.
+
+    Args:
+        stages (list): The stages in an order where every stage comes after its inputs.
+        params (dict): Configuration parameters as returned by read_config.
+        paths (dict): Resolved input files keyed by parameter name, each a list of paths.
+        targets (list): Stages whose outputs are needed. None runs all stages.
+        checkpoint_dir (str): Folder of the checkpoints. None disables checkpointing.
+        keep (int): Number of checkpoints kept per stage.
+        provided (dict): (key, output) of stages computed elsewhere (e.g. shared by a parent process), used
+                         instead of running a stage when its key matches.
+        timings (dict): Filled with (seconds, source) of each stage, the source being 'computed', 'checkpoint'
+                        or 'shared'.
+
+    Returns:
+        dict: Output of each stage that was run or reused, keyed by stage name.
+    """
+    by_name = {stage['name']: stage for stage in stages}
+    keys = stage_keys(stages, params, paths, targets)
+    provided = provided or {}
+    timings = {} if timings is None else timings
+    outputs = {}
+    for name in keys:
+        stage = by_name[name]
+        input_names = stage.get('inputs', [])
+        start = time.perf_counter()
+        if name in provided and provided[name][0] == keys[name]:
+            outputs[name] = provided[name][1]
+            timings[name] = (time.perf_counter() - start, 'shared')
+            logging.info(f"*** Stage '{name}': inputs unchanged, using the shared output *** \n")
+            continue
+        checkpoint = os.path.join(checkpoint_dir, f"{name}-{keys[name][:20]}.pkl") if checkpoint_dir else None
+        if checkpoint and os.path.exists(checkpoint):
+            loaded, output = _load_checkpoint(checkpoint)
+            if loaded:
+                outputs[name] = output
+                timings[name] = (time.perf_counter() - start, 'checkpoint')
+                try:
+                    os.utime(checkpoint)  # Mark as recently used for the retention
+                except OSError:
+                    pass
+                logging.info(f"*** Stage '{name}': inputs unchanged, reused checkpoint *** \n")
+                continue
+
+        stage_params = {k: params[k] for k in stage.get('params', []) if k in params}
+        stage_paths = {k: paths[k] for k in declared_files(stage, params) if k in paths}
+        outputs[name] = stage['function'](stage_params, stage_paths, **{i: outputs[i] for i in input_names})
+        timings[name] = (time.perf_counter() - start, 'computed')
+        logging.info(f"*** Stage '{name}' computed in {timings[name][0]:.1f} s *** \n")
+        if checkpoint and stage.get('checkpoint_if', lambda output: True)(outputs[name]):
+            _save_checkpoint(checkpoint_dir, name, keys[name], outputs[name], keep)
+    return outputs
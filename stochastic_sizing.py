@@ -0,0 +1,457 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import (ConcreteModel, Constraint, ConstraintList, NonNegativeReals, Objective, Param, Set,
+                           SolverFactory, Suffix, Var, value)
+
+from re_profiles import load_wind_yearly, monthly_time_slot_average, shortage_sizing_profile, wind_sizing_profiles
+from shared_inputs import SharedInputs, with_shared_inputs
+from site_registry import site_production
+from sizing_model import SERIES_VARIABLES, build_sizing_model, capacity_names, capacity_var
+from solution_extraction import var_array
+from solver_utils import solve_with_budget
+
+# Scenarios up to which the 'auto' method solves the extensive form (all scenarios in one LP) instead of Benders
+EXTENSIVE_FORM_MAX_SCENARIOS = 8
+
+# Trust region of the Benders master, as a fraction of the range of each capacity: its starting size, and the
+# smallest it shrinks to after steps that do not improve the expected cost
+INITIAL_TRUST_RADIUS = 0.25
+MIN_TRUST_RADIUS = 1e-3
+
+# Scenario subproblems built in this worker process, kept between Benders iterations so each
+# scenario is only built once. Cleared whenever a new run starts.
+_scenario_models = {}
+_scenario_models_run = None
+
+
+def build_scenarios(params, sites, wind_files, shortage_files, base_profiles, gdam_price, index):
+    """
+    Builds the weather/shortage scenarios of the stochastic sizing: one per wind year and shortage case.
+
+    The sites whose profile is one of the state wind profiles take it from each wind year, scaled to the CEA
+    monthly CUFs exactly as in the main run. The other sites (solar, of which only one year is available, and
+    sites with their own profile file) keep their profile in all scenarios.
+
+    Args:
+        params (dict): Configuration parameters as returned by read_config.
+        sites (pd.DataFrame): Candidate sites of the sizing (see site_registry).
+        wind_files (list): Paths of the wind workbooks ('Yearly data' sheet), one per weather year.
+        shortage_files (dict): Path of the unserved demand workbook, keyed by shortage case (e.g. 'case1').
+        base_profiles (dict): Normalized sizing profiles of the main run, keyed by site.
+        gdam_price: GDAM price in each of the 1152 sizing periods.
+        index (pd.DatetimeIndex): Timeline of the run (df_all.index).
+
+    Returns:
+        list: Scenarios as dictionaries with 'name', 'probability', 'demand', 'gdam_price' and 'profiles'.
+    """
+    wind_profiles = {}
+    for wind_file in wind_files:
+        logging.info(f"*** Building wind scenario from {os.path.basename(wind_file)} *** \n")
+        df_wind_long = load_wind_yearly(wind_file, params['wind_size_excel_sri'], params['wind_size_actual_sri'])
+        wind = site_production(sites, wind_sizing_profiles(df_wind_long, params['wind_size_actual_sri'], index))
+        averages = monthly_time_slot_average(wind)
+        wind_profiles[wind_file] = {site: averages[site].values for site in averages.columns}
+
+    demands = {case: shortage_sizing_profile(path) for case, path in shortage_files.items()}
+
+    scenarios = []
+    for wind_file, wind in wind_profiles.items():
+        for case, demand in demands.items():
+            profiles = {site: np.asarray(base_profiles[site], dtype=float) for site in sites.index}
+            profiles.update(wind)
+            scenarios.append({
+                'name': scenario_name(wind_file, case),
+                'probability': 1 / (len(wind_profiles) * len(demands)),
+                'demand': demand,
+                'gdam_price': np.asarray(gdam_price, dtype=float),
+                'profiles': profiles,
+            })
+    return scenarios
+
+
+def scenario_name(wind_file, shortage_case):
+    return f"{os.path.splitext(os.path.basename(wind_file))[0]} / {shortage_case}"
+
+
+def _scenario_model(run_id, scenario, sites, params):
+    """Returns the cached subproblem of a scenario, building it on first use in this process."""
+    global _scenario_models_run
+    if _scenario_models_run != run_id:
+        _scenario_models.clear()
+        _scenario_models_run = run_id
+    model = _scenario_models.get(scenario['name'])
+    if model is not None:
+        return model
+
+    model = build_sizing_model(scenario['demand'], scenario['gdam_price'], sites, scenario['profiles'], params)
+    # The capacities are set by the master problem; the duals of these constraints give the Benders cuts
+    model.capacity_names = Set(initialize=capacity_names(sites))
+    model.capacity_target = Param(model.capacity_names, initialize=0, mutable=True)
+    model.fix_capacity = Constraint(model.capacity_names,
+                                    rule=lambda m, name: capacity_var(m, name) == m.capacity_target[name])
+    model.dual = Suffix(direction=Suffix.IMPORT)
+
+    # Without oversized RE the energy balance is an equality, so too much capacity makes the scenario
+    # infeasible. Spill is only freed to measure that infeasibility for a feasibility cut.
+    if not params['allow_oversized_re']:
+        model.spill = Var(model.T, bounds=(0, 0))
+        for t in model.T:
+            supply, demand = model.energy_balance[t].expr.args
+            model.energy_balance[t].set_value(supply - model.spill[t] == demand)
+        model.infeasibility = Objective(expr=sum(model.spill[t] for t in model.T))
+        model.infeasibility.deactivate()
+
+    _scenario_models[scenario['name']] = model
+    return model
+
+
+def _size_scenario(model, name, task):
+    """
+    Sizes a scenario on its own (capacities free). Its cost is a lower bound on the cost of the scenario at any
+    shared capacities, and its capacities a starting point for them.
+    """
+    model.fix_capacity.deactivate()
+    try:
+        status = solve_with_budget(SolverFactory('highs'), model, f"sizing [{name}] own sizing",
+                                   time_limit=task['time_limit'], mip_gap=task['mip_gap'], tee=False)
+    finally:
+        model.fix_capacity.activate()
+    result = {'name': name, 'status': status, 'feasible': status['has_solution']}
+    if status['has_solution']:
+        # A solve stopped early only bounds the cost by its best bound
+        result['lower_bound'] = status['objective'] if status['optimal'] else max(status['bound'] or 0.0, 0.0)
+        result['capacities'] = {name: value(capacity_var(model, name)) for name in model.capacity_names}
+    return result
+
+
+def _solve_scenario(task):
+    """
+    Solves one scenario subproblem at the capacities of the master problem. Runs in a worker process.
+
+    Returns the cost and its subgradient for an optimality cut, or (if the capacities are infeasible for
+    the scenario) the spill and its subgradient for a feasibility cut. With task['series'] the time series
+    of the solution are returned as well. Without capacities the scenario is sized on its own (see
+    _size_scenario). The scenarios, sites and parameters are read from the shared inputs of the task, which
+    only names its scenario.
+    """
+    task = with_shared_inputs(task)
+    scenario, params = task['scenarios'][task['scenario_index']], task['params']
+    model = _scenario_model(task['run_id'], scenario, task['sites'], params)
+    if task['capacities'] is None:
+        return _size_scenario(model, scenario['name'], task)
+    for name in model.capacity_names:
+        model.capacity_target[name] = task['capacities'][name]
+
+    label = f"sizing [{scenario['name']}]"
+    # Capacities infeasible for a scenario are expected without oversized RE: they give a feasibility cut
+    status = solve_with_budget(SolverFactory('highs'), model, label, time_limit=task['time_limit'],
+                               mip_gap=task['mip_gap'], tee=False,
+                               no_solution_level=logging.INFO if hasattr(model, 'spill') else logging.ERROR)
+    result = {'name': scenario['name'], 'status': status, 'feasible': status['has_solution']}
+    if status['has_solution']:
+        result['cost'] = value(model.objective)
+        result['total_deficit'] = var_array(model.deficit).sum()
+        result['subgradient'] = {name: model.dual[model.fix_capacity[name]] for name in model.capacity_names}
+        if task['series']:
+            result['series'] = {name: var_array(getattr(model, name)) for name in SERIES_VARIABLES}
+        return result
+
+    if not hasattr(model, 'spill'):
+        return result
+    # Phase 1: minimize the spill needed to balance the scenario at these capacities
+    model.spill.setub(None)
+    model.objective.deactivate()
+    model.infeasibility.activate()
+    try:
+        phase1 = solve_with_budget(SolverFactory('highs'), model, f"{label} feasibility",
+                                   time_limit=task['time_limit'], tee=False)
+        if phase1['has_solution']:
+            result['infeasibility'] = value(model.infeasibility)
+            result['subgradient'] = {name: model.dual[model.fix_capacity[name]] for name in model.capacity_names}
+    finally:
+        model.infeasibility.deactivate()
+        model.objective.activate()
+        model.spill.setub(0)
+    return result
+
+
+def _first_stage(params, sites):
+    """The shared capacities, within the limits of each site and the totals (as in the sizing model)."""
+    model = ConcreteModel()
+    model.S = Set(initialize=list(sites.index))
+    model.size = Var(model.S, domain=NonNegativeReals,
+                     bounds=lambda m, s: (sites.at[s, 'min_mw'],
+                                          sites.at[s, 'max_mw'] if np.isfinite(sites.at[s, 'max_mw']) else None))
+    model.battery_capacity = Var(domain=NonNegativeReals)
+    model.max_charge_rate = Var(domain=NonNegativeReals)
+
+    for technology in ['solar', 'wind']:
+        technology_sites = sites.index[sites['technology'] == technology]
+        if len(technology_sites):
+            total = sum(model.size[s] for s in technology_sites)
+            setattr(model, f"total_{technology}", Constraint(
+                expr=(params[f"min_total_{technology}"], total, params[f"max_total_{technology}"])))
+    model.cap_max = Constraint(expr=model.battery_capacity <= params['max_size_batt_mwh'])
+    model.c_rate = Constraint(expr=model.max_charge_rate <= 0.5 * model.battery_capacity)
+    return model
+
+
+def _build_master(params, sites, scenarios, theta_bounds):
+    """
+    First-stage problem over the shared capacities, with one cost estimate (theta) per scenario, bounded
+    below by the cost of the scenario sized on its own.
+    """
+    master = _first_stage(params, sites)
+    master.scenarios = Set(initialize=[s['name'] for s in scenarios])
+    master.theta = Var(master.scenarios, bounds=lambda m, s: (theta_bounds[s], None))
+    master.objective = Objective(expr=sum(s['probability'] * master.theta[s['name']] for s in scenarios))
+    master.cuts = ConstraintList()
+    return master
+
+
+def _capacity_ranges(params, sites):
+    """Largest value of each capacity, which scales its trust region."""
+    ranges = {site: min(sites.at[site, 'max_mw'], params[f"max_total_{sites.at[site, 'technology']}"])
+              for site in sites.index}
+    ranges['battery_capacity'] = params['max_size_batt_mwh']
+    ranges['max_charge_rate'] = 0.5 * params['max_size_batt_mwh']
+    return {name: max(float(limit), 1.0) for name, limit in ranges.items()}
+
+
+def _set_trust_region(master, limits, center=None, radius=None, ranges=None):
+    """Restricts the capacities of the master to a box around center, or (without center) lifts the box."""
+    for name, (lower, upper) in limits.items():
+        var = capacity_var(master, name)
+        if center is None:
+            var.setlb(lower)
+            var.setub(upper)
+        else:
+            half_width = radius * ranges[name]
+            var.setlb(max(lower or 0.0, center[name] - half_width))
+            var.setub(center[name] + half_width if upper is None else min(upper, center[name] + half_width))
+
+
+def extensive_form_sizing(scenarios, sites, params, time_limit=0, mip_gap=None):
+    """
+    Sizes solar, wind and battery capacity over several scenarios by solving all scenarios in one model (the
+    extensive form): a copy of the sizing model per scenario, their capacities tied to the shared ones, and
+    the expected cost as the objective. With few scenarios this is one LP of moderate size, solved exactly.
+
+    Args:
+        scenarios (list): Output of build_scenarios.
+        sites (pd.DataFrame): Candidate sites of the sizing (see site_registry).
+        params (dict): Configuration parameters as returned by read_config.
+        time_limit (float): Time budget in seconds of the solve. 0 means no limit.
+        mip_gap (float): Relative MIP gap of the solve.
+
+    Returns:
+        dict: As benders_sizing.
+    """
+    start = time.perf_counter()
+    logging.info(f"*** Extensive form over {len(scenarios)} scenarios *** \n")
+    names = capacity_names(sites)
+    model = _first_stage(params, sites)
+    blocks = []
+    for i, scenario in enumerate(scenarios):
+        block = build_sizing_model(scenario['demand'], scenario['gdam_price'], sites, scenario['profiles'], params)
+        block.objective.deactivate()
+        model.add_component(f"scenario_{i}", block)
+        blocks.append(block)
+    model.link = Constraint(range(len(blocks)), names,
+                            rule=lambda m, i, name: capacity_var(blocks[i], name) == capacity_var(m, name))
+    model.objective = Objective(expr=sum(s['probability'] * block.objective.expr
+                                         for s, block in zip(scenarios, blocks)))
+
+    status = solve_with_budget(SolverFactory('highs'), model, 'sizing extensive form', time_limit=time_limit,
+                               mip_gap=mip_gap, tee=False)
+    status.update({'model': 'sizing', 'termination': f"extensive_{status['termination']}",
+                   'solve_time_s': time.perf_counter() - start})
+    capacities, history, scenario_rows, series = None, [], [], {}
+    if status['has_solution']:
+        capacities = {name: value(capacity_var(model, name)) for name in names}
+        history.append({'iteration': 1, 'lower_bound': status['bound'], 'expected_cost': status['objective'],
+                        'upper_bound': status['objective'], 'gap': status['gap'], 'feasibility_cuts': 0,
+                        **capacities})
+        for scenario, block in zip(scenarios, blocks):
+            scenario_rows.append({'scenario': scenario['name'], 'probability': scenario['probability'],
+                                  'termination': status['termination'], 'cost': value(block.objective.expr),
+                                  'total_deficit': var_array(block.deficit).sum()})
+            series[scenario['name']] = {name: var_array(getattr(block, name)) for name in SERIES_VARIABLES}
+        logging.info(f"*** Stochastic sizing finished ({status['termination']}) in {status['solve_time_s']:.1f} s "
+                     f"*** \n")
+    else:
+        logging.error(f"*** Stochastic sizing found no capacities feasible for all scenarios "
+                      f"({status['termination']}) *** \n")
+    return {
+        'capacities': capacities,
+        'converged': status['optimal'],
+        'status': status,
+        'iterations': pd.DataFrame(history).set_index('iteration') if history else pd.DataFrame(),
+        'scenarios': pd.DataFrame(scenario_rows).set_index('scenario') if scenario_rows else pd.DataFrame(),
+        'series': series,
+    }
+
+
+def benders_sizing(scenarios, sites, params, max_iterations=30, tolerance=1e-3, workers=0, time_limit=0,
+                   mip_gap=None):
+    """
+    Sizes solar, wind and battery capacity over several scenarios with a multi-cut Benders decomposition.
+
+    The capacities are first-stage decisions shared by all scenarios; the battery schedule, GDAM purchase
+    and deficit are decided per scenario. Every scenario is first sized on its own: its cost bounds the
+    cost estimate of the scenario in the master from below, and the expected capacities are the first
+    point evaluated. The master problem then proposes capacities within a trust region around the best
+    capacities so far, which widens after a step that lowers the expected cost and shrinks otherwise, and
+    the scenario subproblems are solved independently in a pool of worker processes and return cuts. The
+    lower bound is the master without the trust region; the decomposition stops once the expected cost of
+    the best capacities is within the tolerance of it. Scenarios are assigned to a fixed worker so each
+    builds its subproblems only once.
+
+    Args:
+        scenarios (list): Output of build_scenarios.
+        sites (pd.DataFrame): Candidate sites of the sizing (see site_registry).
+        params (dict): Configuration parameters as returned by read_config.
+        max_iterations (int): Maximum number of master iterations.
+        tolerance (float): Relative gap between the expected cost and the lower bound at which to stop.
+        workers (int): Number of worker processes. 0 uses one per CPU core.
+        time_limit (float): Time budget in seconds of each subproblem solve. 0 means no limit.
+        mip_gap (float): Relative MIP gap of each subproblem solve.
+
+    Returns:
+        dict: 'capacities' (best shared capacities or None), 'converged' (whether they are within the
+              tolerance of the optimum), 'status' (in the format of solve_with_budget), 'iterations' and
+              'scenarios' (DataFrames) and 'series' (time series of each scenario).
+    """
+    workers = min(int(workers) or os.cpu_count() or 1, len(scenarios))
+    run_id = f"{os.getpid()}-{time.time()}"
+    probabilities = {s['name']: s['probability'] for s in scenarios}
+    start = time.perf_counter()
+    logging.info(f"*** Benders decomposition over {len(scenarios)} scenarios with {workers} worker(s) *** \n")
+
+    names = capacity_names(sites)
+    ranges = _capacity_ranges(params, sites)
+    master_solver = SolverFactory('highs')
+    best, history = None, []
+    lower_bound, upper_bound = 0.0, float('inf')
+    termination = 'iteration_limit'
+
+    # The scenarios are placed once in shared memory; every task only names its scenario and the capacities
+    shared = SharedInputs({'scenarios': scenarios, 'sites': sites, 'params': params})
+    pools = [ProcessPoolExecutor(max_workers=1) for _ in range(workers)]
+    try:
+        def solve_all(capacities, series=False):
+            futures = [pools[i % workers].submit(_solve_scenario, {
+                'run_id': run_id, 'scenario_index': i, 'capacities': capacities, 'series': series,
+                'time_limit': time_limit, 'mip_gap': mip_gap, 'shared_inputs': shared.handle,
+            }) for i in range(len(scenarios))]
+            return {result['name']: result for result in (f.result() for f in futures)}
+
+        own = solve_all(None)
+        if not all(r['feasible'] for r in own.values()):
+            termination = 'scenario_infeasible'
+            infeasible = ', '.join(s for s, r in own.items() if not r['feasible'])
+            logging.error(f"*** Scenarios without a feasible sizing of their own: {infeasible} *** \n")
+        else:
+            master = _build_master(params, sites, scenarios, {s: r['lower_bound'] for s, r in own.items()})
+            limits = {name: capacity_var(master, name).bounds for name in names}
+            lower_bound = sum(probabilities[s] * r['lower_bound'] for s, r in own.items())
+            candidate = {name: sum(probabilities[s] * r['capacities'][name] for s, r in own.items())
+                         for name in names}
+            radius = INITIAL_TRUST_RADIUS
+
+        for iteration in range(1, int(max_iterations) + 1):
+            if termination == 'scenario_infeasible':
+                break
+            evaluated = candidate
+            results = solve_all(evaluated)
+            n_feasibility_cuts = 0
+            for s, r in results.items():
+                if 'subgradient' not in r:
+                    logging.error(f"*** Scenario {s} failed without a cut ({r['status']['termination']}) *** \n")
+                    termination = 'subproblem_error'
+                    break
+                slope = sum(r['subgradient'][n] * (capacity_var(master, n) - evaluated[n]) for n in names)
+                if r['feasible']:
+                    master.cuts.add(master.theta[s] >= r['cost'] + slope)
+                else:
+                    master.cuts.add(r['infeasibility'] + slope <= 0)
+                    n_feasibility_cuts += 1
+            if termination == 'subproblem_error':
+                break
+
+            expected_cost = None
+            if n_feasibility_cuts == 0:
+                expected_cost = sum(probabilities[s] * r['cost'] for s, r in results.items())
+            if expected_cost is not None and expected_cost < upper_bound:
+                upper_bound, best, step = expected_cost, evaluated, 'serious step'
+                radius = min(2 * radius, 1.0)
+            else:
+                # Not 'null' alone, which spreadsheet readers take for a missing value
+                step = 'null step'
+                radius = max(0.5 * radius, MIN_TRUST_RADIUS)
+
+            # The lower bound comes from the master over all capacities; the trust region only steers the
+            # capacities tried next
+            _set_trust_region(master, limits)
+            master_status = solve_with_budget(master_solver, master, 'sizing master', tee=False)
+            if not master_status['has_solution']:
+                termination = 'master_infeasible'
+                break
+            lower_bound = max(lower_bound, master_status['objective'])
+            candidate = {name: value(capacity_var(master, name)) for name in names}
+
+            gap = (upper_bound - lower_bound) / max(abs(upper_bound), 1e-10) if best else None
+            history.append({'iteration': iteration, 'lower_bound': lower_bound, 'expected_cost': expected_cost,
+                            'upper_bound': upper_bound if best else None, 'gap': gap,
+                            'feasibility_cuts': n_feasibility_cuts, 'step': step, 'trust_radius': radius,
+                            **evaluated})
+            logging.info(f"Benders iteration {iteration}: lower bound {lower_bound:,.0f}, "
+                         f"upper bound {upper_bound:,.0f}, feasibility cuts {n_feasibility_cuts}, {step}")
+            if gap is not None and gap <= tolerance:
+                termination = 'converged'
+                break
+
+            if best is not None:
+                _set_trust_region(master, limits, best, radius, ranges)
+                region_status = solve_with_budget(master_solver, master, 'sizing master [trust region]', tee=False,
+                                                  no_solution_level=logging.INFO)
+                if region_status['has_solution']:
+                    candidate = {name: value(capacity_var(master, name)) for name in names}
+
+        # Report every scenario at the best capacities
+        evaluation = solve_all(best, series=True) if best else {}
+    finally:
+        for pool in pools:
+            pool.shutdown()
+        shared.close()
+
+    converged = termination == 'converged'
+    gap = (upper_bound - lower_bound) / max(abs(upper_bound), 1e-10) if best else None
+    status = {'model': 'sizing', 'termination': f"benders_{termination}", 'has_solution': best is not None,
+              'optimal': converged, 'objective': upper_bound if best else None,
+              'bound': lower_bound, 'gap': gap, 'solve_time_s': time.perf_counter() - start, 'solver': 'benders'}
+    if best is None:
+        logging.error(f"*** Stochastic sizing found no capacities feasible for all scenarios ({termination}) *** \n")
+    elif not converged:
+        logging.warning(f"*** Stochastic sizing stopped before converging ({termination}, gap {gap:.2%}) after "
+                        f"{status['solve_time_s']:.1f} s; the capacities are the best found, not the optimum *** \n")
+    else:
+        logging.info(f"*** Stochastic sizing finished ({termination}, gap {gap:.2%}) "
+                     f"in {status['solve_time_s']:.1f} s *** \n")
+
+    scenario_rows = [{'scenario': name, 'probability': probabilities[name], 'termination': r['status']['termination'],
+                      'cost': r.get('cost'), 'total_deficit': r.get('total_deficit')}
+                     for name, r in evaluation.items()]
+    return {
+        'capacities': best,
+        'converged': converged,
+        'status': status,
+        'iterations': pd.DataFrame(history).set_index('iteration') if history else pd.DataFrame(),
+        'scenarios': pd.DataFrame(scenario_rows).set_index('scenario') if scenario_rows else pd.DataFrame(),
+        'series': {name: r['series'] for name, r in evaluation.items() if 'series' in r},
+    }
@@ -0,0 +1,149 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from shared_inputs import SharedInputs, with_shared_inputs
+
+HOURS_PER_PERIOD = 0.25
+
+
+def stress_week_windows(interesting_weeks, index):
+    """
+    The weeks flagged by my_statistics.weekly_stat_analysis, each once with all the categories it is flagged in.
+
+    The week labels are those of the weekly resample, i.e. the last day (Sunday) of each week, so a window runs
+    from six days before its label to the end of the label day, clipped to the index.
+
+    Args:
+        interesting_weeks (dict): Week labels ('%Y-%m-%d') of each category.
+        index (pd.DatetimeIndex): Time index of the profiles.
+
+    Returns:
+        pd.DataFrame: 'start', 'end' (first and last period) and 'categories' of each week, indexed by label.
+    """
+    categories = {}
+    for category, weeks in interesting_weeks.items():
+        for week in weeks:
+            categories.setdefault(week, []).append(category)
+    rows = []
+    for week in sorted(categories):
+        label = pd.Timestamp(week)
+        in_week = (index >= label - pd.Timedelta(days=6)) & (index < label + pd.Timedelta(days=1))
+        if in_week.any():
+            rows.append({'week': week, 'start': index[in_week][0], 'end': index[in_week][-1],
+                         'categories': ', '.join(categories[week])})
+    return pd.DataFrame(rows, columns=['week', 'start', 'end', 'categories']).set_index('week')
+
+
+def _analyze_week(task):
+    """Runs the thermal dispatch and the fixed-size battery simulation over one week, in a worker process."""
+    start = time.perf_counter()
+    task = with_shared_inputs(task)
+    frame = task['df_all'].between(task['start'], task['end'])
+    params = dict(task['params'], timeline_start_date=task['start'], timeline_end_date=task['end'],
+                  sensitivity_analysis=False, stream_chunk_days=0)
+    paths = task['paths']
+    thermal = task['thermal'](params, paths, frame)
+    battery_profiles, remaining_surplus_history = task['battery'](params, paths, frame)
+
+    surplus = frame['WITH SURPLUS'].values.astype(float)
+    row = {'deficit_before_mwh': np.clip(surplus, 0, None).sum() * HOURS_PER_PERIOD,
+           'surplus_before_mwh': -np.clip(surplus, None, 0).sum() * HOURS_PER_PERIOD,
+           'peak_net_demand_mw': surplus.max(),
+           'thermal_termination': thermal['status']['termination']}
+    dispatch = pd.DataFrame({'With Surplus': surplus}, index=frame.index.rename(None))
+    schedule = thermal['schedule']
+    if schedule is not None:
+        unserved = schedule['Unserved Demand'].values
+        generation = schedule.drop(columns=['Unserved Demand', 'With Surplus']).sum(axis=1).values
+        row.update({'thermal_generation_mwh': generation.sum() * HOURS_PER_PERIOD,
+                    'thermal_unmet_mwh': unserved.sum() * HOURS_PER_PERIOD,
+                    'thermal_unmet_peak_mw': unserved.max(),
+                    'thermal_unmet_periods': int((unserved > 1e-6).sum())})
+        dispatch['Thermal Generation'] = generation
+        dispatch['Unserved Demand'] = unserved
+
+    charge = sum(profile['Charge (MW)'].values for profile in battery_profiles.values())
+    discharge = sum(profile['Discharge (MW)'].values for profile in battery_profiles.values())
+    for battery, profile in battery_profiles.items():
+        row[f"{battery} charge_mwh"] = profile['Charge (MW)'].sum() * HOURS_PER_PERIOD
+        row[f"{battery} discharge_mwh"] = profile['Discharge (MW)'].sum() * HOURS_PER_PERIOD
+    if remaining_surplus_history:
+        # The batteries are applied in order, so the last history is what is left after all of them
+        remaining = list(remaining_surplus_history.values())[-1]
+        row['deficit_after_batteries_mwh'] = np.clip(remaining, 0, None).sum() * HOURS_PER_PERIOD
+        row['surplus_after_batteries_mwh'] = -np.clip(remaining, None, 0).sum() * HOURS_PER_PERIOD
+        dispatch['Battery Charge'] = charge
+        dispatch['Battery Discharge'] = discharge
+        dispatch['After Batteries'] = remaining
+    row['solve_time_s'] = time.perf_counter() - start
+    return row, dispatch
+
+
+def analyze_stress_weeks(df_all, weekly_stats, interesting_weeks, params, paths, thermal, battery, workers=0):
+    """
+    Runs the thermal dispatch and the fixed-size battery simulation over every flagged week at once, one
+    week per task in a pool of worker processes, and consolidates the results in a stress-week report.
+
+    Each task runs on the rows of its week only (a few hundred periods), and the timeline parameters are set
+    to the week, so the stage functions see a one-week run (the batteries start each week empty). The profiles
+    are placed once in shared memory for the workers, which take the rows of their week from there.
+
+    Args:
+        df_all (ProfileFrame): Profiles of the whole year.
+        weekly_stats (pd.DataFrame): Statistics of each week, indexed by week label.
+        interesting_weeks (dict): Week labels of each category (see my_statistics.weekly_stat_analysis).
+        params (dict): Parameters of the run.
+        paths (dict): Input files of the run.
+        thermal (callable): Thermal dispatch as a picklable stage function (params, paths, df_all), e.g.
+                            pipeline.thermal_schedule.
+        battery (callable): Fixed-size battery simulation as a stage function, e.g. pipeline.fixed_battery.
+        workers (int): Number of worker processes. 0 uses one per CPU core.
+
+    Returns:
+        dict: 'weeks' (one row per week: categories, weekly statistics and the results of both simulations),
+              'categories' (totals and worst week of each category) and 'dispatch' (the time series of every
+              week, with a 'week' column).
+    """
+    start = time.perf_counter()
+    windows = stress_week_windows(interesting_weeks, df_all.index)
+    if windows.empty:
+        logging.warning("*** No stress weeks flagged; skipping the stress-week analysis *** \n")
+        return {'weeks': windows, 'categories': pd.DataFrame(), 'dispatch': pd.DataFrame()}
+
+    workers = min(int(workers) or os.cpu_count() or 1, len(windows))
+    logging.info(f"*** Analyzing {len(windows)} stress weeks with {workers} worker(s) *** \n")
+    common = {'df_all': df_all, 'params': params, 'paths': paths, 'thermal': thermal, 'battery': battery}
+    tasks = [{'start': window.start, 'end': window.end} for window in windows.itertuples()]
+
+    if workers == 1:
+        results = [_analyze_week({**common, **task}) for task in tasks]
+    else:
+        with SharedInputs(common) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_analyze_week, [dict(task, shared_inputs=shared.handle) for task in tasks]))
+
+    weeks = windows.join(pd.DataFrame([row for row, _ in results], index=windows.index))
+    weeks = weeks.join(weekly_stats.set_axis(weekly_stats.index.strftime('%Y-%m-%d')), how='left')
+    dispatch = pd.concat([frame.assign(week=week) for week, (_, frame) in zip(windows.index, results)])
+
+    by_category = []
+    for category, labels in interesting_weeks.items():
+        flagged = weeks.loc[weeks.index.intersection(labels)]
+        if flagged.empty:
+            continue
+        summary = {'category': category, 'weeks': len(flagged)}
+        for column in ['deficit_before_mwh', 'thermal_unmet_mwh', 'deficit_after_batteries_mwh',
+                       'surplus_after_batteries_mwh']:
+            if column in flagged:
+                summary[f"total_{column}"] = flagged[column].sum()
+        if 'thermal_unmet_mwh' in flagged and flagged['thermal_unmet_mwh'].notna().any():
+            summary['max_thermal_unmet_peak_mw'] = flagged['thermal_unmet_peak_mw'].max()
+            summary['worst_week'] = flagged['thermal_unmet_mwh'].idxmax()
+        by_category.append(summary)
+
+    logging.info(f"*** Stress-week analysis finished in {time.perf_counter() - start:.1f} s *** \n")
+    return {'weeks': weeks, 'categories': pd.DataFrame(by_category).set_index('category'), 'dispatch': dispatch}
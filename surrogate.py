@@ -0,0 +1,276 @@
+import configparser
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from results_writer import list_sheets, list_workbooks, read_sheet, save_results
+from shared_inputs import share_pipeline_inputs
+from site_registry import site_names
+from sizing_model import BATTERY_VARIABLES
+
+SAMPLES_WORKBOOK = 'Surrogate_Samples.xlsx'
+
+# Inputs varied by the sampling design when surrogate_inputs is not set (CostParameters and PowerParameters)
+DEFAULT_INPUTS = ['solar_cost_goa', 'solar_cost_guj', 'solar_cost_raj', 'wind_cost_maha', 'wind_cost_tamil',
+                  'wind_cost_karnataka', 'battery_cost_mwh', 'annual_demand_mus', 'rtc_size']
+
+# Every sample is a plain deterministic sizing run. Sample folders are removed after the run, so samples are
+# neither recorded in the run history nor archived.
+_SAMPLE_OVERRIDES = {'sizing_mode': 'deterministic', 'sensitivity_analysis': 'False',
+                     'excel_output_mode': 'on_demand', 'run_thermal_&_sizing_optimization': 'True',
+                     'run_history_db': '', 'archive_dir': '', 'stress_week_analysis': 'False',
+                     'verify_sizing': 'False', 'monte_carlo_analysis': 'False'}
+
+# Candidate hyperparameters of the Gaussian process (inputs are scaled to the unit cube)
+_LENGTHSCALES = np.logspace(-1, 1, 15)
+_NOISE_LEVELS = (1e-6, 1e-4, 1e-3, 1e-2, 1e-1)
+# Largest noise added to the kernel diagonal when no level of the grid gives a positive definite kernel
+_MAX_JITTER = 10.0
+
+
+def latin_hypercube(n_samples, n_dims, seed=0):
+    """Space-filling design in the unit cube: every dimension is split into n_samples strata, one sample each."""
+    rng = np.random.default_rng(seed)
+    strata = np.array([rng.permutation(n_samples) for _ in range(n_dims)]).T
+    return (strata + rng.random((n_samples, n_dims))) / n_samples
+
+
+def design_bounds(params, inputs, spread):
+    """
+    Range of each sampled input: the configured value plus or minus the relative spread.
+
+    Inputs that are zero (or missing) cannot be varied relatively and are left out with a warning.
+
+    Returns:
+        pd.DataFrame: 'low', 'high' and 'base' of each input, indexed by parameter name.
+    """
+    rows = {}
+    for name in inputs:
+        base = params.get(name)
+        if not isinstance(base, float) or base == 0:
+            logging.warning(f"Surrogate input '{name}' is missing or zero; it is not sampled")
+            continue
+        rows[name] = {'low': base * (1 - spread), 'high': base * (1 + spread), 'base': base}
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('parameter')
+
+
+def sizing_outputs(params):
+    """Sizing results modelled by the surrogate: the capacity of each site and of the battery, and the deficit."""
+    return site_names(params) + BATTERY_VARIABLES + ['total_deficit']
+
+
+def _write_sample_config(base_config_file, values, config_path):
+    """Copies the base config file with the sampled values (each written to the section that holds it)."""
+    config = configparser.ConfigParser()
+    config.read(base_config_file)
+    for name, sample_value in {**_SAMPLE_OVERRIDES, **values}.items():
+        section = next((s for s in config.sections() if config.has_option(s, name)), None)
+        if section is None:
+            section = 'SolverParameters'
+            if not config.has_section(section):
+                config.add_section(section)
+        config.set(section, name, str(sample_value))
+    with open(config_path, 'w') as f:
+        config.write(f)
+
+
+def _run_sample(task):
+    """Runs the full optimization pipeline for one sample in its own folder and returns its sizing results."""
+    from optimization_model import run_optimization
+
+    work_dir = task['work_dir']
+    config_path = os.path.join(work_dir, 'parameters.ini')
+    results_dir = os.path.join(work_dir, 'Results')
+
+    start = time.perf_counter()
+    row = dict(task['values'])
+    try:
+        run_optimization(config_path, results_dir=results_dir, shared_inputs=task.get('shared_inputs'))
+        # Without a sizing solution the workbook only holds the solver status
+        if ('Optimal_Sizing_RE_BESS.xlsx' in list_workbooks(results_dir)
+                and 'Sizing Results' in list_sheets(results_dir, 'Optimal_Sizing_RE_BESS.xlsx')):
+            result_sizing = read_sheet(results_dir, 'Optimal_Sizing_RE_BESS.xlsx', 'Sizing Results')['Value']
+            row.update({name: result_sizing.get(name, np.nan) for name in task['outputs']})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    row['solve_time_s'] = time.perf_counter() - start
+    return row
+
+
+def run_sampling(config_file, surrogate_dir, n_samples=40, spread=0.25, inputs=None, workers=0, seed=0):
+    """
+    Runs a Latin hypercube design over the surrogate inputs through the full pipeline in parallel.
+
+    Each sample is a complete run of optimization_model.run_optimization with its own config file and
+    Results folder, so samples never share files. The parsed inputs that do not depend on the sampled values
+    are shared with the workers in memory.
+    The samples are saved to Surrogate_Samples.xlsx in surrogate_dir together with the design ranges.
+
+    Args:
+        config_file (str): Config file the samples are derived from.
+        surrogate_dir (str): Folder the samples are saved to.
+        n_samples (int): Number of full runs.
+        spread (float): Relative range of each input around its configured value (0.25 means +/- 25%).
+        inputs (list): Parameter names to vary. None uses DEFAULT_INPUTS.
+        workers (int): Number of worker processes. 0 uses one per CPU core.
+        seed (int): Seed of the design.
+
+    Returns:
+        pd.DataFrame: One row per sample with the inputs, the sizing outputs (NaN when infeasible) and the run time.
+    """
+    from optimization_model import read_config
+
+    start = time.perf_counter()
+    params = read_config(config_file)
+    bounds = design_bounds(params, inputs or DEFAULT_INPUTS, spread)
+    outputs = sizing_outputs(params)
+    n_samples = max(int(n_samples), 2)
+    unit = latin_hypercube(n_samples, len(bounds), seed)
+    design = bounds['low'].values + unit * (bounds['high'] - bounds['low']).values
+    work_root = os.path.join(surrogate_dir, 'runs')
+    logging.info(f"*** Surrogate sampling: {n_samples} full runs over {len(bounds)} inputs *** \n")
+
+    tasks = []
+    for i, row in enumerate(design):
+        work_dir = os.path.join(work_root, f"sample_{i}")
+        os.makedirs(work_dir, exist_ok=True)
+        values = dict(zip(bounds.index, row))
+        _write_sample_config(config_file, values, os.path.join(work_dir, 'parameters.ini'))
+        tasks.append({'work_dir': work_dir, 'values': values, 'outputs': outputs})
+
+    # The inputs are parsed once here; only the stages that are the same in every sample (i.e. not affected by
+    # the sampled inputs) are shared with the workers
+    workers = min(int(workers) or os.cpu_count() or 1, n_samples)
+    sample_configs = [os.path.join(task['work_dir'], 'parameters.ini') for task in tasks]
+    with share_pipeline_inputs(sample_configs[0], worker_configs=sample_configs[1:]) as shared:
+        tasks = [dict(task, shared_inputs=shared.handle) for task in tasks]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            samples = pd.DataFrame(list(pool.map(_run_sample, tasks))).rename_axis('sample')
+    shutil.rmtree(work_root, ignore_errors=True)
+
+    save_results(surrogate_dir, SAMPLES_WORKBOOK, {'Samples': samples, 'Design': bounds}, 'now')
+    n_failed = int(samples[outputs].isna().any(axis=1).sum())
+    logging.info(f"*** Surrogate sampling finished in {time.perf_counter() - start:.1f} s "
+                 f"({n_failed} of {n_samples} runs without a sizing solution) *** \n")
+    return samples
+
+
+def _rbf_kernel(a, b, lengthscale):
+    squared_distance = (((a[:, None, :] - b[None, :, :]) / lengthscale) ** 2).sum(axis=2)
+    return np.exp(-0.5 * squared_distance)
+
+
+def _fit_output(x, y):
+    """
+    Fits a Gaussian process to one output, choosing the lengthscale and noise by marginal likelihood. When no
+    noise level of the grid gives a positive definite kernel, the noise is raised tenfold until one does.
+    """
+    if not (np.isfinite(x).all() and np.isfinite(y).all()):
+        raise ValueError("Surrogate samples must be finite to fit a Gaussian process")
+    y_mean, y_scale = y.mean(), y.std() or 1.0
+    z = (y - y_mean) / y_scale
+    best = None
+    noise_levels = _NOISE_LEVELS
+    while best is None:
+        for lengthscale in _LENGTHSCALES:
+            kernel = _rbf_kernel(x, x, lengthscale)
+            for noise in noise_levels:
+                try:
+                    chol = np.linalg.cholesky(kernel + noise * np.eye(len(x)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, z))
+                log_likelihood = -0.5 * z @ alpha - np.log(np.diag(chol)).sum()
+                if best is None or log_likelihood > best['log_likelihood']:
+                    best = {'lengthscale': lengthscale, 'noise': noise, 'chol': chol, 'alpha': alpha,
+                            'log_likelihood': log_likelihood}
+        if best is None:
+            if noise_levels[-1] >= _MAX_JITTER:
+                raise ValueError(f"No Gaussian process fit: the kernel is not positive definite even with noise "
+                                 f"{noise_levels[-1]:g}")
+            noise_levels = (noise_levels[-1] * 10,)
+    # Leave-one-out residuals in closed form: alpha_i / (K^-1)_ii
+    chol_inv = np.linalg.inv(best['chol'])
+    loo_residual = best['alpha'] / (chol_inv ** 2).sum(axis=0)
+    best.update({'y_mean': y_mean, 'y_scale': y_scale,
+                 'loo_rmse': float(np.sqrt(np.mean(loo_residual ** 2))) * y_scale})
+    return best
+
+
+def fit_surrogate(samples, design):
+    """
+    Fits a Gaussian process regression surrogate of each sizing output to the samples (every column but the
+    inputs and the run time).
+
+    Args:
+        samples (pd.DataFrame): Output of run_sampling.
+        design (pd.DataFrame): Design ranges saved with the samples ('low', 'high' per input).
+
+    Returns:
+        dict: The fitted surrogate, used by predict_surrogate. None if fewer than two samples are usable.
+    """
+    output_names = [name for name in samples.columns if name not in design.index and name != 'solve_time_s']
+    usable = samples.dropna(subset=list(design.index) + output_names)
+    if len(usable) < 2:
+        return None
+    low, width = design['low'].values, (design['high'] - design['low']).values
+    x = (usable[design.index].values - low) / width
+    outputs = {name: _fit_output(x, usable[name].values.astype(float)) for name in output_names}
+    return {'inputs': list(design.index), 'low': low, 'width': width, 'x': x, 'outputs': outputs,
+            'n_samples': len(usable)}
+
+
+def predict_surrogate(surrogate, values, z=1.96):
+    """
+    Predicts the sizing outputs of one set of inputs with an uncertainty band.
+
+    Args:
+        surrogate (dict): Output of fit_surrogate.
+        values (dict): Input values keyed by parameter name; inputs not given are taken at the middle of their range.
+        z (float): Width of the band in standard deviations (1.96 is a 95% band).
+
+    Returns:
+        pd.DataFrame: 'estimate', 'lower', 'upper' and the leave-one-out error 'loo_rmse' of each output.
+    """
+    point = np.array([values.get(name, low + width / 2) for name, low, width
+                      in zip(surrogate['inputs'], surrogate['low'], surrogate['width'])], dtype=float)
+    xq = ((point - surrogate['low']) / surrogate['width'])[None, :]
+    rows = {}
+    for name, gp in surrogate['outputs'].items():
+        k_star = _rbf_kernel(xq, surrogate['x'], gp['lengthscale'])
+        v = np.linalg.solve(gp['chol'], k_star.T)
+        estimate = gp['y_mean'] + gp['y_scale'] * (k_star @ gp['alpha'])[0]
+        std = gp['y_scale'] * np.sqrt(max(1.0 - (v ** 2).sum(), 0.0) + gp['noise'])
+        # Sizes and deficits are never negative
+        rows[name] = {'estimate': max(estimate, 0.0), 'lower': max(estimate - z * std, 0.0),
+                      'upper': max(estimate + z * std, 0.0), 'loo_rmse': gp['loo_rmse']}
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('output')
+
+
+def load_surrogate(surrogate_dir):
+    """Fits the surrogate to the samples saved in surrogate_dir. Returns (surrogate, design), or (None, None)."""
+    if SAMPLES_WORKBOOK not in list_workbooks(surrogate_dir):
+        return None, None
+    design = read_sheet(surrogate_dir, SAMPLES_WORKBOOK, 'Design')
+    return fit_surrogate(read_sheet(surrogate_dir, SAMPLES_WORKBOOK, 'Samples'), design), design
+
+
+if __name__ == "__main__":
+    from optimization_model import read_config
+
+    config_file = sys.argv[1] if len(sys.argv) > 1 else 'parameters.ini'
+    params = read_config(config_file)
+    surrogate_inputs = [name.strip() for name in str(params.get('surrogate_inputs', ','.join(DEFAULT_INPUTS)))
+                        .split(',') if name.strip()]
+    surrogate_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                        'Surrogate')
+    run_sampling(config_file, surrogate_dir,
+                 n_samples=params.get('surrogate_samples', 40), spread=params.get('surrogate_spread', 0.25),
+                 inputs=surrogate_inputs, workers=params.get('surrogate_workers', 0),
+                 seed=int(params.get('surrogate_seed', 0)))
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch import PERIOD_HOURS, compare_dispatch, optimal_battery_dispatch
+from my_statistics import battery_fixed_size_calculations
+
+CONFIGS = {'Battery 1': {'power': 100.0, 'duration': 4.0}, 'Battery 2': {'power': 50.0, 'duration': 2.0}}
+MIN_SOC, EFFICIENCY = 0.1, 0.9
+
+
+def _net_demand(days=28, seed=0):
+    """A daily cycle of midday surplus and evening deficit with noise, in MW (demand +, surplus -)."""
+    rng = np.random.default_rng(seed)
+    periods = days * 96
+    hours = np.arange(periods) % 96 / 4
+    surplus = -150 * np.cos((hours - 13) / 24 * 2 * np.pi) + 40 * rng.standard_normal(periods)
+    index = pd.date_range('2027-01-01', periods=periods, freq='15min')
+    return pd.DataFrame({'WITH SURPLUS': surplus}, index=index)
+
+
+def _dispatches(df, price=None):
+    return {'greedy': battery_fixed_size_calculations(df, MIN_SOC, EFFICIENCY, CONFIGS),
+            'optimal': optimal_battery_dispatch(df, MIN_SOC, EFFICIENCY, CONFIGS, price=price)}
+
+
+def test_optimal_leaves_less_deficit_than_greedy():
+    df = _net_demand()
+    comparison = compare_dispatch(df['WITH SURPLUS'], _dispatches(df)).set_index(['dispatch', 'battery'])
+    last = list(CONFIGS)[-1]
+    assert comparison.loc[('optimal', last), 'deficit_left_mwh'] < comparison.loc[('greedy', last), 'deficit_left_mwh']
+
+
+def test_optimal_saves_energy_for_expensive_periods():
+    # Surplus fills the battery, then a long cheap deficit comes before a short expensive one
+    surplus = np.array([-100.0] * 16 + [20.0] * 40 + [100.0] * 8)
+    price = np.array([1.0] * 56 + [10.0] * 8)
+    df = pd.DataFrame({'WITH SURPLUS': surplus}, index=pd.date_range('2027-01-01', periods=len(surplus), freq='15min'))
+    configs = {'Battery 1': {'power': 100.0, 'duration': 4.0}}
+    dispatches = {'greedy': battery_fixed_size_calculations(df, MIN_SOC, EFFICIENCY, configs),
+                  'optimal': optimal_battery_dispatch(df, MIN_SOC, EFFICIENCY, configs, price=price)}
+    comparison = compare_dispatch(surplus, dispatches, price=price).set_index('dispatch')
+    assert comparison.loc['optimal', 'deficit_left_cost'] < 0.8 * comparison.loc['greedy', 'deficit_left_cost']
+    optimal_discharge = dispatches['optimal'][0]['Battery 1']['Discharge (MW)'].values
+    assert optimal_discharge[56:].sum() > optimal_discharge[16:56].sum()
+
+
+@pytest.mark.parametrize('price', [None, 'random'])
+def test_optimal_dispatch_follows_the_battery_rules(price):
+    df = _net_demand(days=7, seed=1)
+    if price == 'random':
+        price = np.random.default_rng(2).uniform(1, 10, len(df))
+    battery_profiles, remaining_surplus_history = optimal_battery_dispatch(df, MIN_SOC, EFFICIENCY, CONFIGS,
+                                                                           price=price)
+    surplus = df['WITH SURPLUS'].values
+    for battery, config in CONFIGS.items():
+        profile = battery_profiles[battery]
+        capacity = config['power'] * config['duration']
+        charge, discharge = profile['Charge (MW)'].values, profile['Discharge (MW)'].values
+        energy = profile['Battery State (MWh)'].values
+        assert (charge >= 0).all() and (charge <= config['power'] + 1e-9).all()
+        assert (discharge >= 0).all() and (discharge <= config['power'] + 1e-9).all()
+        assert not ((charge > 0) & (surplus >= 0)).any()
+        assert not ((discharge > 0) & (surplus <= 0)).any()
+        assert energy.max() <= capacity + 1e-6
+        assert energy[discharge > 0].min() >= MIN_SOC * capacity - 1e-6
+        stored = np.cumsum(charge * PERIOD_HOURS * EFFICIENCY - discharge * PERIOD_HOURS)
+        np.testing.assert_allclose(energy, stored, atol=1e-6)
+        np.testing.assert_allclose(remaining_surplus_history[battery], surplus + charge - discharge * EFFICIENCY)
+        # The next battery sees what this one left
+        surplus = remaining_surplus_history[battery]
+
+
+def test_dp_does_not_discharge_more_than_the_deficit_needs():
+    df = _net_demand(days=7, seed=3)
+    _, remaining_surplus_history = optimal_battery_dispatch(df, MIN_SOC, EFFICIENCY, CONFIGS)
+    for remaining in remaining_surplus_history.values():
+        # Serving a deficit never turns it into a surplus
+        assert not ((df['WITH SURPLUS'].values > 0) & (remaining < -1e-9)).any()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from downsampling import downsample, lttb_indices
+
+
+def _series(n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.sin(np.linspace(0, 20 * np.pi, n)) + 0.1 * rng.standard_normal(n)
+
+
+def test_keeps_endpoints_and_extrema():
+    y = _series()
+    y[1234], y[8765] = 5.0, -5.0
+    indices = lttb_indices(y, 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert np.argmax(y) in indices
+    assert np.argmin(y) in indices
+
+
+def test_indices_are_increasing_and_unique():
+    indices = lttb_indices(_series(), 300)
+    assert (np.diff(indices) > 0).all()
+
+
+def test_short_series_is_kept_whole():
+    assert list(lttb_indices(np.arange(5.0), 10)) == [0, 1, 2, 3, 4]
+    assert list(lttb_indices(np.arange(5.0), 2)) == [0, 1, 2, 3, 4]
+
+
+def test_nan_values_do_not_break_the_selection():
+    y = _series()
+    y[100:200] = np.nan
+    indices = lttb_indices(y, 400)
+    assert len(indices) == 400 and indices[0] == 0 and indices[-1] == len(y) - 1
+
+
+def test_downsample_keeps_the_peaks_of_every_column():
+    index = pd.date_range('2027-01-01', periods=10_000, freq='15min')
+    df = pd.DataFrame({'a': _series(seed=1), 'b': _series(seed=2)}, index=index)
+    df.iloc[4321, 1] = 9.0
+    sampled = downsample(df, 500)
+    assert sampled.index.is_monotonic_increasing
+    assert len(sampled) <= 2 * 500
+    for column in df.columns:
+        assert df[column].idxmax() in sampled.index
+        assert df[column].idxmin() in sampled.index
+    assert df.index[0] in sampled.index and df.index[-1] in sampled.index
+
+
+def test_downsample_returns_short_frames_unchanged():
+    df = pd.DataFrame({'a': [1.0, 2.0, 3.0]})
+    assert downsample(df, 10) is df
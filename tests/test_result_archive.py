@@ -0,0 +1,84 @@
+import json
+import os
+import time
+import zipfile
+
+import pandas as pd
+
+from result_archive import MANIFEST_FILE, apply_retention, archive_results, list_archive, write_zip
+from results_writer import list_workbooks, read_sheet, save_results
+
+
+def _results(tmp_path, name='Results', rows=10):
+    results_dir = str(tmp_path / name)
+    sheets = {'Sheet1': pd.DataFrame({'x': range(rows)}, dtype=float),
+              'Sheet2': pd.DataFrame({'y': ['a', 'b']})}
+    save_results(results_dir, 'Summary.xlsx', sheets, 'on_demand')
+    return results_dir
+
+
+def _archive(tmp_path, names, rows=10):
+    archive_root = str(tmp_path / 'Archive')
+    results_dir = _results(tmp_path, rows=rows)
+    for i, name in enumerate(names):
+        entry = archive_results(results_dir, archive_root, name)
+        # Entries a day apart, the first one oldest
+        stamp = time.time() - (len(names) - i) * 86400
+        os.utime(os.path.join(entry, MANIFEST_FILE), (stamp, stamp))
+    return archive_root
+
+
+def test_manifest_describes_every_sheet(tmp_path):
+    entry = archive_results(_results(tmp_path), str(tmp_path / 'Archive'), 'run_1', metadata={'total_deficit': 5.0})
+    with open(os.path.join(entry, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    assert manifest['name'] == 'run_1'
+    assert manifest['metadata'] == {'total_deficit': 5.0}
+    sheets = {sheet['sheet']: sheet for sheet in manifest['workbooks']['Summary.xlsx']}
+    assert set(sheets) == {'Sheet1', 'Sheet2'}
+    assert sheets['Sheet1']['rows'] == 10 and sheets['Sheet1']['columns'] == ['x']
+    assert manifest['bytes'] == sum(sheet['bytes'] for sheet in sheets.values())
+    for sheet in sheets.values():
+        assert os.path.getsize(os.path.join(entry, sheet['file'])) == sheet['bytes']
+
+
+def test_entry_reads_like_a_results_folder(tmp_path):
+    entry = archive_results(_results(tmp_path), str(tmp_path / 'Archive'), 'run_1')
+    assert list_workbooks(entry) == ['Summary.xlsx']
+    assert read_sheet(entry, 'Summary.xlsx', 'Sheet1')['x'].tolist() == [float(i) for i in range(10)]
+    assert not [name for name in os.listdir(tmp_path / 'Archive') if name.endswith('.tmp')]
+
+
+def test_list_archive_newest_first(tmp_path):
+    archive_root = _archive(tmp_path, ['a', 'b', 'c'])
+    assert list_archive(archive_root)['name'].tolist() == ['c', 'b', 'a']
+    assert list_archive(str(tmp_path / 'missing')).empty
+
+
+def test_retention_by_count_and_age(tmp_path):
+    archive_root = _archive(tmp_path, ['a', 'b', 'c', 'd'])
+    removed = apply_retention(archive_root, max_runs=3)
+    assert [os.path.basename(entry) for entry in removed] == ['a']
+    removed = apply_retention(archive_root, max_age_days=2.5)
+    assert [os.path.basename(entry) for entry in removed] == ['b']
+    assert list_archive(archive_root)['name'].tolist() == ['d', 'c']
+
+
+def test_retention_by_total_size_keeps_the_newest(tmp_path):
+    archive_root = _archive(tmp_path, ['a', 'b', 'c'], rows=50_000)
+    entry_mb = list_archive(archive_root)['bytes'].iloc[0] / 2 ** 20
+    apply_retention(archive_root, max_total_mb=2.5 * entry_mb)
+    assert list_archive(archive_root)['name'].tolist() == ['c', 'b']
+    assert apply_retention(archive_root) == []
+
+
+def test_write_zip_holds_every_file(tmp_path):
+    entry = archive_results(_results(tmp_path), str(tmp_path / 'Archive'), 'run_1')
+    zip_path = write_zip(entry, str(tmp_path / 'run_1.zip'))
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        infos = {info.filename: info for info in archive.infolist()}
+    files = {os.path.relpath(os.path.join(folder, file), entry).replace(os.sep, '/')
+             for folder, _, names in os.walk(entry) for file in names}
+    assert set(infos) == files
+    assert all(info.compress_type == zipfile.ZIP_STORED for name, info in infos.items() if name.endswith('.parquet'))
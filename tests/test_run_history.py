@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from results_writer import save_results
+from run_history import compare_runs, find_runs, forget_series, kpi_names, record_run
+
+
+@pytest.fixture
+def history(tmp_path):
+    """Three runs of differing shortage case and deficit, started a minute apart, with one result sheet each."""
+    db_path = str(tmp_path / 'history.sqlite')
+    start = datetime(2027, 1, 1)
+    run_ids = []
+    for i, (case, deficit) in enumerate([('case1', 100.0), ('case2', 50.0), ('case1', 300.0)]):
+        results_dir = str(tmp_path / f"results_{i}")
+        save_results(results_dir, 'Summary.xlsx', {'Sheet1': pd.DataFrame({'x': [1.0, 2.0]})}, 'on_demand')
+        run_ids.append(record_run(db_path, {'shortage_case': case, 'rtc_size': 300.0 + i, 'solver_mode': 'single'},
+                                  {'total_deficit': deficit, 'battery_capacity': 10.0 * i},
+                                  {'df_all': (1.0 + i, 'computed')}, results_dir,
+                                  started_at=start + timedelta(minutes=i), elapsed_s=10.0 * (i + 1),
+                                  status='sized' if i < 2 else 'no_solution'))
+    return db_path, run_ids
+
+
+def test_find_runs_newest_first_with_kpi_columns(history):
+    db_path, run_ids = history
+    runs = find_runs(db_path)
+    assert list(runs.index) == run_ids[::-1]
+    assert runs.loc[run_ids[1], 'total_deficit'] == 50.0
+    assert kpi_names(db_path) == ['battery_capacity', 'total_deficit']
+
+
+def test_find_runs_filters(history):
+    db_path, run_ids = history
+    assert list(find_runs(db_path, kpi_ranges={'total_deficit': (60.0, None)}).index) == [run_ids[2], run_ids[0]]
+    assert list(find_runs(db_path, kpi_ranges={'total_deficit': (None, 150.0)},
+                          param_values={'shortage_case': 'case1'}).index) == [run_ids[0]]
+    assert list(find_runs(db_path, param_values={'rtc_size': 301.0}).index) == [run_ids[1]]
+    assert list(find_runs(db_path, statuses=['no_solution']).index) == [run_ids[2]]
+
+
+def test_find_runs_sorts_by_kpi_and_limits(history):
+    db_path, run_ids = history
+    runs = find_runs(db_path, order_by='total_deficit', descending=False, limit=2)
+    assert list(runs.index) == [run_ids[1], run_ids[0]]
+    assert list(find_runs(db_path, order_by='elapsed_s').index) == run_ids[::-1]
+
+
+def test_compare_runs_shows_only_differing_params(history):
+    db_path, run_ids = history
+    comparison = compare_runs(db_path, run_ids[:2])
+    assert list(comparison['kpis'].columns) == run_ids[:2]
+    assert set(comparison['params'].index) == {'shortage_case', 'rtc_size'}
+    assert 'solver_mode' in compare_runs(db_path, run_ids[:2], all_params=True)['params'].index
+    assert comparison['timings'].loc['df_all'].tolist() == [1.0, 2.0]
+    assert comparison['series'].loc['Summary.xlsx / Sheet1'].notna().all()
+
+
+def test_forget_series_keeps_the_runs(history, tmp_path):
+    db_path, run_ids = history
+    forget_series(db_path, [str(tmp_path / 'results_0')])
+    series = compare_runs(db_path, run_ids)['series']
+    assert series[run_ids[0]].isna().all()
+    assert series[run_ids[1]].notna().all()
+    assert len(find_runs(db_path)) == 3
@@ -0,0 +1,117 @@
+import glob
+import os
+
+from stage_graph import run_stages, stage_keys
+
+calls = []
+
+
+def _load(params, paths):
+    calls.append('load')
+    with open(paths['data_file'][0]) as f:
+        return float(f.read()) * params['scale']
+
+
+def _double(params, paths, load):
+    calls.append('double')
+    return 2 * load + params['offset']
+
+
+def _other(params, paths):
+    calls.append('other')
+    return params['other']
+
+
+STAGES = [
+    {'name': 'load', 'function': _load, 'files': ['data_file'], 'params': ['scale']},
+    {'name': 'double', 'function': _double, 'inputs': ['load'], 'params': ['offset']},
+    {'name': 'other', 'function': _other, 'params': ['other'], 'checkpoint_if': lambda output: output > 0},
+]
+PARAMS = {'scale': 1.0, 'offset': 0.0, 'other': 1.0}
+
+
+def _paths(tmp_path, content='3'):
+    data_file = tmp_path / 'data.txt'
+    data_file.write_text(content)
+    return {'data_file': [str(data_file)]}
+
+
+def test_changed_param_invalidates_its_stage_and_downstream_only(tmp_path):
+    paths = _paths(tmp_path)
+    keys = stage_keys(STAGES, PARAMS, paths)
+
+    changed = stage_keys(STAGES, dict(PARAMS, scale=2.0), paths)
+    assert changed['load'] != keys['load']
+    assert changed['double'] != keys['double']
+    assert changed['other'] == keys['other']
+
+    changed = stage_keys(STAGES, dict(PARAMS, offset=1.0), paths)
+    assert changed['load'] == keys['load']
+    assert changed['double'] != keys['double']
+
+
+def test_undeclared_param_does_not_invalidate(tmp_path):
+    paths = _paths(tmp_path)
+    assert stage_keys(STAGES, dict(PARAMS, unrelated=5), paths) == stage_keys(STAGES, PARAMS, paths)
+
+
+def test_changed_input_file_invalidates(tmp_path):
+    paths = _paths(tmp_path)
+    keys = stage_keys(STAGES, PARAMS, paths)
+    _paths(tmp_path, content='30')
+    changed = stage_keys(STAGES, PARAMS, paths)
+    assert changed['load'] != keys['load']
+    assert changed['double'] != keys['double']
+    assert changed['other'] == keys['other']
+
+
+def test_checkpoints_are_reused_until_inputs_change(tmp_path):
+    paths = _paths(tmp_path)
+    checkpoint_dir = str(tmp_path / 'checkpoints')
+    calls.clear()
+    assert run_stages(STAGES, PARAMS, paths, checkpoint_dir=checkpoint_dir)['double'] == 6.0
+    assert calls == ['load', 'double', 'other']
+
+    calls.clear()
+    timings = {}
+    assert run_stages(STAGES, PARAMS, paths, checkpoint_dir=checkpoint_dir, timings=timings)['double'] == 6.0
+    assert calls == []
+    assert {source for _, source in timings.values()} == {'checkpoint'}
+
+    calls.clear()
+    assert run_stages(STAGES, dict(PARAMS, offset=1.0), paths, checkpoint_dir=checkpoint_dir)['double'] == 7.0
+    assert calls == ['double']
+
+
+def test_checkpoint_if_skips_saving(tmp_path):
+    paths = _paths(tmp_path)
+    checkpoint_dir = str(tmp_path / 'checkpoints')
+    params = dict(PARAMS, other=-1.0)
+    run_stages(STAGES, params, paths, targets=['other'], checkpoint_dir=checkpoint_dir)
+    assert not glob.glob(os.path.join(checkpoint_dir, 'other-*.pkl'))
+    calls.clear()
+    run_stages(STAGES, params, paths, targets=['other'], checkpoint_dir=checkpoint_dir)
+    assert calls == ['other']
+
+
+def test_targets_run_only_their_upstream_stages(tmp_path):
+    calls.clear()
+    outputs = run_stages(STAGES, PARAMS, _paths(tmp_path), targets=['load'])
+    assert list(outputs) == ['load']
+    assert calls == ['load']
+
+
+def test_provided_output_is_used_when_its_key_matches(tmp_path):
+    paths = _paths(tmp_path)
+    keys = stage_keys(STAGES, PARAMS, paths)
+    calls.clear()
+    timings = {}
+    outputs = run_stages(STAGES, PARAMS, paths, provided={'load': (keys['load'], 10.0)}, timings=timings)
+    assert outputs['double'] == 20.0
+    assert timings['load'][1] == 'shared'
+    assert 'load' not in calls
+
+    calls.clear()
+    outputs = run_stages(STAGES, PARAMS, paths, provided={'load': ('stale', 10.0)})
+    assert outputs['double'] == 6.0
+    assert 'load' in calls
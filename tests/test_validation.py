@@ -0,0 +1,98 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from validation import (InputValidationError, check_config, check_index, check_site_registry, validate_inputs,
+                        validate_sizing_inputs)
+
+PARAMS = {'wind_size_excel_sri': 40.0, 'wind_size_actual_sri': 450.0, 'rtc_size': 325.0,
+          'intra_state_power_losses': 0.03, 'inter_state_power_losses': 0.045, 'min_batt_soc': 0.1,
+          'batt_efficiency': 0.9, 'battery_configs': {'Battery 1': {'power': 500.0, 'duration': 4.0}},
+          'timeline_start_date': '2027-09-01', 'timeline_end_date': '2027-10-31', 'max_missing_periods': 2}
+
+
+def _checks(issues):
+    return {(row['check'], row['input']) for row in issues}
+
+
+def _profile(periods=96 * 7, column='TOTAL DEMAND'):
+    index = pd.date_range('2027-01-01', periods=periods, freq='15min')
+    return pd.DataFrame({column: np.linspace(100.0, 200.0, periods)}, index=index)
+
+
+def test_valid_config_passes():
+    assert check_config(PARAMS) == []
+
+
+@pytest.mark.parametrize('changes, expected', [
+    ({'wind_size_excel_sri': 0.0}, ('non-positive divisor', 'wind_size_excel_sri')),
+    ({'rtc_size': -1.0}, ('negative size', 'rtc_size')),
+    ({'min_batt_soc': 1.0}, ('out of range', 'min_batt_soc')),
+    ({'batt_efficiency': 0.0}, ('out of range', 'batt_efficiency')),
+    ({'battery_configs': {'Battery 1': {'power': 500.0, 'duration': 0.0}}},
+     ('non-positive divisor', 'Battery 1 duration')),
+    ({'timeline_start_date': '2027-11-01'}, ('timeline', 'timeline_start_date')),
+    ({'timeline_end_date': 'not a date'}, ('timeline', 'timeline_start_date / timeline_end_date')),
+])
+def test_bad_config_is_rejected(changes, expected):
+    assert expected in _checks(check_config(dict(PARAMS, **changes)))
+
+
+def test_missing_files_are_reported():
+    assert ('missing file', 'Data/missing.csv') in _checks(check_config(PARAMS, ['Data/missing.csv']))
+
+
+def test_index_problems():
+    index = pd.date_range('2027-01-01', periods=10, freq='15min')
+    assert check_index(index, 'demand') == []
+    assert _checks(check_index(index.delete(4), 'demand')) == {('irregular timestamps', 'demand')}
+    assert ('duplicate timestamps', 'demand') in _checks(check_index(index.insert(3, index[3]), 'demand'))
+    assert ('unsorted timestamps', 'demand') in _checks(check_index(index[::-1], 'demand'))
+    assert _checks(check_index(index[:0], 'demand')) == {('empty', 'demand')}
+
+
+def test_validate_inputs_accepts_clean_profiles():
+    demand = _profile()
+    report = validate_inputs(PARAMS, {}, demand, {'solar': _profile(column='Solar')})
+    assert report.empty
+
+
+def test_validate_inputs_warns_on_few_missing_values():
+    demand = _profile()
+    demand.iloc[10, 0] = np.nan
+    report = validate_inputs(PARAMS, {}, demand, {})
+    assert report['severity'].tolist() == ['warning']
+
+
+def test_validate_inputs_rejects_with_a_report():
+    demand = _profile()
+    demand.iloc[10:20, 0] = np.nan
+    solar = _profile(column='Solar')
+    solar.iloc[5, 0] = np.inf
+    shifted = _profile(column='Wind').shift(1, freq='15min')
+    with pytest.raises(InputValidationError) as error:
+        validate_inputs(PARAMS, {}, demand, {'solar': solar, 'wind': shifted})
+    report = error.value.report
+    assert set(report['severity']) == {'error'}
+    assert {('missing values', 'demand'), ('infinite values', "solar 'Solar'"),
+            ('misaligned periods', 'wind')} <= _checks(report.to_dict('records'))
+    # The error is rebuilt with its report when raised in a worker process
+    assert pickle.loads(pickle.dumps(error.value)).report.equals(report)
+
+
+def test_validate_sizing_inputs_rejects_wrong_lengths():
+    with pytest.raises(InputValidationError, match='GDAM price'):
+        validate_sizing_inputs(np.ones(1152), np.ones(1151), {'solar': np.ones(1152)})
+
+
+def test_site_registry_problems():
+    sites = pd.DataFrame({'technology': ['solar', 'hydro', 'wind'], 'losses': [0.03, 1.5, 0.03],
+                          'cost': [1.0, 1.0, -1.0], 'min_mw': [0.0, 10.0, 5.0], 'max_mw': [10.0, 5.0, 10.0],
+                          'profile': ['a.csv', 'b.csv', '']},
+                         index=pd.Index(['goa', 'battery_capacity', 'goa'], name='site'))
+    checks = _checks(check_site_registry(sites, ['solar', 'wind'], reserved_names=['battery_capacity']))
+    assert {('duplicate sites', 'site registry'), ('reserved name', 'site registry'),
+            ('unknown technology', 'battery_capacity'), ('out of range', 'battery_capacity'),
+            ('negative value', 'goa'), ('missing profile', 'goa')} <= checks
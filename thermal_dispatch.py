@@ -0,0 +1,297 @@
+import logging
+import time
+
+import numpy as np
+from pyomo.environ import ConcreteModel, Set, Param, Var, Constraint, Objective, NonNegativeReals, RangeSet
+
+from solution_extraction import var_array, var_matrix
+
+# Relative gap of a repaired merit-order schedule to its bound within which it counts as optimal, when no
+# MIP gap is configured (the HiGHS default)
+DEFAULT_OPTIMALITY_GAP = 1e-4
+
+
+def build_thermal_model(net_demand, gen_data, ramp_rate, min_gen_factor, penalty_unmet_demand,
+                        initial_output=None, final_output=None):
+    """
+    Builds the thermal dispatch LP with a slack variable for unmet demand.
+
+    Args:
+        net_demand (array-like): Net demand (MW) for each time period.
+        gen_data (dict): Generator name -> {'max_capacity': MW, 'var_cost': cost per MWh}.
+        ramp_rate (float): Ramp limit per period as a fraction of capacity.
+        min_gen_factor (float): Minimum generation as a fraction of capacity.
+        penalty_unmet_demand (float): Cost per MW of unmet demand.
+        initial_output (dict): Optional generator output in the period before the horizon. The first
+                               period must then respect the ramp limits from it.
+        final_output (dict): Optional generator output in the period after the horizon. The last
+                             period must then respect the ramp limits towards it.
+
+    Returns:
+        ConcreteModel: The thermal dispatch model.
+    """
+    gen_list = list(gen_data.keys())
+    net_demand_dict = dict(enumerate(float(d) for d in net_demand))
+
+    model = ConcreteModel()
+
+    # Sets: Time periods and generators
+    model.T = RangeSet(0, len(net_demand_dict) - 1)
+    model.I = Set(initialize=gen_list)
+
+    # Parameters:
+    # Net demand at each time period (MW)
+    model.demand = Param(model.T, initialize=net_demand_dict)
+
+    # Generator maximum capacity (MW)
+    def cap_init(model, i):
+        return float(gen_data[i]['max_capacity'])
+
+    model.cap = Param(model.I, initialize=cap_init)
+
+    # Variable cost for each generator (per MWh)
+    def cost_init(model, i):
+        return float(gen_data[i]['var_cost'])
+
+    model.var_cost = Param(model.I, initialize=cost_init)
+
+    # Ramp rate factor (fraction of capacity per period)
+    model.ramp_rate = Param(initialize=ramp_rate)
+
+    # =============================================================================
+    # Decision Variables:
+    # Generation output from generator i at time t (MW)
+    model.x = Var(model.I, model.T, domain=NonNegativeReals)
+    # Slack variable for unmet demand at time t (MW)
+    model.u = Var(model.T, domain=NonNegativeReals)
+
+    # =============================================================================
+    # Objective: Minimize total cost (generation cost + penalty for unserved demand)
+    # =============================================================================
+    def objective_rule(model):
+        generation_cost = sum(model.var_cost[i] * model.x[i, t] for i in model.I for t in model.T)
+        slack_cost = sum(penalty_unmet_demand * model.u[t] for t in model.T)
+        return generation_cost + slack_cost
+
+    model.obj = Objective(rule=objective_rule)
+
+    # =============================================================================
+    # Constraints
+    # =============================================================================
+
+    # 1. Demand Balance: Thermal generation plus slack must equal net demand
+    def demand_balance_rule(model, t):
+        # The idea is:
+        #   (Thermal generation + Renewable generation) + battery discharge
+        #     - battery charge + slack = net demand
+        return (sum(model.x[i, t] for i in model.I) +
+                model.u[t]) >= model.demand[t]
+
+    model.demand_balance = Constraint(model.T, rule=demand_balance_rule)
+
+    # 2. Generator capacity limits:
+    def capacity_limit_rule(model, i, t):
+        return model.x[i, t] <= model.cap[i]
+
+    model.capacity_limit = Constraint(model.I, model.T, rule=capacity_limit_rule)
+
+    # 3. Ramp-up constraints:
+    def ramp_up_rule(model, i, t):
+        if t == 0:
+            if initial_output is None:
+                return Constraint.Skip  # No ramp-up constraint for the first time period
+            return model.x[i, t] - initial_output[i] <= model.ramp_rate * model.cap[i]
+        return model.x[i, t] - model.x[i, t - 1] <= model.ramp_rate * model.cap[i]
+
+    model.ramp_up = Constraint(model.I, model.T, rule=ramp_up_rule)
+
+    # 4. Ramp-down constraints:
+    def ramp_down_rule(model, i, t):
+        if t == 0:
+            if initial_output is None:
+                return Constraint.Skip  # No ramp-down constraint for the first time period
+            return initial_output[i] - model.x[i, t] <= model.ramp_rate * model.cap[i]
+        return model.x[i, t - 1] - model.x[i, t] <= model.ramp_rate * model.cap[i]
+
+    model.ramp_down = Constraint(model.I, model.T, rule=ramp_down_rule)
+
+    # 5. Ramp limits towards the period after the horizon (only when solving a window)
+    if final_output is not None:
+        t_last = model.T.last()
+
+        def final_ramp_up_rule(model, i):
+            return final_output[i] - model.x[i, t_last] <= model.ramp_rate * model.cap[i]
+
+        model.final_ramp_up = Constraint(model.I, rule=final_ramp_up_rule)
+
+        def final_ramp_down_rule(model, i):
+            return model.x[i, t_last] - final_output[i] <= model.ramp_rate * model.cap[i]
+
+        model.final_ramp_down = Constraint(model.I, rule=final_ramp_down_rule)
+
+    # Minimum generation limit (MW)
+    def min_gen_init(model, i):
+        return min_gen_factor * gen_data[i]['max_capacity']
+
+    model.min_gen = Param(model.I, initialize=min_gen_init)
+
+    def min_gen_limit_rule(model, i, t):
+        return model.x[i, t] >= model.min_gen[i]
+
+    model.min_gen_limit = Constraint(model.I, model.T, rule=min_gen_limit_rule)
+
+    return model
+
+
+def merit_order_dispatch(net_demand, capacity, var_cost, min_gen_factor, penalty_unmet_demand):
+    """
+    Dispatches generators in merit order for all time periods at once, ignoring ramp limits.
+
+    Every generator runs at least at its minimum generation. The remaining demand is filled by the
+    cheapest generators first, but only by generators cheaper than the unmet demand penalty; the rest
+    is left as unmet demand. This is the optimum of the dispatch LP without ramp constraints.
+
+    Args:
+        net_demand (np.ndarray): Net demand (MW), shape (T,).
+        capacity (np.ndarray): Generator capacity (MW), shape (I,).
+        var_cost (np.ndarray): Generator variable cost, shape (I,).
+        min_gen_factor (float): Minimum generation as a fraction of capacity.
+        penalty_unmet_demand (float): Cost per MW of unmet demand.
+
+    Returns:
+        tuple: Generation x of shape (I, T) and unmet demand u of shape (T,).
+    """
+    min_gen = min_gen_factor * capacity
+    headroom = np.where(var_cost < penalty_unmet_demand, capacity - min_gen, 0.0)
+
+    # Demand left after all generators run at minimum generation
+    residual = np.clip(net_demand - min_gen.sum(), 0, None)
+
+    # Fill the residual along the merit order: each generator takes what is left after the cheaper ones
+    order = np.argsort(var_cost, kind='stable')
+    headroom_before = np.concatenate(([0.0], np.cumsum(headroom[order])[:-1]))
+    extra_sorted = np.clip(residual[None, :] - headroom_before[:, None], 0, headroom[order][:, None])
+
+    x = np.empty((len(capacity), len(net_demand)))
+    x[order] = min_gen[order][:, None] + extra_sorted
+    u = np.clip(residual - extra_sorted.sum(axis=0), 0, None)
+    return x, u
+
+
+def constraint_violations(x, capacity, ramp_rate, min_gen_factor, tol=1e-6):
+    """
+    Flags the time periods in which a dispatch breaks a ramp or minimum generation limit.
+
+    Returns:
+        np.ndarray: Boolean array of shape (T,). A ramp violation between t-1 and t flags period t.
+    """
+    violated = np.zeros(x.shape[1], dtype=bool)
+    ramp_limit = ramp_rate * capacity[:, None] + tol
+    violated[1:] = (np.abs(np.diff(x, axis=1)) > ramp_limit).any(axis=0)
+    violated |= (x < min_gen_factor * capacity[:, None] - tol).any(axis=0)
+    violated |= (x > capacity[:, None] + tol).any(axis=0)
+    return violated
+
+
+def _violation_windows(violated, padding):
+    """Groups flagged periods into [start, end] windows padded on both sides, merging touching windows."""
+    windows = []
+    n_periods = len(violated)
+    for t in np.flatnonzero(violated):
+        start, end = max(t - padding, 0), min(t + padding, n_periods - 1)
+        # Windows must be separated by at least one fixed period to act as their boundary
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return windows
+
+
+def dispatch_thermal(net_demand, gen_data, ramp_rate, min_gen_factor, penalty_unmet_demand, solve_lp,
+                     max_window_share=0.9, mip_gap=None):
+    """
+    Thermal dispatch using vectorized merit order with an LP fallback only where ramps bind.
+
+    The merit-order schedule is computed for all periods at once and checked against the ramp and
+    minimum generation limits. If it satisfies them, it is the optimum of the full LP and is returned
+    directly. Otherwise only the windows around the violations are re-solved as LPs, with the
+    merit-order output at the window edges as fixed boundary conditions. A repaired schedule within
+    `mip_gap` of the merit-order bound counts as optimal. If the windows cover more than
+    `max_window_share` of the horizon, the full LP is solved instead.
+
+    Args:
+        net_demand (array-like): Net demand (MW) for each time period.
+        gen_data (dict): Generator name -> {'max_capacity': MW, 'var_cost': cost per MWh}.
+        ramp_rate (float): Ramp limit per period as a fraction of capacity.
+        min_gen_factor (float): Minimum generation as a fraction of capacity.
+        penalty_unmet_demand (float): Cost per MW of unmet demand.
+        solve_lp (callable): solve_lp(model, model_name='thermal', tee=True) -> solve status dict (see
+                             solver_utils), used for the window LPs and the full LP.
+        max_window_share (float): Share of the horizon above which the full LP is solved instead.
+        mip_gap (float): Relative gap to the merit-order bound within which a repaired schedule is optimal.
+                         None uses DEFAULT_OPTIMALITY_GAP.
+
+    Returns:
+        tuple: Generation x of shape (I, T), unmet demand u of shape (T,) and a solve status dict.
+               x and u are None if no solution was found.
+    """
+    start_time = time.perf_counter()
+    gen_list = list(gen_data.keys())
+    net_demand = np.asarray(net_demand, dtype=float)
+    capacity = np.array([float(gen_data[i]['max_capacity']) for i in gen_list])
+    var_cost = np.array([float(gen_data[i]['var_cost']) for i in gen_list])
+
+    def total_cost(x, u):
+        return float((var_cost[:, None] * x).sum() + penalty_unmet_demand * u.sum())
+
+    x, u = merit_order_dispatch(net_demand, capacity, var_cost, min_gen_factor, penalty_unmet_demand)
+    # Without ramp limits the problem is a relaxation of the LP, so its cost is a valid lower bound
+    lower_bound = total_cost(x, u)
+    violated = constraint_violations(x, capacity, ramp_rate, min_gen_factor)
+
+    status = {'model': 'thermal', 'termination': 'merit_order', 'has_solution': True, 'optimal': True,
+              'objective': lower_bound, 'bound': lower_bound, 'gap': 0.0, 'solve_time_s': None,
+              'solver': 'merit_order'}
+    if not violated.any():
+        status['solve_time_s'] = time.perf_counter() - start_time
+        logging.info(f"*** Merit-order dispatch satisfies all ramp and minimum generation limits "
+                     f"({status['solve_time_s'] * 1000:.0f} ms) *** \n")
+        return x, u, status
+
+    # Enough padding to move any generator across its full operating range within the window
+    padding = int(np.ceil((1 - min_gen_factor) / ramp_rate)) + 1
+    windows = _violation_windows(violated, padding)
+    window_share = sum(end - start + 1 for start, end in windows) / len(net_demand)
+    logging.info(f"Merit-order dispatch violates ramp limits in {int(violated.sum())} periods; "
+                 f"{len(windows)} LP windows cover {window_share:.1%} of the horizon")
+
+    if window_share <= max_window_share:
+        for start, end in windows:
+            initial_output = dict(zip(gen_list, x[:, start - 1])) if start > 0 else None
+            final_output = dict(zip(gen_list, x[:, end + 1])) if end < len(net_demand) - 1 else None
+            window_model = build_thermal_model(net_demand[start:end + 1], gen_data, ramp_rate, min_gen_factor,
+                                               penalty_unmet_demand, initial_output, final_output)
+            window_status = solve_lp(window_model, f"thermal window {start}-{end}", tee=False)
+            if not window_status['has_solution']:
+                break
+            x[:, start:end + 1] = var_matrix(window_model.x, window_model.I, window_model.T)
+            u[start:end + 1] = var_array(window_model.u)
+        else:
+            if not constraint_violations(x, capacity, ramp_rate, min_gen_factor).any():
+                objective = total_cost(x, u)
+                gap = abs(objective - lower_bound) / max(abs(objective), 1e-10)
+                status.update({'termination': 'merit_order_with_lp_windows',
+                               'optimal': gap <= (DEFAULT_OPTIMALITY_GAP if mip_gap is None else mip_gap),
+                               'objective': objective, 'solver': 'merit_order+lp', 'gap': gap,
+                               'solve_time_s': time.perf_counter() - start_time})
+                logging.info(f"*** Merit-order dispatch repaired with {len(windows)} LP windows; gap to the "
+                             f"merit-order bound {status['gap']:.4%} *** \n")
+                return x, u, status
+        logging.info("LP windows did not repair the merit-order dispatch; solving the full LP")
+
+    model = build_thermal_model(net_demand, gen_data, ramp_rate, min_gen_factor, penalty_unmet_demand)
+    status = solve_lp(model)
+    status['solve_time_s'] = time.perf_counter() - start_time
+    if not status['has_solution']:
+        return None, None, status
+    return var_matrix(model.x, model.I, model.T), var_array(model.u), status
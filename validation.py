@@ -0,0 +1,253 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+PERIOD = pd.Timedelta(minutes=15)
+REPORT_COLUMNS = ['severity', 'check', 'input', 'detail']
+
+# Sizes the pipeline divides by, and sizes that only scale a profile
+DIVISOR_SIZE_PARAMS = ['wind_size_excel_sri', 'wind_size_actual_sri']
+SCALE_SIZE_PARAMS = ['pv_size_goa', 'pv_size_gujarat', 'pv_size_rajasthan', 'pv_size_telangana',
+                     'wind_size_goa_or_maharashtra', 'wind_size_tamil', 'wind_size_karnataka', 'dre_size_goa',
+                     'biomass_size', 'nuclear_size', 'gas_size', 'rtc_size']
+
+
+class InputValidationError(ValueError):
+    """Inputs that would make the run fail or silently give wrong results; report lists every problem found."""
+
+    def __init__(self, report):
+        self.report = report
+        errors = report[report['severity'] == 'error']
+        super().__init__(f"{len(errors)} input problem(s): " +
+                         "; ".join(f"{row.input}: {row.detail}" for row in errors.head(5).itertuples()))
+
+    def __reduce__(self):
+        # Rebuilt from the report, e.g. when raised in a worker process
+        return type(self), (self.report,)
+
+
+def issue(severity, check, input_name, detail):
+    return {'severity': severity, 'check': check, 'input': input_name, 'detail': detail}
+
+
+def _first(labels, n=3):
+    labels = list(labels[:n + 1])
+    text = ', '.join(str(label) for label in labels[:n])
+    return text + (', ...' if len(labels) > n else '')
+
+
+def check_config(params, missing_paths=()):
+    """
+    Checks the configuration before anything is read: input files exist, sizes the pipeline divides by are
+    positive, other sizes are not negative, and losses, battery settings and the timeline are in range.
+
+    Returns:
+        list: The problems found (see issue).
+    """
+    issues = [issue('error', 'missing file', path, "file not found") for path in missing_paths]
+    for name in DIVISOR_SIZE_PARAMS:
+        if name in params and not params[name] > 0:
+            issues.append(issue('error', 'non-positive divisor', name,
+                                f"must be > 0 (the profiles are divided by it), got {params[name]}"))
+    for name in SCALE_SIZE_PARAMS:
+        if name in params and not params[name] >= 0:
+            issues.append(issue('error', 'negative size', name, f"must be >= 0, got {params[name]}"))
+    for name in ['intra_state_power_losses', 'inter_state_power_losses', 'min_batt_soc']:
+        if name in params and not 0 <= params[name] < 1:
+            issues.append(issue('error', 'out of range', name, f"must be in [0, 1), got {params[name]}"))
+    if 'batt_efficiency' in params and not 0 < params['batt_efficiency'] <= 1:
+        issues.append(issue('error', 'out of range', 'batt_efficiency',
+                            f"must be in (0, 1], got {params['batt_efficiency']}"))
+    for battery, config in params.get('battery_configs', {}).items():
+        for key in ('power', 'duration'):
+            if not config[key] > 0:
+                issues.append(issue('error', 'non-positive divisor', f"{battery} {key}",
+                                    f"must be > 0, got {config[key]}"))
+    try:
+        start, end = pd.to_datetime(params['timeline_start_date']), pd.to_datetime(params['timeline_end_date'])
+        if start > end:
+            issues.append(issue('error', 'timeline', 'timeline_start_date',
+                                f"{start:%Y-%m-%d} is after timeline_end_date {end:%Y-%m-%d}"))
+    except (KeyError, ValueError) as e:
+        issues.append(issue('error', 'timeline', 'timeline_start_date / timeline_end_date', f"not a date ({e})"))
+    return issues
+
+
+def check_index(index, name, period=PERIOD):
+    """Checks that a time index is sorted, without duplicates, and regular (no gaps) at the model period."""
+    issues = []
+    index = pd.DatetimeIndex(index)
+    if len(index) == 0:
+        return [issue('error', 'empty', name, "no periods")]
+    duplicated = index.duplicated()
+    if duplicated.any():
+        issues.append(issue('error', 'duplicate timestamps', name,
+                            f"{duplicated.sum()} duplicates, first at {_first(index[duplicated])}"))
+    steps = np.diff(index.asi8)
+    if (steps < 0).any():
+        issues.append(issue('error', 'unsorted timestamps', name,
+                            f"{(steps < 0).sum()} steps back in time, first after {_first(index[:-1][steps < 0])}"))
+    irregular = (steps > 0) & (steps != period.value)
+    if irregular.any():
+        minutes = steps[irregular] / pd.Timedelta(minutes=1).value
+        issues.append(issue('error', 'irregular timestamps', name,
+                            f"{irregular.sum()} steps other than {period / pd.Timedelta(minutes=1):g} min "
+                            f"(largest {minutes.max():g} min), first after {_first(index[:-1][irregular])}"))
+    return issues
+
+
+def check_timestamps(timestamps, name):
+    """Checks raw timestamps (e.g. hourly source data before it is resampled) for unparsed values and duplicates."""
+    issues = []
+    timestamps = pd.Series(pd.DatetimeIndex(timestamps))
+    unparsed = timestamps.isna().values
+    if unparsed.any():
+        issues.append(issue('error', 'unparsed timestamps', name, f"{unparsed.sum()} timestamps could not be "
+                                                                  f"parsed, rows {_first(np.flatnonzero(unparsed))}"))
+    duplicated = timestamps.duplicated().values & ~unparsed
+    if duplicated.any():
+        issues.append(issue('error', 'duplicate timestamps', name,
+                            f"{duplicated.sum()} duplicates, first at {_first(timestamps[duplicated].tolist())}"))
+    return issues
+
+
+def check_values(values, index, name, max_missing=0):
+    """
+    Checks a profile for missing (NaN) and infinite values. Up to max_missing NaN periods are reported as a
+    warning (e.g. a single missing meter reading); more, or any infinite value, are errors.
+    """
+    issues = []
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    if missing.any():
+        severity = 'warning' if missing.sum() <= max_missing else 'error'
+        issues.append(issue(severity, 'missing values', name,
+                            f"{missing.sum()} NaN periods, first at {_first(index[missing])}"))
+    infinite = np.isinf(values)
+    if infinite.any():
+        issues.append(issue('error', 'infinite values', name,
+                            f"{infinite.sum()} infinite periods, first at {_first(index[infinite])}"))
+    return issues
+
+
+def check_alignment(index, reference_index, name, reference_name):
+    """
+    Checks that a profile lines up period by period with the reference (the demand), which it is merged
+    with by position: same length and the same month, day and time of day in every period (years may differ).
+    """
+    if len(index) != len(reference_index):
+        return [issue('error', 'length mismatch', name,
+                      f"{len(index)} periods for {len(reference_index)} periods of {reference_name}")]
+    index, reference_index = pd.DatetimeIndex(index), pd.DatetimeIndex(reference_index)
+    shifted = ((index.month != reference_index.month) | (index.day != reference_index.day)
+               | (index.hour != reference_index.hour) | (index.minute != reference_index.minute))
+    if shifted.any():
+        position = int(np.argmax(shifted))
+        return [issue('error', 'misaligned periods', name,
+                      f"{shifted.sum()} periods fall on another time of year than {reference_name}, first "
+                      f"{index[position]} against {reference_index[position]}")]
+    return []
+
+
+def check_monthly_cuf(monthly_cuf, name):
+    """Checks that a monthly CUF the target CUF is divided by is positive in every month."""
+    bad = ~(monthly_cuf.values > 0)
+    if bad.any():
+        months = [f"{month:%Y-%m} ({cuf:.3g})" for month, cuf in zip(monthly_cuf.index[bad], monthly_cuf.values[bad])]
+        return [issue('error', 'non-positive CUF', name,
+                      f"monthly CUF must be > 0 to scale it to the target CUF: {_first(months, 4)}")]
+    return []
+
+
+def make_report(issues):
+    return pd.DataFrame(issues, columns=REPORT_COLUMNS)
+
+
+def raise_for_issues(issues, stage):
+    """Logs the problems found by a check and raises InputValidationError if any of them is an error."""
+    report = make_report(issues)
+    for row in report.itertuples():
+        log = logging.error if row.severity == 'error' else logging.warning
+        log(f"*** Input check ({stage}): {row.check} in {row.input}: {row.detail} *** \n")
+    if (report['severity'] == 'error').any():
+        raise InputValidationError(report)
+    return report
+
+
+def validate_demand_history(df_demand, max_missing=0, year=2022):
+    """
+    Checks the demand history the target year is scaled from, period by period: a full year of regular
+    15-min timestamps without duplicates or gaps, and no NaN (beyond max_missing) or infinite values.
+    """
+    issues = check_index(df_demand.index, 'demand history')
+    issues += check_alignment(df_demand.index, pd.date_range(f"{year}-01-01", f"{year}-12-31 23:45", freq=PERIOD),
+                              'demand history', f"{year} (15-min)")
+    issues += check_values(df_demand['TOTAL DEMAND'].values, df_demand.index, 'demand history', max_missing)
+    return raise_for_issues(issues, 'demand')
+
+
+def validate_inputs(params, paths, demand, re_profiles):
+    """
+    Checks the target-year demand and the RE profiles before anything is built from them: regular 15-min
+    timestamps without duplicates or gaps, every profile aligned with the demand, and no NaN or infinite values.
+
+    Raises:
+        InputValidationError: With the report of all problems, if any of them is an error.
+
+    Returns:
+        pd.DataFrame: The report (warnings only; empty when everything is fine).
+    """
+    max_missing = int(params.get('max_missing_periods', 4))
+    issues = check_index(demand.index, 'demand')
+    issues += check_values(demand['TOTAL DEMAND'].values, demand.index, 'demand', max_missing)
+    for name, profile in re_profiles.items():
+        issues += check_index(profile.index, name)
+        issues += check_alignment(profile.index, demand.index, name, 'demand')
+        for column in profile.columns:
+            issues += check_values(profile[column].values, profile.index, f"{name} '{column}'", max_missing)
+    return raise_for_issues(issues, 'profiles')
+
+
+def check_site_registry(sites, technologies, reserved_names=()):
+    """
+    Checks the candidate sites of the sizing: unique names that do not clash with the other results, a known
+    technology, losses in [0, 1), no negative cost or size, min_mw <= max_mw and a profile source for each site.
+    """
+    if sites.empty:
+        return [issue('error', 'empty', 'site registry', "no candidate sites")]
+    issues = []
+    duplicated = sites.index[sites.index.duplicated()]
+    if len(duplicated):
+        issues.append(issue('error', 'duplicate sites', 'site registry', f"{_first(duplicated.unique())}"))
+    for site in sites.index.intersection(list(reserved_names)).append(sites.index[sites.index == '']):
+        issues.append(issue('error', 'reserved name', 'site registry', f"'{site}' cannot be the name of a site"))
+    for site, row in sites.iterrows():
+        if row['technology'] not in technologies:
+            issues.append(issue('error', 'unknown technology', site,
+                                f"'{row['technology']}' is not one of {', '.join(technologies)}"))
+        for column in ['losses', 'cost', 'min_mw', 'max_mw']:
+            if pd.isna(row[column]):
+                issues.append(issue('error', 'not a number', site, f"{column} must be a number"))
+        if not 0 <= row['losses'] < 1 and pd.notna(row['losses']):
+            issues.append(issue('error', 'out of range', site, f"losses must be in [0, 1), got {row['losses']}"))
+        for column in ['cost', 'min_mw']:
+            if row[column] < 0:
+                issues.append(issue('error', 'negative value', site, f"{column} must be >= 0, got {row[column]}"))
+        if row['max_mw'] < row['min_mw']:
+            issues.append(issue('error', 'out of range', site,
+                                f"max_mw {row['max_mw']} is below min_mw {row['min_mw']}"))
+        if not row['profile']:
+            issues.append(issue('error', 'missing profile', site, "no profile source"))
+    return issues
+
+
+def validate_sizing_inputs(demand, gdam_price, profiles, n_periods=12 * 96):
+    """Checks that the typical-day inputs of the sizing model all have n_periods values and no NaNs."""
+    issues = []
+    for name, values in [('shortage case unserved demand', demand), ('GDAM price', gdam_price), *profiles.items()]:
+        values = np.asarray(values, dtype=float)
+        if len(values) != n_periods:
+            issues.append(issue('error', 'length mismatch', name, f"{len(values)} periods instead of {n_periods}"))
+        issues += check_values(values, pd.RangeIndex(len(values)), name)
+    return raise_for_issues(issues, 'sizing inputs')
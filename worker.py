@@ -0,0 +1,277 @@
+import argparse
+import configparser
+import contextlib
+import io
+import logging
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+AUTHKEY_ENV = 'OPTIMIZATION_WORKER_AUTHKEY'
+EXIT_MEMORY_LIMIT = 3
+# Returned by OptimizationWorker.run(..., wait=False) when the worker is serving another run or starting
+BUSY = object()
+
+# The warm-up only loads and preprocesses the inputs: it solves nothing, writes no workbooks and, being no real
+# run, is neither recorded in the run history nor archived (where its retention could evict real runs)
+_WARM_UP_OVERRIDES = {'run_thermal_&_sizing_optimization': 'False', 'excel_output_mode': 'on_demand',
+                      'run_history_db': '', 'archive_dir': ''}
+
+
+def rss_mb(pid=None):
+    """Resident memory of a process in MB, or None where /proc is not available (e.g. Windows)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+class _ConnectionLogHandler(logging.Handler):
+    """Forwards the log of a run to the client as ('log', line) messages."""
+
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+        self.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+
+    def emit(self, record):
+        self.conn.send(('log', self.format(record) + '\n'))
+
+
+class _ConnectionWriter(io.TextIOBase):
+    """File-like object that forwards print and traceback output of a run to the client."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, text):
+        if text:
+            self.conn.send(('log', text))
+        return len(text)
+
+
+def _warm_up(config_file):
+    """Imports the pipeline and parses its inputs once, so the first request starts warm."""
+    from optimization_model import run_optimization
+
+    if not os.path.exists(config_file):
+        logging.warning(f"Warm-up config '{config_file}' not found; the first run will load the inputs")
+        return
+    # The parsed inputs stay in the process cache of input_cache
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    for name, override in _WARM_UP_OVERRIDES.items():
+        section = next((s for s in config.sections() if config.has_option(s, name)), None)
+        if section is None:
+            section = 'MiscParameters'
+            if not config.has_section(section):
+                config.add_section(section)
+        config.set(section, name, override)
+    with tempfile.TemporaryDirectory() as work_dir:
+        warm_config = os.path.join(work_dir, 'warmup.ini')
+        with open(warm_config, 'w') as f:
+            config.write(f)
+        run_optimization(warm_config, results_dir=os.path.join(work_dir, 'Results'))
+
+
+def serve(port, authkey, warmup_config=None, memory_limit_mb=0):
+    """
+    Worker main loop: warms up, then serves run requests on 127.0.0.1:port one at a time.
+
+    A request is a dict with 'config_file' and optionally 'results_dir' and 'memory_limit_mb'. The reply is a
+    stream of ('log', text) messages followed by ('done', info) or ('error', traceback text). The worker exits
+    with EXIT_MEMORY_LIMIT after a run that leaves it above the memory limit of the request (memory_limit_mb
+    if it has none), so the supervisor restarts it.
+    """
+    from optimization_model import run_optimization
+
+    if warmup_config:
+        start = time.perf_counter()
+        _warm_up(warmup_config)
+        logging.info(f"*** Worker warmed up in {time.perf_counter() - start:.1f} s *** \n")
+
+    # The listener opens only once the worker is warm, so a connected client never waits for the warm-up
+    with Listener(('127.0.0.1', port), authkey=authkey) as listener:
+        logging.info(f"*** Optimization worker listening on 127.0.0.1:{port} *** \n")
+        while True:
+            with listener.accept() as conn:
+                request = conn.recv()
+                if request.get('command') == 'ping':
+                    conn.send(('done', {'pid': os.getpid(), 'rss_mb': rss_mb()}))
+                    continue
+                handler = _ConnectionLogHandler(conn)
+                root = logging.getLogger()
+                root.addHandler(handler)
+                start = time.perf_counter()
+                try:
+                    writer = _ConnectionWriter(conn)
+                    with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                        run_optimization(request['config_file'], results_dir=request.get('results_dir'))
+                    reply = ('done', {'elapsed_s': time.perf_counter() - start, 'rss_mb': rss_mb()})
+                except BaseException:
+                    reply = ('error', traceback.format_exc())
+                finally:
+                    root.removeHandler(handler)
+                conn.send(reply)
+            memory = rss_mb()
+            limit = request.get('memory_limit_mb', memory_limit_mb)
+            if limit and memory is not None and memory > limit:
+                logging.warning(f"*** Worker uses {memory:,.0f} MB (limit {limit:,.0f} MB); exiting "
+                                f"so it is restarted *** \n")
+                sys.exit(EXIT_MEMORY_LIMIT)
+
+
+class OptimizationWorker:
+    """
+    Supervisor of a persistent, pre-warmed optimization worker process.
+
+    The worker is started on first use and restarted whenever it has died (crash or memory limit). While a
+    run is in progress its memory is watched, and the worker is killed and restarted if it exceeds the limit.
+
+    Args:
+        warmup_config (str): Config file whose inputs are loaded when the worker starts.
+        memory_limit_mb (float): Memory ceiling of the worker. 0 means no limit. set_memory_limit changes it
+                                 for the running worker.
+        startup_timeout (float): Seconds to wait for a new worker to finish warming up.
+    """
+
+    def __init__(self, warmup_config=None, memory_limit_mb=0, startup_timeout=600):
+        self.warmup_config = os.path.abspath(warmup_config) if warmup_config else None
+        self.memory_limit_mb = float(memory_limit_mb or 0)
+        self.startup_timeout = startup_timeout
+        self.authkey = secrets.token_bytes(16)
+        self.process = None
+        self.port = None
+        self.restarts = 0
+        self._lock = threading.RLock()  # One run at a time; a run waits for a start in progress
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def set_memory_limit(self, memory_limit_mb):
+        """Sets the memory ceiling; it applies from the next run on, without restarting the worker."""
+        self.memory_limit_mb = float(memory_limit_mb or 0)
+
+    def start_in_background(self):
+        """Starts the worker without waiting, so it warms up while the user is still configuring the run."""
+        threading.Thread(target=self._start_quietly, daemon=True).start()
+
+    def _start_quietly(self):
+        try:
+            self.start()
+        except RuntimeError as e:
+            logging.error(f"Could not start the optimization worker: {e}")
+
+    def start(self):
+        """Starts a new worker (stopping the old one) and waits until it accepts requests."""
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self.process is not None:
+            self.restarts += 1
+            self.stop()
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        command = [sys.executable, WORKER_SCRIPT, '--port', str(self.port),
+                   '--memory-limit-mb', str(self.memory_limit_mb)]
+        if self.warmup_config:
+            command += ['--warmup-config', self.warmup_config]
+        # No stdin: a run that waits for keyboard input fails instead of hanging the worker
+        self.process = subprocess.Popen(command, cwd=os.path.dirname(WORKER_SCRIPT), stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                        env=dict(os.environ, **{AUTHKEY_ENV: self.authkey.hex()}))
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if not self.alive():
+                raise RuntimeError(f"Optimization worker exited during start-up (code {self.process.returncode})")
+            try:
+                self._request({'command': 'ping'})
+                return
+            except (ConnectionRefusedError, OSError):
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Optimization worker did not start within {self.startup_timeout} s")
+
+    def stop(self):
+        if self.alive():
+            self.process.kill()
+            self.process.wait()
+
+    def _request(self, request, on_log=None):
+        with Client(('127.0.0.1', self.port), authkey=self.authkey) as conn:
+            conn.send(request)
+            while True:
+                # Poll so the memory of the worker can be checked while a run is in progress
+                if not conn.poll(1.0):
+                    memory = rss_mb(self.process.pid)
+                    if self.memory_limit_mb and memory is not None and memory > self.memory_limit_mb:
+                        self.stop()
+                        raise MemoryError(f"Optimization worker exceeded {self.memory_limit_mb:,.0f} MB "
+                                          f"({memory:,.0f} MB) and was stopped")
+                    continue
+                kind, payload = conn.recv()
+                if kind == 'log':
+                    if on_log is not None:
+                        on_log(payload)
+                elif kind == 'error':
+                    raise RuntimeError(payload)
+                else:
+                    return payload
+
+    def run(self, config_file, results_dir=None, on_log=None, wait=True):
+        """
+        Runs run_optimization in the worker, restarting the worker first if it is not running.
+
+        Args:
+            config_file (str): Config file of the run.
+            results_dir (str): Results folder of the run. None uses the default Results folder.
+            on_log (callable): Called with each piece of log output as it arrives.
+            wait (bool): Whether to wait for a run or a start in progress. If False, BUSY is returned at once
+                         instead, e.g. to run in a process of its own.
+
+        Returns:
+            dict: 'elapsed_s' and the worker's memory after the run ('rss_mb'), or BUSY.
+
+        Raises:
+            RuntimeError: If the run raised (the worker stays up) or the worker died during the run
+                          (it is restarted on the next call).
+            MemoryError: If the worker exceeded the memory limit during the run.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return BUSY
+        try:
+            if not self.alive():
+                self._start()
+            request = {'config_file': os.path.abspath(config_file),
+                       'results_dir': os.path.abspath(results_dir) if results_dir else None,
+                       'memory_limit_mb': self.memory_limit_mb}
+            try:
+                return self._request(request, on_log)
+            except (EOFError, ConnectionError) as e:
+                self.stop()
+                raise RuntimeError(f"Optimization worker died during the run ({type(e).__name__})") from e
+        finally:
+            self._lock.release()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    parser = argparse.ArgumentParser(description="Persistent optimization worker")
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--warmup-config')
+    parser.add_argument('--memory-limit-mb', type=float, default=0)
+    args = parser.parse_args()
+    serve(args.port, bytes.fromhex(os.environ[AUTHKEY_ENV]), args.warmup_config, args.memory_limit_mb)